@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brand', '0002_auto_20220605_1413'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
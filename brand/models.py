@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 
 from useradmin.models import BaseTimestamp
 from category.fields import TitleCharField
@@ -9,11 +10,22 @@ def brand_thumbnail(instance, filename):
     return f'brands/{instance.name}/{filename}'
 
 
+class BrandManager(models.Manager):
+    """Brand custom manager."""
+    def update_products_count(self, brand_id, count=1):
+        """Take brand id and products count (negative to remove), and add them to the brand products count."""
+        return self.get_queryset().filter(id=brand_id).update(products_count=F('products_count') + count)
+
+
 class Brand(BaseTimestamp):
     """Brand model."""
     name = TitleCharField(max_length=64, title=True)
     slug = models.SlugField(unique=True, null=True, blank=True)
     thumbnail = models.ImageField(upload_to=brand_thumbnail, default='default.jpg')
+    # products count, maintained by the product signals.
+    products_count = models.PositiveIntegerField(default=0)
+
+    objects = BrandManager()
     
     class Meta:
         ordering = ['-created_at']
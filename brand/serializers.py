@@ -3,34 +3,31 @@ from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 
 from product.mixins import TimestampMixin
+from product.fields import MediaURLField
 from product.models import Product
+from product.pagination import ProductCursorPagination
 from product.serializers import ProductListSerializer
 from .models import Brand
 
 
 class BrandSerializer(serializers.ModelSerializer, TimestampMixin):
     """Brand model serializer."""
-    thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_url = MediaURLField(source='thumbnail')
     products = serializers.SerializerMethodField()
 
     class Meta:
         model  = Brand
-        fields = ["id", "name", "slug", "thumbnail", "thumbnail_url", "products", "updated_at", "created_at"]
-        read_only_fields = ['slug', 'thumbnail_url']
+        fields = ["id", "name", "slug", "thumbnail", "thumbnail_url", "products_count", "products", "updated_at",
+                "created_at"]
+        read_only_fields = ['slug', 'thumbnail_url', 'products_count']
         extra_kwargs = {"thumbnail": {'write_only': True}}
 
-    def get_thumbnail_url(self, obj):
-        request = self.context.get('request')
-        thumbnail_url = obj.thumbnail.url
-        return request.build_absolute_uri(thumbnail_url)
-
     def get_products(self, obj):
-        # get all products of this brand
-        products = Product.objects.get_brand_products(obj)
-        if products:
-            return ProductListSerializer(products, many=True, context=self.context).data
-        else:
-            return []
+        # only the first page of the products of this brand,
+        # the next pages are served by the brand products endpoint.
+        products = Product.objects.get_brand_products(obj).order_by(
+                                *ProductCursorPagination.ordering)[:ProductCursorPagination.page_size]
+        return ProductListSerializer(products, many=True, context=self.context).data
 
 
     # def validate(self, data):
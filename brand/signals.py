@@ -8,4 +8,13 @@ from .models import Brand
 @receiver(pre_save, sender=Brand)
 def create_brand_slug(sender, instance, *args, **kwargs):
     """Create a slug for a brand before saving."""
-    instance.slug = unique_slug_generator(instance)
\ No newline at end of file
+    instance.slug = unique_slug_generator(instance)
+
+
+@receiver(pre_save, sender=Brand)
+def reload_brand_products_count(sender, instance, *args, **kwargs):
+    """Reload the saved products count before saving, so a stale instance doesn't overwrite it."""
+    if instance.pk:
+        products_count = Brand.objects.filter(pk=instance.pk).values_list('products_count', flat=True).first()
+        if products_count is not None:
+            instance.products_count = products_count
\ No newline at end of file
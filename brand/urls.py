@@ -1,6 +1,6 @@
 from django.urls import path
 
-from .views import BrandListAPIView, BrandCreateAPIView, BrandUpdateDeleteAPIView
+from .views import BrandListAPIView, BrandProductListAPIView, BrandCreateAPIView, BrandUpdateDeleteAPIView
 
 
 """
@@ -11,5 +11,7 @@ BASE ENDPOINT /api/brands/
 urlpatterns = [
     path('list/', BrandListAPIView.as_view(), name='list'),
     path('create/', BrandCreateAPIView.as_view(), name='create'),
-    path('<path:brand_slug>/', BrandUpdateDeleteAPIView.as_view(), name='detail-update-delete'),        
+    # brand slugs have no slash, but may have non ascii letters, which the slug converter rejects.
+    path('<str:brand_slug>/products/', BrandProductListAPIView.as_view(), name='products'),
+    path('<str:brand_slug>/', BrandUpdateDeleteAPIView.as_view(), name='detail-update-delete'),        
 ]
\ No newline at end of file
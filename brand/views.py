@@ -2,6 +2,9 @@ from django.shortcuts import get_object_or_404
 
 from rest_framework import generics, mixins, permissions
 
+from product.models import Product
+from product.pagination import ProductCursorPagination
+from product.serializers import ProductListSerializer
 from .models import Brand
 from .serializers import BrandSerializer, BrandListSerializer
 from category.permissions import IsAdmin, IsAdminOrReadOnly
@@ -11,6 +14,22 @@ class BrandListAPIView(generics.ListAPIView):
     """Brand list API view."""
     queryset = Brand.objects.all()
     serializer_class = BrandListSerializer
+
+
+class BrandProductListAPIView(generics.ListAPIView):
+    """
+    Brand products list API view.
+    List the products of the brand, keyset paginated over the (brand, created_at) index.
+    """
+    serializer_class = ProductListSerializer
+    pagination_class = ProductCursorPagination
+
+    def get_queryset(self):
+        brand = get_object_or_404(Brand.objects.only('id'), slug=self.kwargs.get("brand_slug"))
+        return Product.objects.get_brand_products(brand)
+
+    def get_serializer_context(self, *args, **kwargs):
+        return {"request":self.request}
     
 
 class BrandCreateAPIView(generics.CreateAPIView):
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from product.fields import MediaURLField
 from .models import Category
 
 
@@ -7,4 +8,20 @@ class ChildrenCategorySerializer(serializers.ModelSerializer):
     """Children Category list model serializer."""
     class Meta:
         model  = Category
-        fields = ["id", "name", "slug", "thumbnail"]
\ No newline at end of file
+        fields = ["id", "name", "slug", "thumbnail"]
+
+
+class CategoryTreeSerializer(serializers.ModelSerializer):
+    """
+    Category tree model serializer.
+    Takes nodes assembled with cache_tree_children, so the children are read without queries.
+    """
+    thumbnail_url = MediaURLField(source='thumbnail')
+    children = serializers.SerializerMethodField()
+
+    class Meta:
+        model  = Category
+        fields = ["id", "name", "slug", "thumbnail_url", "product_count", "children"]
+
+    def get_children(self, obj):
+        return CategoryTreeSerializer(obj.get_children(), many=True, context=self.context).data
\ No newline at end of file
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from product.cache import CATALOG_VERSION, get_cache_versions
+
+
+CATEGORY_TREE_VERSION = 'category-tree'
+
+
+def category_tree_cache_key(request):
+    """
+    Take a request, and return the cache key of its serialized category tree,
+    keyed by the catalog version too, as the tree carries the categories products counts.
+    """
+    version, catalog_version = get_cache_versions(CATEGORY_TREE_VERSION, CATALOG_VERSION)
+    return f'category-tree:{version}:{catalog_version}:{request.get_host()}'
+
+
+def get_or_set_category_tree(request, build_tree):
+    """Return the cached serialized category tree of the request, build and cache it if missing."""
+    cache_key = category_tree_cache_key(request)
+    data = cache.get(cache_key)
+    if data is None:
+        data = build_tree()
+        cache.set(cache_key, data, settings.CATEGORY_TREE_CACHE_TIMEOUT)
+    return data
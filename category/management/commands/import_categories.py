@@ -0,0 +1,197 @@
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from category.cache import CATEGORY_TREE_VERSION
+from category.models import Category
+from category.signals import RESERVED_SLUGS
+from product.cache import bump_cache_version_on_commit
+from product.utils import arabic_slugify, unique_slugs_generator
+
+
+TREE_FIELDS = ['lft', 'rght', 'tree_id', 'level']
+
+
+def read_json_records(file, separator):
+    """Take a nested json tree file, and yield its categories records with their names paths."""
+    def walk(nodes, parent_path):
+        for node in nodes:
+            path = parent_path + (node['name'].strip(),)
+            yield {"path": path, "description": node.get('description'), "thumbnail": node.get('thumbnail')}
+            yield from walk(node.get('children', []), path)
+    yield from walk(json.load(file), ())
+
+
+def read_jsonl_records(file, separator):
+    """Take a json lines file, and yield its categories records line by line."""
+    for line in file:
+        if line.strip():
+            yield get_record(json.loads(line), separator)
+
+
+def read_csv_records(file, separator):
+    """Take a csv file with a path column, and yield its categories records row by row."""
+    for row in csv.DictReader(file):
+        yield get_record(row, separator)
+
+
+def get_record(data, separator):
+    """Take a flat record, and return it with its path as a tuple of names."""
+    path = data.get('path')
+    if isinstance(path, str):
+        path = path.split(separator)
+    if not path:
+        raise CommandError(f"Category record without a path: {data}")
+    return {"path": tuple(name.strip() for name in path), "description": data.get('description'),
+            "thumbnail": data.get('thumbnail')}
+
+
+READERS = {'json': read_json_records, 'jsonl': read_jsonl_records, 'csv': read_csv_records}
+
+
+def get_tree_fields(children):
+    """
+    Take the children ids of each parent id (None for the roots) in their tree order,
+    and return the mptt tree fields of every node, numbered in one depth first pass.
+    """
+    tree_fields = {}
+    for tree_id, root_id in enumerate(children[None], 1):
+        counter, lfts = 1, {root_id: 1}
+        stack = [(root_id, 0, iter(children.get(root_id, ())))]
+        while stack:
+            node_id, level, node_children = stack[-1]
+            child_id = next(node_children, None)
+            counter += 1
+            if child_id is None:
+                tree_fields[node_id] = (lfts[node_id], counter, tree_id, level)
+                stack.pop()
+            else:
+                lfts[child_id] = counter
+                stack.append((child_id, level + 1, iter(children.get(child_id, ()))))
+    return tree_fields
+
+
+def lock_categories(using):
+    """
+    Lock the categories table against writes until the end of the transaction, so the categories created
+    meanwhile by the API or another import can't take the tree positions numbered by this import.
+    """
+    connection = connections[using]
+    table = connection.ops.quote_name(Category._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        elif connection.vendor == 'sqlite':
+            # a write statement, even matching no row, takes the database write lock before the tree is read.
+            cursor.execute(f"UPDATE {table} SET id = id WHERE 0")
+        else:
+            cursor.execute(f"SELECT id FROM {table} FOR UPDATE")
+
+
+def set_inserted_ids(categories, using):
+    """
+    Take categories just bulk inserted, and set their database assigned ids, returned by the insert
+    where the backend supports it, or read back by their unique slugs in the same transaction.
+    """
+    if not categories or categories[0].id is not None:
+        return
+    ids = {}
+    for i in range(0, len(categories), 500):
+        ids.update(Category.objects.using(using).filter(slug__in=[category.slug for category in categories[i:i + 500]])
+                                                .values_list('slug', 'id'))
+    for category in categories:
+        category.id = ids[category.slug]
+
+
+class Command(BaseCommand):
+    """Import a categories tree in bulk from a json, json lines or csv file."""
+    help = ("Import a categories tree from a nested json file, or json lines / csv records with a path of names. "
+            "Existing categories of the same path are kept.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Categories file path.")
+        parser.add_argument('--format', choices=list(READERS), help="File format, guessed from the extension.")
+        parser.add_argument('--separator', default=' > ', help="Names separator of the records paths.")
+        parser.add_argument('--batch-size', type=int, help="Categories written per query, "
+                                                            "the database backend limit by default.")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f"Unknown categories file format: {file_format}")
+        # every node of the records paths, parents first, the last record of a path gives its data.
+        nodes = {}
+        with open(options['path'], encoding='utf-8', newline='') as file:
+            for record in READERS[file_format](file, options['separator']):
+                path = record['path']
+                for depth in range(1, len(path)):
+                    nodes.setdefault(path[:depth], {})
+                nodes[path] = {key: value for key, value in record.items() if key != 'path' and value}
+        using = Category.objects.db
+        lock_categories(using)
+        # the existing tree, in tree order, with one query.
+        existing, saved_fields = {}, {}
+        children = defaultdict(list)
+        for id, parent_id, name, slug, *fields in Category.objects.order_by('tree_id', 'lft').values_list(
+                                                                'id', 'parent_id', 'name', 'slug', *TREE_FIELDS):
+            existing[(parent_id, name)] = (id, slug)
+            saved_fields[id] = tuple(fields)
+            children[parent_id].append(id)
+        # new categories inserted level by level, so the children are built from their parents ids
+        # assigned by the database & their parents allocated slugs.
+        levels = defaultdict(list)
+        for path in nodes:
+            levels[len(path)].append(path)
+        resolved = {(): (None, None)}
+        new_categories = []
+        for depth in sorted(levels):
+            level_categories, slugs_bases, level_names, aliases = [], [], {}, []
+            for path in levels[depth]:
+                parent_id, parent_slug = resolved[path[:-1]]
+                name = path[-1]
+                if (parent_id, name.title()) in existing:
+                    resolved[path] = existing[(parent_id, name.title())]
+                    continue
+                # names are saved titled, so names differing only by case are the same category.
+                if (parent_id, name.title()) in level_names:
+                    aliases.append((path, level_names[(parent_id, name.title())]))
+                    continue
+                level_names[(parent_id, name.title())] = path
+                data = nodes[path]
+                # the tree fields are numbered once the whole tree is inserted.
+                category = Category(parent_id=parent_id, name=name, lft=0, rght=0, tree_id=0, level=0,
+                                    description=data.get('description', ''), thumbnail=data.get('thumbnail', ''))
+                level_categories.append((path, category))
+                slugs_bases.append(f'{parent_slug}/{arabic_slugify(name)}' if parent_slug else arabic_slugify(name))
+            categories = [category for path, category in level_categories]
+            unique_slugs_generator(categories, slugs_bases, reserved=RESERVED_SLUGS)
+            Category.objects.bulk_create(categories, batch_size=options['batch_size'])
+            set_inserted_ids(categories, using)
+            for path, category in level_categories:
+                resolved[path] = (category.id, category.slug)
+                children[category.parent_id].append(category.id)
+                new_categories.append(category)
+            for path, alias_path in aliases:
+                resolved[path] = resolved[alias_path]
+        # number the whole tree once in memory instead of the per node mptt inserts,
+        # new nodes are appended after the existing children of their parents.
+        tree_fields = get_tree_fields(children)
+        numbered_categories = [Category(id=id, lft=lft, rght=rght, tree_id=tree_id, level=level)
+                                for id, (lft, rght, tree_id, level) in tree_fields.items()
+                                if saved_fields.get(id) != (lft, rght, tree_id, level)]
+        Category.objects.bulk_update(numbered_categories, TREE_FIELDS, batch_size=options['batch_size'])
+        moved_count = len(numbered_categories) - len(new_categories)
+        if new_categories:
+            bump_cache_version_on_commit(CATEGORY_TREE_VERSION)
+        duration = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(new_categories)} categories ({len(nodes) - len(new_categories)} existing, "
+            f"{moved_count} renumbered) in {duration:.2f} seconds, "
+            f"{len(new_categories) / duration if duration else 0:.0f} nodes/s."))
@@ -0,0 +1,53 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from category.cache import CATEGORY_TREE_VERSION
+from category.models import Category
+from product.cache import bump_cache_version_on_commit
+from product.models import Product
+
+
+def get_product_counts(categories, direct_counts):
+    """
+    Take the categories (id, parent id) in tree order and the active products count of each category,
+    and return the descendants inclusive products count of every category, with one walk up the tree.
+    """
+    product_counts = defaultdict(int)
+    # descendants come after their ancestors in tree order, so they're totalled before them in reverse.
+    for id, parent_id in reversed(categories):
+        product_counts[id] += direct_counts.get(id, 0)
+        if parent_id:
+            product_counts[parent_id] += product_counts[id]
+    return product_counts
+
+
+class Command(BaseCommand):
+    """Recompute the categories products counts in bulk from the active products."""
+    help = "Recompute the categories descendants inclusive products counts from the active products."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Categories updated per query.")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        # active products count of each category, in one grouped query.
+        direct_counts = dict(Product.objects.filter(is_active=True).values_list('category_id').annotate(
+                                count=Count('id')).order_by())
+        categories = list(Category.objects.order_by('tree_id', 'lft').only('id', 'parent_id', 'product_count'))
+        product_counts = get_product_counts([(category.id, category.parent_id) for category in categories],
+                                            direct_counts)
+        repaired_categories = []
+        for category in categories:
+            if category.product_count != product_counts[category.id]:
+                category.product_count = product_counts[category.id]
+                repaired_categories.append(category)
+        Category.objects.bulk_update(repaired_categories, ['product_count'], batch_size=options['batch_size'])
+        if repaired_categories:
+            bump_cache_version_on_commit(CATEGORY_TREE_VERSION)
+        self.stdout.write(self.style.SUCCESS(f"Repaired {len(repaired_categories)} categories products counts "
+                                            f"in {time.monotonic() - start:.2f} seconds."))
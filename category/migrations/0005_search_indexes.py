@@ -0,0 +1,17 @@
+# Generated by Django 2.2.19 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0004_auto_20211102_2010'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['tree_id', 'lft', 'rght'], name='category_tree_range_idx'),
+        ),
+    ]
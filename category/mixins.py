@@ -8,7 +8,5 @@ class ChildrenCategoriesMixin(serializers.Serializer):
     children_categories = serializers.SerializerMethodField()
 
     def get_children_categories(self, obj):
-        if obj.get_children():
-            return ChildrenCategorySerializer(obj.get_children(), many=True, context=self.context).data
-        else:
-            return []
\ No newline at end of file
+        # children are prefetched by the list view, so use the related manager instead of get_children.
+        return ChildrenCategorySerializer(obj.children.all(), many=True, context=self.context).data
\ No newline at end of file
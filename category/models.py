@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models import F, Subquery
 from django.urls import reverse
 
+from mptt.managers import TreeManager
 from mptt.models import MPTTModel, TreeForeignKey
 
 from useradmin.models import BaseTimestamp
@@ -12,6 +14,19 @@ def category_thumbnail(instance, filename):
     return f'categories/{instance.name}/{filename}'
 
 
+class CategoryManager(TreeManager):
+    """Category custom manager."""
+    def update_product_count(self, category_id, count=1):
+        """
+        Take category id and products count (negative to remove), and add them to the products counts
+        of the category & all its ancestors, with one update over the ancestors range.
+        """
+        category = self.model._base_manager.filter(id=category_id)
+        return self.model._base_manager.filter(
+            tree_id=Subquery(category.values('tree_id')), lft__lte=Subquery(category.values('lft')),
+            rght__gte=Subquery(category.values('rght'))).update(product_count=F('product_count') + count)
+
+
 class Category(MPTTModel, BaseTimestamp):
     """Category model implemented with MPTT."""
     name = TitleCharField(max_length=64, title=True)
@@ -19,10 +34,17 @@ class Category(MPTTModel, BaseTimestamp):
     thumbnail = models.ImageField(upload_to=category_thumbnail)
     description = models.CharField(max_length=255)
     parent = TreeForeignKey('self', null=True, blank=True, related_name='children', on_delete=models.CASCADE)
+    # active products count of the category & its descendants, maintained by the product & category signals.
+    product_count = models.PositiveIntegerField(default=0)
+
+    objects = CategoryManager()
     
     class Meta:
         unique_together = ('name', 'parent')
         verbose_name_plural = 'Categories'
+        indexes = [
+            models.Index(fields=['tree_id', 'lft', 'rght'], name='category_tree_range_idx'),
+        ]
 
     def __str__(self):
         # Return category's name
@@ -3,45 +3,49 @@ from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 
 from product.mixins import TimestampMixin
+from product.fields import MediaURLField
 from product.models import Product
+from product.pagination import ProductCursorPagination
 from product.serializers import ProductListSerializer
 from .mixins import ChildrenCategoriesMixin
 from .base_serializers import ChildrenCategorySerializer
 from .models import Category
+from .tree import get_category_tree
 
 
 class CategorySerializer(serializers.ModelSerializer, ChildrenCategoriesMixin, TimestampMixin):
     """Category model serializer."""
-    thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_url = MediaURLField(source='thumbnail')
     root_category = serializers.SerializerMethodField()
     parent_id = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    products_count = serializers.SerializerMethodField()
     products = serializers.SerializerMethodField()
 
     class Meta:
         model  = Category
         fields = ["id", "name", "slug", "thumbnail", "thumbnail_url", "description", 'parent_id', "root_category", 
-                "children_categories", "products", "updated_at", "created_at"]
+                "children_categories", "products_count", "products", "updated_at", "created_at"]
         read_only_fields = ['slug', 'thumbnail_url']
         extra_kwargs = {"parent_id": {'write_only': True}, "thumbnail": {'write_only': True}}
 
-    def get_thumbnail_url(self, obj):
-        request = self.context.get('request')
-        thumbnail_url = obj.thumbnail.url
-        return request.build_absolute_uri(thumbnail_url)
-
     def get_root_category(self, obj):
         if not obj.is_root_node():
-            return ChildrenCategorySerializer(obj.get_root(), context=self.context).data
+            # the root is read from the category tree snapshot, without a query.
+            tree = get_category_tree()
+            root = tree.get_category(tree.get_root_id(obj.id)) if obj.id in tree else obj.get_root()
+            return ChildrenCategorySerializer(root, context=self.context).data
         else:
             return None
 
+    def get_products_count(self, obj):
+        return Product.objects.get_descendants_products(obj).count()
+
     def get_products(self, obj):
-        # get all products of descendants categories of this category
-        products = Product.objects.get_descendants_products(obj)
-        if products:
-            return ProductListSerializer(products, many=True, context=self.context).data
-        else:
-            return []    
+        # only the first page of the products of descendants categories of this category,
+        # the next pages are served by the category products endpoint.
+        products = Product.objects.get_descendants_products(obj).order_by(
+                                *ProductCursorPagination.ordering)[:ProductCursorPagination.page_size]
+        return ProductListSerializer(products, many=True, context=self.context).data
 
     def validate_parent_id(self, value):
         """Validate parent category."""
@@ -88,4 +92,4 @@ class CategoryListSerializer(serializers.ModelSerializer, ChildrenCategoriesMixi
     """Category list model serializer."""
     class Meta:
         model  = Category
-        fields = ["id", "name", "slug", "thumbnail", "children_categories"]
\ No newline at end of file
+        fields = ["id", "name", "slug", "thumbnail", "product_count", "children_categories"]
\ No newline at end of file
@@ -1,17 +1,82 @@
 from django.dispatch import receiver
-from django.db.models.signals import pre_save
+from django.db.models import SlugField, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
 
-from product.utils import unique_slug_generator
+from mptt.signals import node_moved
+
+from product.utils import arabic_slugify, unique_slug_generator
+from product.cache import bump_cache_version_on_commit
+from .cache import CATEGORY_TREE_VERSION
 from .models import Category
 
 
+# first segments of the category endpoints paths, which top level categories slugs can't take.
+RESERVED_SLUGS = ('list', 'tree', 'create', 'products')
+
+
 @receiver(pre_save, sender=Category)
 def create_category_slug(sender, instance, *args, **kwargs):
     """
-    Create a slug for a category before saving.
+    Create the category path slug before saving, from its ancestors slugs fetched with one range query.
+    Keep the saved slug, to rewrite the descendants slugs after a rename or a move,
+    and reload the saved products count, so a stale instance doesn't overwrite it.
     """
-    instance.slug = unique_slug_generator(instance) # assign slug to the instance
-    parent_category_obj = instance.parent  # parent var
-    while parent_category_obj is not None:
-        instance.slug = f"{unique_slug_generator(parent_category_obj)}/{instance.slug}"
-        parent_category_obj = parent_category_obj.parent
\ No newline at end of file
+    instance._previous_slug = None
+    if instance.pk:
+        saved_category = Category.objects.filter(pk=instance.pk).values_list('slug', 'product_count').first()
+        if saved_category:
+            instance._previous_slug, instance.product_count = saved_category
+    path = []
+    if instance.parent_id:
+        # the tree fields are already set for new & moved categories, so the ancestors range is the new one.
+        ancestors_slugs = Category.objects.filter(tree_id=instance.tree_id, lft__lt=instance.lft,
+                                        rght__gt=instance.rght).order_by('lft').values_list('slug', flat=True)
+        path = [slug.rsplit('/', 1)[-1] for slug in ancestors_slugs]
+    path.append(arabic_slugify(instance.name))
+    instance.slug = unique_slug_generator(instance, new_slug='/'.join(path), reserved=RESERVED_SLUGS)
+
+
+@receiver(post_save, sender=Category)
+def update_descendants_slugs(sender, instance, created, *args, **kwargs):
+    """Rewrite the descendants slugs prefix with one update over the subtree range, after a rename or a move."""
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if created or not previous_slug or previous_slug == instance.slug or instance.is_leaf_node():
+        return
+    instance.get_descendants().update(slug=Concat(Value(f'{instance.slug}/'), Substr('slug', len(previous_slug) + 2),
+                                                output_field=SlugField()))
+
+
+@receiver(post_init, sender=Category)
+def get_category_original_parent(sender, instance, *args, **kwargs):
+    """
+    Keep the category parent as loaded, mptt has already moved the node in the database
+    before saving, so the previous parent can't be read in pre_save.
+    """
+    # a deferred parent isn't loaded, so it's not tracked.
+    if 'parent_id' in instance.__dict__:
+        instance._original_parent_id = instance.parent_id
+
+
+@receiver(post_save, sender=Category)
+def move_category_product_count(sender, instance, created, *args, **kwargs):
+    """Move the category products count from its previous ancestors to its new ancestors, after a move."""
+    original_parent_id = getattr(instance, '_original_parent_id', instance.parent_id)
+    instance._original_parent_id = instance.parent_id
+    if created or original_parent_id == instance.parent_id:
+        return
+    product_count = Category.objects.filter(id=instance.id).values_list('product_count', flat=True).first()
+    if not product_count:
+        return
+    if original_parent_id:
+        Category.objects.update_product_count(original_parent_id, count=-product_count)
+    if instance.parent_id:
+        Category.objects.update_product_count(instance.parent_id, count=product_count)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def bump_category_tree_version(sender, instance, *args, **kwargs):
+    """Invalidate the cached category tree after a category is saved, deleted or moved."""
+    bump_cache_version_on_commit(CATEGORY_TREE_VERSION)
@@ -1,13 +1,21 @@
 import pytest
+from django.core.cache import cache
 from rest_framework.test import APIClient, APIRequestFactory
 from pytest_factoryboy import register
 
 from accounts.tests.factories import AdminUserFactory
+from product.tests.factories import ProductFactory
 from .factories import ParentCategoryFactory, CategoryFactory
 
 register(ParentCategoryFactory)
 register(CategoryFactory)
 register(AdminUserFactory)
+register(ProductFactory)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
 
 
 @pytest.fixture
@@ -0,0 +1,75 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+
+from category.models import Category
+
+
+class TestImportCategories:
+
+    @staticmethod
+    def get_tree(queryset):
+        return [(category.slug, category.lft, category.rght, category.level)
+                for category in queryset.order_by('tree_id', 'lft')]
+
+    def test_import_csv(self, db, tmp_path):
+        """Test importing a csv of paths creates the whole tree with path slugs & valid tree fields."""
+        file_path = tmp_path / 'categories.csv'
+        file_path.write_text("path,description\n"
+                            "Fashion > Shoes > Boots,boots\n"
+                            "Fashion > Shoes > sneakers,\n"
+                            "Fashion > Bags,bags\n"
+                            "Home,home\n")
+        output = StringIO()
+        call_command('import_categories', str(file_path), stdout=output)
+        assert 'Imported 6 categories' in output.getvalue()
+        assert self.get_tree(Category.objects.filter(tree_id=1)) == [
+            ('fashion', 1, 10, 0), ('fashion/shoes', 2, 7, 1), ('fashion/shoes/boots', 3, 4, 2),
+            ('fashion/shoes/sneakers', 5, 6, 2), ('fashion/bags', 8, 9, 1)]
+        boots = Category.objects.get(slug='fashion/shoes/boots')
+        assert (boots.name, boots.description) == ('Boots', 'boots')
+        assert [category.slug for category in boots.get_ancestors()] == ['fashion', 'fashion/shoes']
+        assert Category.objects.get(slug='home').is_root_node()
+
+    def test_import_into_existing_tree(self, db, new_category, tmp_path):
+        """Test importing json lines merges into the existing categories & renumbers their tree."""
+        file_path = tmp_path / 'categories.jsonl'
+        file_path.write_text('{"path": ["test parent category", "test category", "child"]}\n'
+                            '{"path": ["test parent category", "Other"]}\n'
+                            '{"path": ["test parent category", "other"]}\n')
+        call_command('import_categories', str(file_path), stdout=StringIO())
+        assert Category.objects.count() == 4
+        imported_tree = self.get_tree(Category.objects.all())
+        Category.objects.rebuild()
+        assert imported_tree == self.get_tree(Category.objects.all())
+        assert imported_tree[2][0] == 'test-parent-category/test-category/child'
+        # the new tree version is served right away.
+        new_category.refresh_from_db()
+        child = Category.objects.create(name='new', parent=new_category, thumbnail='new.jpg', description='new')
+        assert child.slug == 'test-parent-category/test-category/new'
+        # the imported ids are assigned by the database, so the next insert doesn't collide with them.
+        assert child.id > max(Category.objects.exclude(id=child.id).values_list('id', flat=True))
+
+    def test_import_json(self, db, tmp_path):
+        """Test importing a nested json tree, with a slug suffix for colliding names."""
+        file_path = tmp_path / 'categories.json'
+        file_path.write_text(json.dumps([
+            {"name": "a b", "children": [{"name": "c"}]},
+            {"name": "a-b"},
+        ]))
+        call_command('import_categories', str(file_path), stdout=StringIO())
+        assert sorted(Category.objects.values_list('slug', flat=True)) == ['a-b', 'a-b-2', 'a-b/c']
+
+
+class TestRecomputeCategoryProductCounts:
+
+    def test_recompute_product_counts(self, db, new_category, product_factory):
+        """Test recomputing categories products counts from the active products, with the descendants."""
+        product_factory.create(category=new_category)
+        product_factory.create(category=new_category.parent, name='inactive', slug='inactive', is_active=False)
+        Category.objects.update(product_count=7)
+        output = StringIO()
+        call_command('recompute_category_product_counts', stdout=output)
+        assert 'Repaired 2 categories' in output.getvalue()
+        assert list(Category.objects.order_by('lft').values_list('product_count', flat=True)) == [1, 1]
@@ -1,6 +1,8 @@
 import os
 
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 import pytest
 
@@ -31,4 +33,85 @@ class TestModel:
         photo_name = new_category.thumbnail.name.split('/')[-1]
         photo_path = os.path.join(
             settings.BASE_DIR, f'media\\categories\\test category\\{photo_name}')
-        assert new_category.thumbnail.path == photo_path
\ No newline at end of file
+        assert new_category.thumbnail.path == photo_path
+
+
+class TestCategorySlug:
+
+    @staticmethod
+    def create_child(name, parent):
+        return Category.objects.create(name=name, parent=parent, thumbnail=f'{name}.jpg', description=name)
+
+    def test_deep_category_slug(self, new_category):
+        """Test a deep category slug is the path of its ancestors, built with a fixed number of queries."""
+        parent = new_category
+        for depth in range(5):
+            parent = self.create_child(f'level {depth}', parent)
+        with CaptureQueriesContext(connection) as queries:
+            child = self.create_child('leaf', parent)
+        assert child.slug == 'test-parent-category/test-category/level-0/level-1/level-2/level-3/level-4/leaf'
+        assert len(queries) <= 6
+
+    def test_rename_rewrites_descendants_slugs(self, new_category):
+        """Test renaming a category rewrites all its descendants slugs."""
+        grandchild = self.create_child('grandchild', new_category)
+        parent = new_category.parent
+        parent.name = 'renamed'
+        parent.save()
+        new_category.refresh_from_db()
+        grandchild.refresh_from_db()
+        assert parent.slug == 'renamed'
+        assert new_category.slug == 'renamed/test-category'
+        assert grandchild.slug == 'renamed/test-category/grandchild'
+
+    def test_move_rewrites_descendants_slugs(self, new_category):
+        """Test moving a category under another parent rewrites its & its descendants slugs."""
+        grandchild = self.create_child('grandchild', new_category)
+        other = Category.objects.create(name='other', thumbnail='other.jpg', description='other')
+        new_category.move_to(other)
+        new_category.refresh_from_db()
+        grandchild.refresh_from_db()
+        assert new_category.slug == 'other/test-category'
+        assert grandchild.slug == 'other/test-category/grandchild'
+        grandchild.parent = other
+        grandchild.save()
+        grandchild.refresh_from_db()
+        assert grandchild.slug == 'other/grandchild'
+
+
+class TestCategoryProductCount:
+
+    @staticmethod
+    def get_counts(*categories):
+        return [Category.objects.get(id=category.id).product_count for category in categories]
+
+    def test_product_create_update_delete(self, new_category, product_factory):
+        """Test categories products counts include the descendants, and follow products changes."""
+        root = new_category.parent
+        leaf = TestCategorySlug.create_child('leaf', new_category)
+        other = Category.objects.create(name='other', thumbnail='other.jpg', description='other')
+        product = product_factory.create(category=leaf)
+        product_factory.create(category=new_category, name='second', slug='second')
+        assert self.get_counts(root, new_category, leaf, other) == [2, 2, 1, 0]
+        product.is_active = False
+        product.save()
+        assert self.get_counts(root, new_category, leaf) == [1, 1, 0]
+        product.is_active = True
+        product.category = other
+        product.save()
+        assert self.get_counts(root, new_category, leaf, other) == [1, 1, 0, 1]
+        product.delete()
+        assert self.get_counts(root, other) == [1, 0]
+
+    def test_category_move(self, new_category, product_factory):
+        """Test moving a category moves its products count from its previous to its new ancestors."""
+        root = new_category.parent
+        leaf = TestCategorySlug.create_child('leaf', new_category)
+        other = Category.objects.create(name='other', thumbnail='other.jpg', description='other')
+        product_factory.create(category=leaf)
+        leaf.move_to(other)
+        assert self.get_counts(root, new_category, leaf, other) == [0, 0, 1, 1]
+        leaf = Category.objects.get(id=leaf.id)
+        leaf.parent = new_category
+        leaf.save()
+        assert self.get_counts(root, new_category, leaf, other) == [1, 1, 1, 0]
@@ -0,0 +1,44 @@
+from category.models import Category
+from category.tree import get_category_tree
+
+
+class TestCategoryTreeIndex:
+
+    @staticmethod
+    def create_tree(new_category):
+        grandchild = Category.objects.create(name='grandchild', parent=new_category, thumbnail='grandchild.jpg',
+                                            description='grandchild')
+        sibling = Category.objects.create(name='sibling', parent=new_category.parent, thumbnail='sibling.jpg',
+                                        description='sibling')
+        other = Category.objects.create(name='other', thumbnail='other.jpg', description='other')
+        return grandchild, sibling, other
+
+    def test_tree_lookups(self, db, new_category, django_assert_num_queries):
+        """Test descendants, ancestors, root & breadcrumbs are answered from the snapshot without queries."""
+        grandchild, sibling, other = self.create_tree(new_category)
+        root = new_category.parent
+        tree = get_category_tree()
+        with django_assert_num_queries(0):
+            assert len(tree) == 5
+            assert tree.get_descendants_ids(root.id) == [root.id, new_category.id, grandchild.id, sibling.id]
+            assert tree.get_descendants_ids(new_category.id, include_self=False) == [grandchild.id]
+            assert tree.get_descendants_ids(other.id) == [other.id]
+            assert tree.get_ancestors_ids(grandchild.id) == [root.id, new_category.id]
+            assert tree.get_root_id(grandchild.id) == root.id
+            assert tree.get_id('test-parent-category/sibling') == sibling.id
+            assert [crumb['slug'] for crumb in tree.get_breadcrumbs(grandchild.id)] == [
+                'test-parent-category', 'test-parent-category/test-category',
+                'test-parent-category/test-category/grandchild']
+            assert tree.get_breadcrumbs(0) == []
+            category = tree.get_category(new_category.id)
+            assert (category.lft, category.rght, category.parent_id) == (2, 5, root.id)
+
+    def test_tree_rebuilt_on_version_change(self, transactional_db, new_category, django_assert_num_queries):
+        """Test the snapshot is shared until the category tree changes."""
+        tree = get_category_tree()
+        with django_assert_num_queries(0):
+            assert get_category_tree() is tree
+        new_category.move_to(None)
+        moved_tree = get_category_tree()
+        assert moved_tree is not tree
+        assert moved_tree.get_ancestors_ids(new_category.id) == []
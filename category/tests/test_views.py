@@ -4,8 +4,12 @@ import os
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from category.models import Category
+from product.models import Product
+from product.pagination import ProductCursorPagination
 
 
 class TestCategory:
@@ -57,4 +61,97 @@ class TestCategory:
         assert Category.objects.count() == 1
         response = api_client.delete(self.category_update_delete_endpoint)
         assert response.status_code == 204
-        assert Category.objects.count() == 0 
\ No newline at end of file
+        assert Category.objects.count() == 0 
+
+
+class TestCategoryProducts:
+
+    category_products_endpoint = reverse('category-api:products', kwargs={"category_slug": 'test-parent-category'})
+
+    def create_products(self, product_factory, category, count):
+        return [product_factory.create(category=category, name=f'product {i}', slug=f'product-{i}')
+                for i in range(count)]
+
+    def test_category_products_descendants(self, db, new_category, product_factory, api_client):
+        """Test the products of the category descendants are listed, and other trees are not."""
+        other_category = Category.objects.create(name='other category', slug='other-category')
+        product_factory.create(category=new_category.parent, name='parent product', slug='parent-product')
+        product_factory.create(category=new_category, name='child product', slug='child-product')
+        product_factory.create(category=other_category, name='other product', slug='other-product')
+        response = api_client.get(self.category_products_endpoint, format='json')
+        assert response.status_code == 200
+        slugs = {product['slug'] for product in response.data['results']}
+        assert slugs == {'parent-product', 'child-product'}
+        assert set(Product.objects.get_descendants_products(new_category, ids=True)) == {
+                Product.objects.get(slug='child-product').id}
+
+    def test_category_products_pagination(self, db, new_parent_category, product_factory, api_client):
+        """Test the category products are keyset paginated."""
+        self.create_products(product_factory, new_parent_category, 3)
+        response = api_client.get(self.category_products_endpoint, {'page_size': 2}, format='json')
+        assert len(response.data['results']) == 2
+        response = api_client.get(response.data['next'], format='json')
+        assert len(response.data['results']) == 1
+        assert response.data['next'] is None
+
+    def test_category_named_products(self, db, new_parent_category, product_factory, api_client):
+        """Test a child category named products keeps its own detail, and a top level one can't shadow the endpoint."""
+        child = Category.objects.create(name='products', parent=new_parent_category, thumbnail='products.jpg',
+                                        description='products')
+        top_level = Category.objects.create(name='products', thumbnail='products.jpg', description='products')
+        assert (child.slug, top_level.slug) == ('test-parent-category/products', 'products-2')
+        product_factory.create(category=new_parent_category, name='parent product', slug='parent-product')
+        endpoint = reverse('category-api:detail-update-delete', kwargs={"category_slug": child.slug})
+        response = api_client.get(endpoint, format='json')
+        assert (response.status_code, response.data['slug']) == (200, child.slug)
+        response = api_client.get(self.category_products_endpoint, format='json')
+        assert [product['slug'] for product in response.data['results']] == ['parent-product']
+
+    def test_category_products_not_found(self, db, api_client):
+        """Test the category products of a missing category."""
+        endpoint = reverse('category-api:products', kwargs={"category_slug": 'missing'})
+        response = api_client.get(endpoint, format='json')
+        assert response.status_code == 404
+
+    def test_category_detail_first_page(self, db, monkeypatch, new_parent_category, product_factory, api_client):
+        """Test the category detail embeds the products count & only the first page of products."""
+        self.create_products(product_factory, new_parent_category, 3)
+        monkeypatch.setattr(ProductCursorPagination, 'page_size', 2)
+        endpoint = reverse('category-api:detail-update-delete', kwargs={"category_slug": 'test-parent-category'})
+        response = api_client.get(endpoint, format='json')
+        assert response.data['products_count'] == 3
+        assert len(response.data['products']) == 2
+
+
+class TestCategoryTree:
+
+    category_tree_endpoint = reverse('category-api:tree')
+
+    def test_category_tree(self, db, new_category, api_client):
+        """Test the whole tree is served with one query, then from the cache."""
+        Category.objects.create(name='grandchild', parent=new_category, thumbnail='grandchild.jpg', 
+                                description='grandchild')
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(self.category_tree_endpoint, format='json')
+        assert response.status_code == 200
+        assert len(queries) == 1
+        [root] = response.data
+        assert root['slug'] == 'test-parent-category'
+        assert root['children'][0]['slug'] == 'test-parent-category/test-category'
+        assert root['children'][0]['children'][0]['name'] == 'Grandchild'
+        with CaptureQueriesContext(connection) as queries:
+            api_client.get(self.category_tree_endpoint, format='json')
+        assert len(queries) == 0
+
+    def test_category_tree_invalidation(self, transactional_db, new_category, api_client):
+        """Test the cached tree is rebuilt after a category is saved, moved or deleted."""
+        api_client.get(self.category_tree_endpoint, format='json')
+        other = Category.objects.create(name='other', thumbnail='other.jpg', description='other')
+        response = api_client.get(self.category_tree_endpoint, format='json')
+        assert len(response.data) == 2
+        new_category.move_to(other)
+        response = api_client.get(self.category_tree_endpoint, format='json')
+        assert [len(root['children']) for root in response.data] == [0, 1]
+        other.delete()
+        response = api_client.get(self.category_tree_endpoint, format='json')
+        assert len(response.data) == 1
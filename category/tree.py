@@ -0,0 +1,110 @@
+from array import array
+
+from product.cache import get_cache_version
+from .cache import CATEGORY_TREE_VERSION
+from .models import Category
+
+
+class CategoryTreeIndex:
+    """
+    Immutable snapshot of the whole category tree, held in parallel arrays ordered by (tree_id, lft),
+    so a subtree is a contiguous slice and the tree shape is answered without queries.
+    """
+    __slots__ = ('version', 'ids', 'parents', 'lfts', 'rghts', 'tree_ids', 'slugs', 'names', 'thumbnails',
+                '_positions', '_slugs_positions')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.ids, self.parents = array('q'), array('q')
+        self.lfts, self.rghts, self.tree_ids = array('q'), array('q'), array('q')
+        slugs, names, thumbnails = [], [], []
+        for id, parent_id, lft, rght, tree_id, slug, name, thumbnail in rows:
+            self.ids.append(id)
+            # 0 is never a primary key, so it marks the root nodes.
+            self.parents.append(parent_id or 0)
+            self.lfts.append(lft)
+            self.rghts.append(rght)
+            self.tree_ids.append(tree_id)
+            slugs.append(slug)
+            names.append(name)
+            thumbnails.append(thumbnail)
+        self.slugs, self.names, self.thumbnails = tuple(slugs), tuple(names), tuple(thumbnails)
+        self._positions = {id: position for position, id in enumerate(self.ids)}
+        self._slugs_positions = {slug: position for position, slug in enumerate(self.slugs)}
+
+    @classmethod
+    def load(cls, version):
+        """Take the tree version, and load the snapshot with one ordered query."""
+        rows = Category.objects.order_by('tree_id', 'lft').values_list(
+                    'id', 'parent_id', 'lft', 'rght', 'tree_id', 'slug', 'name', 'thumbnail')
+        return cls(version, rows.iterator())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, category_id):
+        return category_id in self._positions
+
+    def get_id(self, slug):
+        """Take a category slug, and return its id or None."""
+        position = self._slugs_positions.get(slug)
+        return None if position is None else self.ids[position]
+
+    def get_category(self, category_id):
+        """
+        Take a category id, and return an unsaved category instance built from the snapshot,
+        with its tree fields, slug, name & thumbnail, or None.
+        """
+        position = self._positions.get(category_id)
+        if position is None:
+            return None
+        return Category(id=self.ids[position], parent_id=self.parents[position] or None, lft=self.lfts[position],
+                        rght=self.rghts[position], tree_id=self.tree_ids[position], slug=self.slugs[position],
+                        name=self.names[position], thumbnail=self.thumbnails[position])
+
+    def get_descendants_ids(self, category_id, include_self=True):
+        """Take a category id, and return the ids of its descendants, a contiguous slice of the snapshot."""
+        position = self._positions[category_id]
+        descendants_count = (self.rghts[position] - self.lfts[position] - 1) // 2
+        start = position if include_self else position + 1
+        return self.ids[start:position + descendants_count + 1].tolist()
+
+    def get_ancestors_ids(self, category_id, include_self=False):
+        """Take a category id, and return the ids of its ancestors, from the root."""
+        ancestors = [category_id] if include_self else []
+        parent_id = self.parents[self._positions[category_id]]
+        while parent_id:
+            ancestors.append(parent_id)
+            parent_id = self.parents[self._positions[parent_id]]
+        ancestors.reverse()
+        return ancestors
+
+    def get_root_id(self, category_id):
+        """Take a category id, and return its root category id."""
+        return self.get_ancestors_ids(category_id, include_self=True)[0]
+
+    def get_breadcrumbs(self, category_id):
+        """Take a category id, and return the id, name & slug of its ancestors & itself, from the root."""
+        if category_id not in self._positions:
+            return []
+        breadcrumbs = []
+        for id in self.get_ancestors_ids(category_id, include_self=True):
+            position = self._positions[id]
+            breadcrumbs.append({"id": id, "name": self.names[position], "slug": self.slugs[position]})
+        return breadcrumbs
+
+
+_tree_index = None
+
+
+def get_category_tree():
+    """
+    Return the category tree snapshot of this worker, rebuilt lazily when the tree version changes.
+    The snapshot is never mutated, so it's swapped as a whole and safe to share between threads.
+    """
+    global _tree_index
+    version = get_cache_version(CATEGORY_TREE_VERSION)
+    tree_index = _tree_index
+    if tree_index is None or tree_index.version != version:
+        tree_index = _tree_index = CategoryTreeIndex.load(version)
+    return tree_index
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from .views import CategoryListAPIView, CategoryCreateAPIView, CategoryUpdateDeleteAPIView
+from .views import CategoryListAPIView, CategoryTreeAPIView, CategoryProductListAPIView, CategoryCreateAPIView, CategoryUpdateDeleteAPIView
 
 
 """
@@ -10,6 +10,9 @@ BASE ENDPOINT /api/categories/
 
 urlpatterns = [
     path('list/', CategoryListAPIView.as_view(), name='list'),
+    path('tree/', CategoryTreeAPIView.as_view(), name='tree'),
     path('create/', CategoryCreateAPIView.as_view(), name='create'),
+    # category slugs are ancestors paths, so the products endpoint is prefixed rather than suffixed.
+    path('products/<path:category_slug>/', CategoryProductListAPIView.as_view(), name='products'),
     path('<path:category_slug>/', CategoryUpdateDeleteAPIView.as_view(), name='detail-update-delete'),        
 ]
\ No newline at end of file
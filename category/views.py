@@ -1,17 +1,60 @@
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 
+from mptt.utils import get_cached_trees
+
 from rest_framework import generics, mixins, permissions
+from rest_framework.views import APIView
+from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 
+from product.models import Product
+from product.pagination import ProductCursorPagination
+from product.serializers import ProductListSerializer
+from .cache import get_or_set_category_tree
 from .models import Category
+from .tree import get_category_tree
 from .permissions import IsAdmin, IsAdminOrReadOnly
+from .base_serializers import CategoryTreeSerializer
 from .serializers import CategorySerializer, CategoryListSerializer
 
 
 class CategoryListAPIView(generics.ListAPIView):
     """Category list API view."""
-    queryset = Category.objects.root_nodes()
+    queryset = Category.objects.root_nodes().prefetch_related('children')
     serializer_class = CategoryListSerializer
+
+
+class CategoryTreeAPIView(APIView):
+    """
+    Category full tree API view.
+    Loads all the categories with one ordered query, and serves the serialized tree from the cache
+    until the category tree version is bumped.
+    """
+    def get(self, request, *args, **kwargs):
+        data = get_or_set_category_tree(request, lambda: CategoryTreeSerializer(
+                    get_cached_trees(Category.objects.order_by('tree_id', 'lft')), many=True,
+                    context={"request": request}).data)
+        return Response(data)
+
+
+class CategoryProductListAPIView(generics.ListAPIView):
+    """
+    Category products list API view.
+    List the products of the category & all its descendants, keyset paginated.
+    """
+    serializer_class = ProductListSerializer
+    pagination_class = ProductCursorPagination
+
+    def get_queryset(self):
+        tree = get_category_tree()
+        category = tree.get_category(tree.get_id(self.kwargs.get("category_slug")))
+        if category is None:
+            raise Http404
+        return Product.objects.get_descendants_products(category)
+
+    def get_serializer_context(self, *args, **kwargs):
+        return {"request":self.request}
     
 
 class CategoryCreateAPIView(generics.CreateAPIView):
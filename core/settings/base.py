@@ -129,6 +129,39 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
 # Media files (Uploaded Images)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Absolute media origin (eg: a CDN), if not set it's built from the request host.
+MEDIA_BASE_URL = os.environ.get('MEDIA_BASE_URL', '')
+
+# Images renditions widths & formats, rendered by a pool of processes (none renders in the job thread)
+IMAGE_RENDITION_WIDTHS = [160, 480, 1080]
+IMAGE_RENDITION_FORMATS = ['jpeg', 'webp']
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_RENDITION_WORKERS = 2
+# Rendition of the product thumbnail in the products lists
+IMAGE_LIST_RENDITION_WIDTH = 160
+IMAGE_LIST_RENDITION_FORMAT = 'jpeg'
+
+# Cache, shared by all the worker processes (eg: memcached), as it keeps the namespaces versions counters.
+# The local memory default only suits a single process.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+PRODUCT_LIST_CACHE_TIMEOUT = 60 * 5
+CATEGORY_TREE_CACHE_TIMEOUT = 60 * 60
+
+# Product search price facet buckets boundaries
+PRODUCT_SEARCH_PRICE_BUCKETS = [50, 100, 250, 500, 1000]
+
+# Merchant catalog imports rows validated & written per batch, and failed rows errors kept per import
+CATALOG_IMPORT_BATCH_SIZE = 1000
+CATALOG_IMPORT_MAX_ERRORS = 1000
+
+# Merchant products bulk price & stock updates rows per request, and rows written per query
+PRODUCT_BULK_UPDATE_MAX_ROWS = 10000
+PRODUCT_BULK_UPDATE_BATCH_SIZE = 500
 
 # Authentication Backends
 AUTH_USER_MODEL = 'accounts.User'
@@ -3,10 +3,12 @@ from rest_framework.test import APIClient, APIRequestFactory
 from pytest_factoryboy import register
 
 # from accounts.tests.factories import MerchantUserFactory
+from category.tests.factories import ParentCategoryFactory
 from .factories import MerchantFactory, MerchantUserFactory
 
 register(MerchantFactory)
 register(MerchantUserFactory)
+register(ParentCategoryFactory)
 
 
 @pytest.fixture
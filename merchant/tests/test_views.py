@@ -1,8 +1,13 @@
 import json
 
 from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from merchant.models import Merchant
+from product.imports import run_catalog_import
+from product.models import CatalogImport, Product, ProductVariant
 
 
 class TestUpdateDetailMerchant:
@@ -25,4 +30,107 @@ class TestUpdateDetailMerchant:
         new_merchant_user.refresh_from_db()
         assert response.status_code == 200
         assert new_merchant_user.first_name == 'test name'
-        assert new_merchant.company_name == 'microsoft'
\ No newline at end of file
+        assert new_merchant.company_name == 'microsoft'
+
+
+class TestCatalogImport:
+
+    url = reverse('merchant-api:catalog-import-list-create')
+
+    def test_catalog_import_upload_and_run(self, db, new_merchant, parent_category_factory, api_client):
+        """Test uploading a csv catalog creates a pending import, which reports its progress & rows errors."""
+        category = parent_category_factory.create()
+        catalog = (f"name,description,details,category,max_price,total_in_stock\n"
+                    f"csv product,description,details,{category.slug},100,5\n"
+                    f"csv product,description,details,unknown-category,100,5\n")
+        api_client.force_authenticate(new_merchant.user)
+        response = api_client.post(self.url, {'file': SimpleUploadedFile('catalog.csv', catalog.encode())},
+                                    format='multipart')
+        assert response.status_code == 201
+        assert response.data['status'] == 'Pending'
+        assert response.data['file_format'] == 'csv'
+        run_catalog_import(response.data['id'])
+        response = api_client.get(reverse('merchant-api:catalog-import-detail', args=[response.data['id']]))
+        assert response.status_code == 200
+        assert (response.data['status'], response.data['progress']) == ('Done', 100)
+        assert (response.data['rows_count'], response.data['created_count'], response.data['failed_count']) == (2, 1, 1)
+        assert response.data['rows_errors'] == [{'row': 2, 'errors': {'category': ["Category with this slug doesn't exist."]}}]
+        assert Product.objects.filter(merchant=new_merchant, name='csv product').count() == 1
+
+    def test_catalog_import_unknown_format(self, db, new_merchant, api_client):
+        """Test uploading a catalog file of an unknown format."""
+        api_client.force_authenticate(new_merchant.user)
+        response = api_client.post(self.url, {'file': SimpleUploadedFile('catalog.xml', b'<catalog/>')},
+                                    format='multipart')
+        assert response.status_code == 400
+        assert CatalogImport.objects.count() == 0
+
+
+class TestProductBulkUpdate:
+
+    url = reverse('merchant-api:product-bulk-update')
+
+    @staticmethod
+    def create_products(merchant, category, count):
+        products = [Product.objects.create(merchant=merchant, category=category, name=f'bulk product {i}',
+                                            description='description', details='details', max_price=100,
+                                            total_in_stock=10) for i in range(count)]
+        variants = [ProductVariant.objects.create(product=product, max_price=100, total_in_stock=5)
+                    for product in products]
+        return products, variants
+
+    def test_bulk_update(self, db, new_merchant, merchant_factory, merchant_user_factory, parent_category_factory,
+                        api_client):
+        """Test bulk updating products & variants prices and stocks, with the result of each row."""
+        products, variants = self.create_products(new_merchant, parent_category_factory.create(), 2)
+        other_merchant = merchant_factory.create(user=merchant_user_factory.create(email='other@gmail.com'))
+        other_products, other_variants = self.create_products(other_merchant, products[0].category, 1)
+        rows = [{'product_id': products[0].id, 'max_price': '80', 'discount_price': '60'},
+                {'variant_id': variants[0].id, 'total_in_stock': 8},
+                {'product_id': products[1].id, 'discount_price': '200'},
+                {'product_id': other_products[0].id, 'max_price': '1'},
+                {'variant_id': variants[1].id, 'total_in_stock': 20},
+                {'product_id': products[1].id, 'variant_id': variants[1].id, 'max_price': '1'}]
+        api_client.force_authenticate(new_merchant.user)
+        response = api_client.post(self.url, {'rows': rows}, format='json')
+        assert response.status_code == 200
+        assert (response.data['updated_count'], response.data['failed_count']) == (2, 4)
+        assert [result.get('status') for result in response.data['results']] == [
+                'updated', 'updated', None, None, None, None]
+        assert list(response.data['results'][3]['errors']) == ['product_id']
+        products[0].refresh_from_db()
+        assert (products[0].max_price, products[0].discount_price) == (80, 60)
+        assert ProductVariant.objects.get(id=variants[0].id).total_in_stock == 8
+        assert ProductVariant.objects.get(id=variants[1].id).total_in_stock == 5
+        assert Product.objects.get(id=other_products[0].id).max_price == 100
+
+    def test_bulk_update_in_stock(self, db, new_merchant, parent_category_factory, api_client):
+        """Test bulk updating stocks to 0 clears in stock, and restocking sets it back."""
+        products, variants = self.create_products(new_merchant, parent_category_factory.create(), 1)
+        ProductVariant.objects.filter(id=variants[0].id).update(total_in_stock=0, is_in_stock=False)
+        rows = [{'product_id': products[0].id, 'total_in_stock': 0}, {'variant_id': variants[0].id, 'total_in_stock': 0}]
+        api_client.force_authenticate(new_merchant.user)
+        response = api_client.post(self.url, {'rows': rows}, format='json')
+        assert response.data['updated_count'] == 2
+        assert Product.objects.filter(id=products[0].id).values_list('total_in_stock', 'is_in_stock').get() == (0, False)
+        rows = [{'product_id': products[0].id, 'total_in_stock': 10}, {'variant_id': variants[0].id, 'total_in_stock': 3}]
+        response = api_client.post(self.url, {'rows': rows}, format='json')
+        assert response.data['updated_count'] == 2
+        assert Product.objects.filter(id=products[0].id).values_list('total_in_stock', 'is_in_stock').get() == (10, True)
+        assert ProductVariant.objects.filter(id=variants[0].id).values_list(
+                                                    'total_in_stock', 'is_in_stock').get() == (3, True)
+
+    def test_bulk_update_fixed_queries(self, db, new_merchant, parent_category_factory, api_client):
+        """Test bulk update queries count doesn't grow with the rows."""
+        products, variants = self.create_products(new_merchant, parent_category_factory.create(), 10)
+        api_client.force_authenticate(new_merchant.user)
+        queries_counts = []
+        for count in (2, 10):
+            rows = [{'product_id': product.id, 'max_price': '90', 'discount_price': '80', 'total_in_stock': 9}
+                    for product in products[:count]]
+            rows += [{'variant_id': variant.id, 'discount_price': '50'} for variant in variants[:count]]
+            with CaptureQueriesContext(connection) as queries:
+                response = api_client.post(self.url, {'rows': rows}, format='json')
+            assert response.data['updated_count'] == count * 2
+            queries_counts.append(len(queries))
+        assert queries_counts[0] == queries_counts[1]
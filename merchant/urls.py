@@ -1,6 +1,7 @@
 from django.urls import path
 
-from .views import UpdateDetailMerchantAPIView, MerchantProductListAPIView
+from .views import (UpdateDetailMerchantAPIView, MerchantProductListAPIView, MerchantProductBulkUpdateAPIView,
+                    CatalogImportListCreateAPIView, CatalogImportDetailAPIView)
 
 
 """
@@ -11,4 +12,7 @@ BASE ENDPOINT /api/merchants/
 urlpatterns = [
     path('my-profile/', UpdateDetailMerchantAPIView.as_view(), name='merchant-profile-detail-update'),
     path('my-products/', MerchantProductListAPIView.as_view(), name='my-product-list'),
+    path('products/bulk-update/', MerchantProductBulkUpdateAPIView.as_view(), name='product-bulk-update'),
+    path('catalog-imports/', CatalogImportListCreateAPIView.as_view(), name='catalog-import-list-create'),
+    path('catalog-imports/<int:import_id>/', CatalogImportDetailAPIView.as_view(), name='catalog-import-detail'),
 ]
\ No newline at end of file
@@ -1,9 +1,13 @@
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 
 from rest_framework import generics, permissions
+from rest_framework.response import Response
 
-from product.serializers import ProductListSerializer
-from product.models import Product
+from product.bulk import bulk_update_prices_stock
+from product.imports import enqueue_catalog_import
+from product.serializers import ProductListSerializer, ProductBulkUpdateSerializer, CatalogImportSerializer
+from product.models import Product, CatalogImport
 from .models import Merchant
 from .serializers import MerchantDetailSerializer
 from .permissions import IsMerchant, IsMerchantOwner
@@ -41,4 +45,53 @@ class MerchantProductListAPIView(generics.ListAPIView):
         Return a list of all the products
         for the currently authenticated merchant.
         """
-        return Product.objects.filter(merchant=self.request.user.merchant)
\ No newline at end of file
+        return Product.objects.filter(merchant=self.request.user.merchant)
+
+
+class MerchantProductBulkUpdateAPIView(generics.GenericAPIView):
+    """
+    Merchant products & variants bulk price & stock update API view.
+    Rows are {product_id or variant_id, max_price, discount_price, total_in_stock},
+    the valid rows are applied and the result of each row is returned.
+    """
+    permission_classes = [IsMerchant]
+    serializer_class = ProductBulkUpdateSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_update_prices_stock(request.user.merchant, serializer.validated_data['rows'])
+        failed_count = sum('errors' in result for result in results)
+        return Response({"updated_count": len(results) - failed_count, "failed_count": failed_count,
+                        "results": results})
+
+
+###
+# Catalog Import
+###
+class CatalogImportListCreateAPIView(generics.ListCreateAPIView):
+    """
+    Merchant catalog imports list & upload API view.
+    The uploaded json lines or csv catalog is imported in the background once the job is saved,
+    its progress & rows errors are polled from the import detail.
+    """
+    permission_classes = [IsMerchant]
+    serializer_class = CatalogImportSerializer
+
+    def get_queryset(self, *args, **kwargs):
+        return CatalogImport.objects.filter(merchant=self.request.user.merchant)
+
+    def perform_create(self, serializer):
+        catalog_import = serializer.save(merchant=self.request.user.merchant)
+        transaction.on_commit(lambda: enqueue_catalog_import(catalog_import.id))
+
+
+class CatalogImportDetailAPIView(generics.RetrieveAPIView):
+    """Merchant catalog import detail API view, with its progress & rows errors."""
+    permission_classes = [IsMerchantOwner]
+    serializer_class = CatalogImportSerializer
+
+    def get_object(self, *args, **kwargs):
+        obj = get_object_or_404(CatalogImport, id=self.kwargs.get('import_id'))
+        self.check_object_permissions(self.request, obj)
+        return obj
\ No newline at end of file
@@ -1,24 +1,108 @@
-from django.shortcuts import get_object_or_404
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.db import transaction
+from django.utils import timezone
 
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator, UniqueTogetherValidator
 
 
+from product.cache import CATALOG_VERSION, bump_cache_version_on_commit
 from product.mixins import TimestampMixin
+from product.models import ProductVariant
 from .models import Order, OrderItem, Coupon
 
 
 ###
 # Order
 ###
+def get_variants_quantities(items):
+    """Take order items data, and return their quantities summed by variant id, with the variants product id."""
+    variants_quantities = {}
+    for item in items:
+        variant = item['product_variant']
+        product_id, quantity = variants_quantities.get(variant.id, (variant.product_id, 0))
+        variants_quantities[variant.id] = (product_id, quantity + item.get('quantity', 1))
+    return variants_quantities
+
+
+def reserve_items_stock(items):
+    """
+    Take new order items data, and reserve their quantities from their variants & products stock
+    with conditional updates. Raise a validation error if a stock is short, so the order transaction is rolled back.
+    """
+    if not items:
+        return
+    short_variant_id = ProductVariant.objects.reserve_stock(get_variants_quantities(items))
+    if short_variant_id:
+        raise serializers.ValidationError({"order_items": {"quantity":
+            f"Product variant {short_variant_id} does not have enough stock for this quantity."}})
+    # the stock updates don't send the save signals which invalidate the cached product lists.
+    bump_cache_version_on_commit(CATALOG_VERSION)
+
+
+def release_items_stock(items):
+    """Take cancelled or decreased order items data, and release their quantities to their variants & products stock."""
+    if not items:
+        return
+    ProductVariant.objects.release_stock(get_variants_quantities(items))
+    bump_cache_version_on_commit(CATALOG_VERSION)
+
+
+def is_coupon_valid(coupon):
+    """Take a coupon, and return True if it's active and today is within its valid dates."""
+    return coupon.is_active and coupon.valid_from <= timezone.localdate() <= coupon.valid_to
+
+
+def get_item_total(purchase_price, quantity, discount):
+    """Take an item purchase price, quantity & discount percentage, and return its total rounded to the cent."""
+    line_total = purchase_price * quantity * (100 - discount) / 100
+    return line_total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def price_order_items(items, coupon=None):
+    """
+    Take new order items data with their loaded variants, and the order coupon, and set each item purchase price
+    to its variant actual price and its discount amount to the coupon discount percentage.
+    Return the order total, the sum of the items totals after the coupon discount, each rounded to the cent.
+    """
+    discount = coupon.discount_amount if coupon else 0
+    total = Decimal('0.00')
+    for item in items:
+        item['purchase_price'] = item['product_variant'].actual_price
+        item['discount_amount'] = discount
+        total += get_item_total(item['purchase_price'], item.get('quantity', 1), discount)
+    return total
+
+
+def get_order_total(order):
+    """Take an order, and return the sum of its saved items totals."""
+    items = order.order_items.values_list('purchase_price', 'quantity', 'discount_amount')
+    return sum((get_item_total(*item) for item in items), Decimal('0.00'))
+
+
+class OrderVariantField(serializers.PrimaryKeyRelatedField):
+    """Product variant primary key field, which reads the variants loaded at once by the order serializer."""
+    def to_internal_value(self, data):
+        variants = self.context.get('order_variants')
+        if variants is not None:
+            try:
+                return variants[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
 class OrderItemSerializer(serializers.ModelSerializer, TimestampMixin):
     """Order item model serializer."""
     item_id = serializers.IntegerField(min_value=1, write_only=True, required=False)
+    product_variant = OrderVariantField(queryset=ProductVariant.objects.all())
 
     class Meta:
         model  = OrderItem
         fields = ["id", "item_id", "product_variant", "purchase_price", "discount_amount", "quantity"]
+        # orders items are priced from their variants & the order coupon.
+        read_only_fields = ['purchase_price', 'discount_amount']
 
     def create(self, validated_data):
         """Create new order item."""
@@ -34,6 +118,20 @@ class OrderSerializer(serializers.ModelSerializer, TimestampMixin):
     class Meta:
         model  = Order
         fields = ["id", "order_items", "shipping_address", "payment", "coupon", "total_paid", "billing_status", "shipping_status"]
+        # orders total is computed from their items.
+        read_only_fields = ['total_paid']
+
+    def to_internal_value(self, data):
+        """Load the variants of all the order items with one query, before the items are validated."""
+        items = data.get('order_items') if hasattr(data, 'get') else None
+        variants_ids = set()
+        for item in items if isinstance(items, list) else []:
+            try:
+                variants_ids.add(int(item['product_variant']))
+            except (KeyError, TypeError, ValueError):
+                continue
+        self.context['order_variants'] = ProductVariant.objects.in_bulk(variants_ids) if variants_ids else {}
+        return super().to_internal_value(data)
 
     def validate(self, data):
         """
@@ -50,38 +148,79 @@ class OrderSerializer(serializers.ModelSerializer, TimestampMixin):
                         raise serializers.ValidationError({"order_items": {"item_id": "This order does not have this item id."}})
                     #required fields
                     if 'item_id' not in item.keys():
-                        keys_lst = ['product_variant', 'purchase_price', 'quantity']
+                        keys_lst = ['product_variant', 'quantity']
                         for key in keys_lst:
                             if key not in item.keys():
                                 raise serializers.ValidationError({"order_items": {key: "This field is required."}})        
+        coupon = data.get('coupon')
+        if coupon and not is_coupon_valid(coupon):
+            raise serializers.ValidationError({"coupon": "This coupon is not valid."})
+        if not is_update:
+            # the prices & the total paid are computed from the variants, whatever the client sent.
+            data['total_paid'] = price_order_items(items or [], coupon)
         return data
 
     @transaction.atomic
     def create(self, validated_data):
-        """Create new order with order items as a nested serializer."""
+        """Create new order with order items as a nested serializer, reserving the items stock."""
         if 'order_items' in validated_data.keys():
             items = validated_data.pop('order_items')
+            reserve_items_stock(items)
             order_obj = Order.objects.create(**validated_data)
-            for item in items:
-                OrderItemSerializer.create(OrderItemSerializer(context={"order_id": order_obj.id}), validated_data=item)                           
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order_obj, **{key: value for key, value in item.items() if key != 'item_id'})
+                for item in items])
         else:
             order_obj = Order.objects.create(**validated_data)
         return order_obj
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        """Update order & items of nested serializer."""
-        if 'order_items' in validated_data.keys():
+        """
+        Update order & items of nested serializer, reserving the stock of the new items & increased quantities,
+        and releasing the stock of the decreased quantities. The new items & changed variants are priced, and the total
+        paid is recomputed from all the order items when the items or the coupon change.
+        """
+        coupon = validated_data.get('coupon', instance.coupon)
+        coupon_changed = 'coupon' in validated_data.keys() and getattr(coupon, 'id', None) != instance.coupon_id
+        items_changed = 'order_items' in validated_data.keys()
+        if items_changed:
             items = validated_data.pop('order_items')
+            items_objs = instance.order_items.select_related('product_variant').in_bulk(
+                                                [item['item_id'] for item in items if 'item_id' in item.keys()])
+            reserved_items, released_items, priced_items = [], [], []
+            for item in items:
+                if 'item_id' not in item.keys():
+                    reserved_items.append(item)
+                    priced_items.append(item)
+                    continue
+                item_obj = items_objs[item['item_id']]
+                variant = item.get('product_variant', item_obj.product_variant)
+                quantity = item.get('quantity', item_obj.quantity)
+                if variant.id != item_obj.product_variant_id:
+                    released_items.append({'product_variant': item_obj.product_variant, 'quantity': item_obj.quantity})
+                    reserved_items.append({'product_variant': variant, 'quantity': quantity})
+                    priced_items.append(item)
+                elif quantity > item_obj.quantity:
+                    reserved_items.append({'product_variant': variant, 'quantity': quantity - item_obj.quantity})
+                elif quantity < item_obj.quantity:
+                    released_items.append({'product_variant': variant, 'quantity': item_obj.quantity - quantity})
+            release_items_stock(released_items)
+            reserve_items_stock(reserved_items)
+            price_order_items(priced_items, coupon)
             for item in items:
                 # update existing items
                 if 'item_id' in item.keys():
-                    item_obj = get_object_or_404(OrderItem, id=item['item_id'])
+                    item_obj = items_objs[item['item_id']]
                     OrderItemSerializer.update(OrderItemSerializer(), instance=item_obj, validated_data=item)
                 # create new ones
                 else:
                     new_item_obj = OrderItemSerializer.create(OrderItemSerializer(context={"order_id": instance.id}), 
                                     validated_data=item)
+        if coupon_changed:
+            instance.order_items.update(discount_amount=coupon.discount_amount if coupon else 0)
+        if coupon_changed or items_changed:
+            validated_data['total_paid'] = get_order_total(instance)
         return super().update(instance, validated_data)
 
 
@@ -0,0 +1,12 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_delete
+
+from .models import OrderItem
+from .serializers import release_items_stock
+
+
+@receiver(post_delete, sender=OrderItem)
+def release_order_item_stock(sender, instance, *args, **kwargs):
+    """Release the deleted item quantity to its variant & product stock, unless its order was delivered."""
+    if instance.order.shipping_status == 'Pending':
+        release_items_stock([{'product_variant': instance.product_variant, 'quantity': instance.quantity}])
@@ -13,7 +13,7 @@ class CouponFactory(factory.django.DjangoModelFactory):
 
     code = "test code"
     valid_from = "2021-02-01"
-    valid_to = "2021-03-03"
+    valid_to = "2099-12-31"
     discount_amount = 10
     is_active = True
 
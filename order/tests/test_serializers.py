@@ -31,11 +31,11 @@ class TestOrderSerializer:
 
     def test_update_fields_required(self, db, new_order, new_product_variant):
         """Test required fields are not given while item id in not given in update view."""
-        self.data["order_items"] = [{"product_variant": 1, "quantity": 5}]
+        self.data["order_items"] = [{"purchase_price": 500, "quantity": 5}]
         serializer = OrderSerializer(data=self.data, instance=new_order, partial=True,
                         context={'is_update': True, "order_obj": new_order})
         assert serializer.is_valid() == False
-        assert serializer.errors['order_items']['purchase_price'] == 'This field is required.'
+        assert serializer.errors['order_items']['product_variant'] == 'This field is required.'
             
 
 class TestCouponSerializer:
@@ -1,5 +1,8 @@
 import json
+from decimal import Decimal
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from order.models import Order, OrderItem, Coupon
@@ -28,6 +31,81 @@ class TestOrder:
         assert response.status_code == 201
         assert Order.objects.count() == 1
 
+    def test_order_create_reserve_stock(self, db, new_customer_user, new_customer, new_shipping_address, new_payment,
+                                        new_coupon, new_product_variant, api_client):
+        """Test order create decrements the variant & product stock, and clears the variant in stock with the last unit."""
+        api_client.force_authenticate(new_customer_user)
+        data = dict(self.data, order_items=[
+            {'product_variant': new_product_variant.id, "purchase_price": 500, "quantity": 4},
+            {'product_variant': new_product_variant.id, "purchase_price": 500, "quantity": 6}])
+        response = api_client.post(self.list_create_endpoint, data, format='json')
+        assert response.status_code == 201
+        new_product_variant.refresh_from_db()
+        assert (new_product_variant.total_in_stock, new_product_variant.is_in_stock) == (0, False)
+        new_product_variant.product.refresh_from_db()
+        assert (new_product_variant.product.total_in_stock, new_product_variant.product.is_in_stock) == (40, True)
+
+    def test_order_create_short_stock(self, db, new_customer_user, new_customer, new_shipping_address, new_payment,
+                                        new_coupon, product_variant_factory, api_client):
+        """Test order create with a short stock line is rolled back with the stock of its other lines."""
+        api_client.force_authenticate(new_customer_user)
+        variant, short_variant = product_variant_factory.create(), product_variant_factory.create(total_in_stock=2)
+        data = dict(self.data, order_items=[
+            {'product_variant': variant.id, "purchase_price": 500, "quantity": 3},
+            {'product_variant': short_variant.id, "purchase_price": 500, "quantity": 3}])
+        response = api_client.post(self.list_create_endpoint, data, format='json')
+        assert response.status_code == 400
+        assert json.loads(response.content)['order_items']['quantity'] == (
+            f"Product variant {short_variant.id} does not have enough stock for this quantity.")
+        assert (Order.objects.count(), OrderItem.objects.count()) == (0, 0)
+        variant.refresh_from_db()
+        variant.product.refresh_from_db()
+        assert (variant.total_in_stock, variant.product.total_in_stock) == (10, 50)
+
+    def test_order_create_server_prices(self, db, new_customer_user, new_customer, new_shipping_address, new_payment,
+                                        new_coupon, product_variant_factory, api_client):
+        """Test order create prices the items from their variants and the coupon, whatever the client sent."""
+        api_client.force_authenticate(new_customer_user)
+        variant, full_price_variant = product_variant_factory.create(), product_variant_factory.create(discount_price=None)
+        data = dict(self.data, total_paid=1, order_items=[
+            {'product_variant': variant.id, "purchase_price": 1, "discount_amount": 100, "quantity": 3},
+            {'product_variant': full_price_variant.id, "quantity": 1}])
+        response = api_client.post(self.list_create_endpoint, data, format='json')
+        assert response.status_code == 201
+        order = Order.objects.get()
+        # (500 * 3 + 700) less the 10% coupon.
+        assert order.total_paid == Decimal('1980.00')
+        assert sorted(order.order_items.values_list('purchase_price', 'discount_amount', 'quantity')) == [
+            (Decimal('500.00'), 10, 3), (Decimal('700.00'), 10, 1)]
+
+    def test_order_create_invalid_coupon(self, db, new_customer_user, new_customer, new_shipping_address, new_payment,
+                                        coupon_factory, new_product_variant, api_client):
+        """Test order create with an expired or inactive coupon."""
+        api_client.force_authenticate(new_customer_user)
+        expired_coupon = coupon_factory.create(code='expired', valid_to='2021-03-03')
+        inactive_coupon = coupon_factory.create(code='inactive', is_active=False)
+        for coupon in [expired_coupon, inactive_coupon]:
+            response = api_client.post(self.list_create_endpoint, dict(self.data, coupon=coupon.id), format='json')
+            assert response.status_code == 400
+            assert json.loads(response.content)['coupon'] == ["This coupon is not valid."]
+        assert Order.objects.count() == 0
+
+    def test_order_create_fixed_lookups(self, db, new_customer_user, new_customer, new_shipping_address, new_payment,
+                                        new_coupon, product_variant_factory, api_client):
+        """Test order create loads all the items variants at once, only the stock reservations grow with the items."""
+        api_client.force_authenticate(new_customer_user)
+        variants = [product_variant_factory.create() for i in range(3)]
+        queries_counts = []
+        for order_variants in [variants[:1], variants]:
+            data = dict(self.data, order_items=[{'product_variant': variant.id, "quantity": 1}
+                                                for variant in order_variants])
+            with CaptureQueriesContext(connection) as queries:
+                response = api_client.post(self.list_create_endpoint, data, format='json')
+            assert response.status_code == 201
+            queries_counts.append(len(queries))
+        # one more variant stock update per variant.
+        assert queries_counts[1] == queries_counts[0] + 2
+
     def test_order_detail(self, db, new_customer_user, new_order, api_client):
         """Test order detail response status."""
         api_client.force_authenticate(new_customer_user)
@@ -35,14 +113,73 @@ class TestOrder:
         assert response.status_code == 200
 
     def test_order_update(self, db, new_customer_user, new_order, api_client):
-        """Test order update response status."""
+        """Test order update response status, the total paid is read only."""
         api_client.force_authenticate(new_customer_user)
         assert new_order.total_paid == 500
-        data = {'total_paid': 800}
+        data = {'total_paid': 800, 'billing_status': 'Paid'}
         response = api_client.patch(self.update_delete_endpoint, data)
         new_order.refresh_from_db()
         assert response.status_code == 200
-        assert new_order.total_paid == 800
+        assert (new_order.total_paid, new_order.billing_status) == (500, 'Paid')
+
+    def test_order_update_server_prices(self, db, new_customer_user, order_item_factory, product_variant_factory,
+                                        api_client):
+        """Test order update prices the new items, and recomputes the total paid when the items or the coupon change."""
+        api_client.force_authenticate(new_customer_user)
+        order_item = order_item_factory.create(discount_amount=10)
+        endpoint = reverse('order-api:orders-update-delete', kwargs={"order_id": order_item.order_id})
+        variant = product_variant_factory.create()
+        response = api_client.patch(endpoint, {'total_paid': 1, 'order_items': [
+            {'product_variant': variant.id, "purchase_price": 1, "discount_amount": 90, "quantity": 2}]}, format='json')
+        assert response.status_code == 200
+        order = Order.objects.get(id=order_item.order_id)
+        # (900 * 3 + 500 * 2) less the 10% coupon.
+        assert order.total_paid == Decimal('3330.00')
+        assert order.order_items.get(product_variant=variant).purchase_price == Decimal('500.00')
+        response = api_client.patch(endpoint, {'coupon': None}, format='json')
+        assert response.status_code == 200
+        order.refresh_from_db()
+        assert order.total_paid == Decimal('3700.00')
+        assert set(order.order_items.values_list('discount_amount', flat=True)) == {0}
+
+    def test_order_update_reserve_stock(self, db, new_customer_user, new_order_item, product_variant_factory, api_client):
+        """Test order update reserves the increased item quantities, releases the decreased ones, and fails when short."""
+        api_client.force_authenticate(new_customer_user)
+        endpoint = reverse('order-api:orders-update-delete', kwargs={"order_id": new_order_item.order_id})
+        variant = new_order_item.product_variant
+        response = api_client.patch(endpoint, {'order_items': [{'item_id': new_order_item.id, 'quantity': 5}]}, format='json')
+        assert response.status_code == 200
+        variant.refresh_from_db()
+        variant.product.refresh_from_db()
+        assert (variant.total_in_stock, variant.product.total_in_stock) == (8, 48)
+        response = api_client.patch(endpoint, {'order_items': [{'item_id': new_order_item.id, 'quantity': 1}]}, format='json')
+        assert response.status_code == 200
+        variant.refresh_from_db()
+        variant.product.refresh_from_db()
+        assert (variant.total_in_stock, variant.product.total_in_stock) == (12, 52)
+        response = api_client.patch(endpoint, {'order_items': [{'item_id': new_order_item.id, 'quantity': 14}]}, format='json')
+        assert response.status_code == 400
+        new_order_item.refresh_from_db()
+        variant.refresh_from_db()
+        assert (new_order_item.quantity, variant.total_in_stock) == (1, 12)
+        other_variant = product_variant_factory.create()
+        response = api_client.patch(endpoint, {'order_items': [
+            {'item_id': new_order_item.id, 'product_variant': other_variant.id, 'quantity': 2}]}, format='json')
+        assert response.status_code == 200
+        variant.refresh_from_db()
+        other_variant.refresh_from_db()
+        assert (variant.total_in_stock, other_variant.total_in_stock) == (13, 8)
+
+    def test_order_delete_release_stock(self, db, new_customer_user, new_order_item, api_client):
+        """Test order delete releases its items quantities to their variants & products stock."""
+        api_client.force_authenticate(new_customer_user)
+        endpoint = reverse('order-api:orders-update-delete', kwargs={"order_id": new_order_item.order_id})
+        variant = new_order_item.product_variant
+        response = api_client.delete(endpoint)
+        assert response.status_code == 204
+        variant.refresh_from_db()
+        variant.product.refresh_from_db()
+        assert (variant.total_in_stock, variant.is_in_stock, variant.product.total_in_stock) == (13, True, 53)
 
     def test_order_delete(self, db, new_customer_user, new_order, api_client):
         """Test order delete response status."""
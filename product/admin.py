@@ -13,4 +13,6 @@ admin.site.register(ProductVariantImage)
 admin.site.register(Question)
 admin.site.register(Answer)
 admin.site.register(Review)
-admin.site.register(Wishlist)
\ No newline at end of file
+admin.site.register(Wishlist)
+admin.site.register(CatalogImport)
+admin.site.register(MediaBlob)
\ No newline at end of file
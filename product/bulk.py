@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+from django import forms
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .imports import PRODUCT_FIELDS, check_prices, clean_fields
+from .models import Product, ProductVariant
+from .writes import after_bulk_write
+
+
+PRICE_STOCK_FIELDS = {name: PRODUCT_FIELDS[name] for name in ['max_price', 'discount_price', 'total_in_stock']}
+ID_FIELD = forms.IntegerField(min_value=1)
+# sqlite limits the parameters of a query, so the ids lookups are chunked.
+IDS_CHUNK_SIZE = 500
+
+
+def chunks(items, size=IDS_CHUNK_SIZE):
+    """Take items, and yield them in lists of the given size."""
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def get_stocks(products_ids):
+    """
+    Take products ids, and return their total in stock and their variants totals in stock by variant id,
+    with one query per chunk of products for each.
+    """
+    products_stocks, variants_stocks = {}, defaultdict(dict)
+    for ids in chunks(products_ids):
+        products_stocks.update(Product.objects.filter(id__in=ids).values_list('id', 'total_in_stock'))
+        for product_id, variant_id, total_in_stock in ProductVariant.objects.filter(product_id__in=ids).values_list(
+                                                                            'product_id', 'id', 'total_in_stock'):
+            variants_stocks[product_id][variant_id] = total_in_stock
+    return products_stocks, variants_stocks
+
+
+def clean_price_stock_row(row):
+    """Take a bulk update row, and return its kind (product or variant), its id and its cleaned fields."""
+    errors = {}
+    if not isinstance(row, dict):
+        return None, None, {}, {"non_field_errors": ["A json object is required."]}
+    kinds = [kind for kind in ('product', 'variant') if row.get(f'{kind}_id') not in (None, '')]
+    if len(kinds) != 1:
+        return None, None, {}, {"non_field_errors": ["Exactly one of product_id or variant_id is required."]}
+    kind = kinds[0]
+    obj_id = clean_fields(row, {f'{kind}_id': ID_FIELD}, [], errors).get(f'{kind}_id')
+    fields = clean_fields(row, PRICE_STOCK_FIELDS, [], errors)
+    if not fields and not errors:
+        errors['non_field_errors'] = ["At least one of max_price, discount_price or total_in_stock is required."]
+    return kind, obj_id, fields, errors
+
+
+def bulk_update_prices_stock(merchant, rows, batch_size=None):
+    """
+    Take a merchant and rows of product or variant ids with their new max price, discount price and total in stock,
+    and apply the valid rows with chunked bulk updates, without the nested serializers & the save signals.
+    The ownership of all the rows is checked with set queries of ids per model, and the prices & stocks rules
+    of the product update are checked in memory over the whole batch. Return the result of each row.
+    """
+    results, cleaned_rows = [], []
+    ids = {'product': set(), 'variant': set()}
+    for row_number, row in enumerate(rows, 1):
+        kind, obj_id, fields, errors = clean_price_stock_row(row)
+        if errors:
+            results.append({"row": row_number, "errors": errors})
+            continue
+        ids[kind].add(obj_id)
+        cleaned_rows.append((row_number, kind, obj_id, fields))
+        results.append(None)
+    # merchant owned products & variants, with one ids query per chunk of rows.
+    querysets = {
+        'product': Product.objects.filter(merchant=merchant).only(
+                        'id', 'max_price', 'discount_price', 'total_in_stock', 'is_in_stock', 'updated_at'),
+        'variant': ProductVariant.objects.filter(product__merchant=merchant).only(
+                        'id', 'product_id', 'max_price', 'discount_price', 'total_in_stock', 'is_in_stock', 'updated_at'),
+    }
+    owned = {'product': {}, 'variant': {}}
+    for kind, queryset in querysets.items():
+        for chunk in chunks(ids[kind]):
+            owned[kind].update(queryset.in_bulk(chunk))
+    valid_rows = []
+    for row_number, kind, obj_id, fields in cleaned_rows:
+        obj = owned[kind].get(obj_id)
+        errors = {}
+        if obj is None:
+            errors[f'{kind}_id'] = [f"This merchant has no {kind} with this id."]
+        else:
+            check_prices(fields.get('max_price', obj.max_price), fields.get('discount_price', obj.discount_price),
+                        errors)
+        if errors:
+            results[row_number - 1] = {"row": row_number, "errors": errors}
+        else:
+            valid_rows.append((row_number, kind, obj, fields))
+    # variants totals in stock can't be greater than their product total in stock, after all the rows.
+    stock_products_ids = {obj.id if kind == 'product' else obj.product_id
+                            for row_number, kind, obj, fields in valid_rows if 'total_in_stock' in fields}
+    products_stocks, variants_stocks = get_stocks(stock_products_ids)
+    for row_number, kind, obj, fields in valid_rows:
+        if 'total_in_stock' in fields:
+            if kind == 'product':
+                products_stocks[obj.id] = fields['total_in_stock']
+            else:
+                variants_stocks[obj.product_id][obj.id] = fields['total_in_stock']
+    overstocked_products = {product_id for product_id, total_in_stock in products_stocks.items()
+                            if sum(variants_stocks[product_id].values()) > total_in_stock}
+    updated = {'product': {}, 'variant': {}}
+    now = timezone.now()
+    for row_number, kind, obj, fields in valid_rows:
+        product_id = obj.id if kind == 'product' else obj.product_id
+        if 'total_in_stock' in fields and product_id in overstocked_products:
+            results[row_number - 1] = {"row": row_number, "errors": {"total_in_stock": [
+                "total in stock of variants can't be greater than total of stock of product."]}}
+            continue
+        for name, value in fields.items():
+            setattr(obj, name, value)
+        if 'total_in_stock' in fields:
+            obj.is_in_stock = fields['total_in_stock'] > 0
+        obj.updated_at = now
+        updated[kind][obj.id] = obj
+        results[row_number - 1] = {"row": row_number, f"{kind}_id": obj.id, "status": "updated"}
+    fields = list(PRICE_STOCK_FIELDS) + ['is_in_stock', 'updated_at']
+    batch_size = batch_size or settings.PRODUCT_BULK_UPDATE_BATCH_SIZE
+    with transaction.atomic():
+        Product.objects.bulk_update(updated['product'].values(), fields, batch_size=batch_size)
+        ProductVariant.objects.bulk_update(updated['variant'].values(), fields, batch_size=batch_size)
+        if updated['product'] or updated['variant']:
+            # the prices & stocks aren't indexed, and no image is written.
+            after_bulk_write()
+    return results
@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import urlencode
+
+
+CATALOG_VERSION = 'catalog'
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def get_cache_versions(*names):
+    """
+    Take cache namespaces names, and return their current version counters, read with one cache lookup.
+    The counters are kept in the shared cache backend, so a bump in a worker process is seen by all the others.
+    A missing counter starts from the current time in milliseconds, so it is always
+    greater than any version used before it was evicted.
+    """
+    keys = [_version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    missing_keys = [key for key in keys if key not in versions]
+    if missing_keys:
+        for key in missing_keys:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+        versions.update(cache.get_many(missing_keys))
+    return [versions[key] for key in keys]
+
+
+def get_cache_version(name):
+    """Take a cache namespace name, and return its current version counter."""
+    return get_cache_versions(name)[0]
+
+
+def bump_cache_version(name):
+    """Take a cache namespace name, and increase its version so all its cached entries become stale."""
+    key = _version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # evicted, it starts again after the versions used before.
+        return get_cache_version(name)
+
+
+def bump_cache_version_on_commit(name):
+    """
+    Bump the version once the transaction commits, so entries rebuilt from pre-commit reads are dropped too.
+    Out of a transaction the version is bumped right away.
+    """
+    transaction.on_commit(lambda: bump_cache_version(name))
+
+
+def product_list_cache_key(request):
+    """Take a request, and return the cache key of its product list page."""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    version = get_cache_version(CATALOG_VERSION)
+    return f'product-list:{version}:{request.get_host()}:{query}'
+
+
+def get_or_set_product_list_page(request, build_page):
+    """Return the cached product list page of the request, build and cache it if missing."""
+    cache_key = product_list_cache_key(request)
+    data = cache.get(cache_key)
+    if data is None:
+        data = build_page()
+        cache.set(cache_key, data, settings.PRODUCT_LIST_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,88 @@
+import json
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import filepath_to_uri
+
+from rest_framework import serializers
+
+
+# image formats of the stored files extensions, named as the renditions formats.
+IMAGE_EXTENSIONS_FORMATS = {'jpg': 'jpeg'}
+
+
+@lru_cache(maxsize=None)
+def get_media_base_url():
+    """Return the configured absolute media base url (CDN origin) once per process, or None if not set."""
+    base_url = settings.MEDIA_BASE_URL
+    if base_url:
+        return base_url if base_url.endswith('/') else f'{base_url}/'
+    return None
+
+
+@receiver(setting_changed)
+def clear_media_base_url(sender, setting, *args, **kwargs):
+    """Reset the resolved media base url when media settings change."""
+    if setting in ('MEDIA_BASE_URL', 'MEDIA_URL'):
+        get_media_base_url.cache_clear()
+
+
+class MediaURLField(serializers.Field):
+    """
+    Read only field that returns the absolute url of a stored file, or of a stored file name.
+    The media base url is resolved once, then each url is a plain string concatenation
+    instead of a storage url call & request.build_absolute_uri() per row.
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    @property
+    def media_base_url(self):
+        # fall back to the requested host once per serializer when no base url is configured.
+        if not hasattr(self, '_media_base_url'):
+            base_url = get_media_base_url()
+            if base_url is None:
+                request = self.context.get('request')
+                base_url = request.build_absolute_uri(settings.MEDIA_URL) if request else settings.MEDIA_URL
+            self._media_base_url = base_url
+        return self._media_base_url
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return self.media_base_url + filepath_to_uri(getattr(value, 'name', value))
+
+
+class ImageSetField(MediaURLField):
+    """
+    Read only field that returns the image renditions & the original image, from the smallest one,
+    with their url, width, height, format & bytes, so clients pick the cheapest image of their viewport.
+    It's read from the renditions metadata recorded with the image, without any storage call.
+    """
+    def __init__(self, renditions_source, **kwargs):
+        self.renditions_source = renditions_source
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return super().get_attribute(instance), getattr(instance, self.renditions_source)
+
+    def to_representation(self, value):
+        image, renditions = value
+        if not image:
+            return []
+        metadata = json.loads(renditions) if renditions else {}
+        if metadata.get('source') != image.name:
+            # not rendered yet, the original image size isn't known.
+            metadata = {}
+        extension = os.path.splitext(image.name)[1].lstrip('.').lower()
+        images = [{"url": self.media_base_url + filepath_to_uri(rendition['name']), "width": rendition['width'],
+                    "height": rendition['height'], "format": rendition['format'], "bytes": rendition['bytes']}
+                    for rendition in metadata.get('renditions', [])]
+        images.append({"url": self.media_base_url + filepath_to_uri(image.name), "width": metadata.get('width'),
+                        "height": metadata.get('height'), "format": IMAGE_EXTENSIONS_FORMATS.get(extension, extension),
+                        "bytes": metadata.get('bytes')})
+        return images
@@ -0,0 +1,146 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, FloatField, Q, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from rest_framework import filters, serializers
+
+from category.tree import get_category_tree
+from .models import AttributeValue, ProductVariant
+
+
+def get_ids_list(value, param):
+    """Take a comma separated string of ids, and return a list of integers."""
+    try:
+        return [int(item) for item in value.split(',') if item]
+    except ValueError:
+        raise serializers.ValidationError({param: "A comma separated list of integers is required."})
+
+
+def get_price(value, param):
+    """Take a price string, and return a decimal."""
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise serializers.ValidationError({param: "A valid number is required."})
+
+
+def get_price_range(low=None, high=None, high_lookup='lte'):
+    """
+    Take the bounds of an effective price range, the discount price or the max price of the products without one,
+    and return its condition as an OR of two ranges on the columns, both on the active price index.
+    """
+    discount_price, max_price = Q(), Q(discount_price__isnull=True)
+    if low is not None:
+        discount_price &= Q(discount_price__gte=low)
+        max_price &= Q(max_price__gte=low)
+    if high is not None:
+        discount_price &= Q(**{f'discount_price__{high_lookup}': high})
+        max_price &= Q(**{f'max_price__{high_lookup}': high})
+    return discount_price | max_price
+
+
+class ProductSearchFilter(filters.BaseFilterBackend):
+    """
+    Filter products by the query params:
+    category: category slug, matches products of the category & all its descendants.
+    brand: comma separated brands slugs.
+    min_price & max_price: range of the product effective price, its discount price or its max price without one.
+    values: comma separated attribute values ids, products must have a variant with any of the
+    values of the same attribute, for each given attribute.
+    in_stock: true to get only products in stock.
+    """
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        # category subtree, as a range join on the mptt tree fields read from the category tree snapshot.
+        category_slug = params.get('category')
+        if category_slug:
+            tree = get_category_tree()
+            category = tree.get_category(tree.get_id(category_slug))
+            if category is None:
+                return queryset.none()
+            queryset = queryset.filter(category__tree_id=category.tree_id, category__lft__gte=category.lft,
+                                        category__rght__lte=category.rght)
+        # brands
+        brands = params.get('brand')
+        if brands:
+            queryset = queryset.filter(brand__slug__in=brands.split(','))
+        # effective price range
+        if params.get('min_price') or params.get('max_price'):
+            queryset = queryset.filter(get_price_range(
+                get_price(params['min_price'], 'min_price') if params.get('min_price') else None,
+                get_price(params['max_price'], 'max_price') if params.get('max_price') else None))
+        # variants attribute values, any value of the same attribute and all the given attributes.
+        values = params.get('values')
+        if values:
+            attributes_values = defaultdict(list)
+            for value_id, attribute_id in AttributeValue.objects.filter(
+                                            id__in=get_ids_list(values, 'values')).values_list('id', 'attribute_id'):
+                attributes_values[attribute_id].append(value_id)
+            if not attributes_values:
+                return queryset.none()
+            for values_ids in attributes_values.values():
+                queryset = queryset.filter(id__in=ProductVariant.objects.filter(
+                                            variant__in=values_ids).values('product_id'))
+        # stock
+        if params.get('in_stock') in ('true', 'True', '1'):
+            queryset = queryset.filter(is_in_stock=True)
+        return queryset
+
+
+class ProductOrderingFilter(filters.BaseFilterBackend):
+    """
+    Order products by the `ordering` query param, one of ORDERINGS, or by the pagination default ordering.
+    The rating average is computed from the stored rating aggregates, without the reviews,
+    and products without ratings are ordered after the rated ones.
+    """
+    ordering_param = 'ordering'
+    # the rating average annotation can't be named after the product rating_average property.
+    ORDERINGS = {'-rating_average': ('-rating_average_value', '-id')}
+
+    def get_ordering(self, request, queryset, view):
+        # ordering of the cursor pagination, which builds its cursors positions from the first field.
+        ordering = request.query_params.get(self.ordering_param)
+        if ordering in self.ORDERINGS:
+            return self.ORDERINGS[ordering]
+        return view.pagination_class.ordering
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if 'rating_average_value' in ordering[0]:
+            queryset = queryset.annotate(rating_average_value=Coalesce(ExpressionWrapper(
+                Cast('rating_sum', FloatField()) / NullIf('rating_count', 0), output_field=FloatField()), Value(0.0)))
+        return queryset.order_by(*ordering)
+
+
+def get_price_buckets():
+    """Return the price buckets ranges, from the configured buckets boundaries."""
+    boundaries = [Decimal(0)] + [Decimal(boundary) for boundary in settings.PRODUCT_SEARCH_PRICE_BUCKETS]
+    return list(zip(boundaries, boundaries[1:] + [None]))
+
+
+def get_product_facets(queryset):
+    """
+    Take a filtered products queryset, and return
+    the brands, attribute values and price buckets facets counts, with one grouped query each.
+    """
+    products = queryset.order_by()
+    brands = products.filter(brand__isnull=False).values('brand_id', 'brand__name', 'brand__slug').annotate(
+                count=Count('id')).order_by('-count', 'brand__name')
+    values = AttributeValue.objects.filter(productvariant__product__in=products.values('id')).values(
+                'id', 'name', 'attribute_id', 'attribute__name').annotate(
+                count=Count('productvariant__product', distinct=True)).order_by('attribute__name', 'name')
+    price_buckets = get_price_buckets()
+    buckets_counts = products.aggregate(**{
+        f'bucket_{i}': Count('id', filter=get_price_range(low, high, high_lookup='lt'))
+        for i, (low, high) in enumerate(price_buckets)})
+    return {
+        "brands": [{"id": brand['brand_id'], "name": brand['brand__name'], "slug": brand['brand__slug'],
+                    "count": brand['count']} for brand in brands],
+        "values": [{"id": value['id'], "name": value['name'], "attribute_id": value['attribute_id'],
+                    "attribute_name": value['attribute__name'], "count": value['count']} for value in values],
+        "prices": [{"min": low, "max": high, "count": buckets_counts[f'bucket_{i}']}
+                    for i, (low, high) in enumerate(price_buckets)],
+    }
@@ -0,0 +1,37 @@
+import io
+
+from PIL import Image
+
+
+# Pillow only, without django imports, so the renditions process pool workers start light.
+PIL_FORMATS = {'jpeg': 'JPEG', 'webp': 'WEBP'}
+
+
+def render_renditions(content, widths, formats, quality):
+    """
+    Take an image content, the renditions widths & formats and the encoding quality, and return the image
+    width & height with the encoded renditions as (width, height, format, content) tuples.
+    Only the widths smaller than the image are rendered, an image smaller than all the widths has none,
+    and a content which isn't a readable image has no size nor renditions.
+    """
+    try:
+        image = Image.open(io.BytesIO(content))
+        width, height = image.size
+        widths = sorted(target for target in widths if target < width)
+        if not widths:
+            return width, height, []
+        # jpeg images are decoded at the smallest scale still larger than the biggest rendition.
+        image.draft('RGB', (widths[-1], max(1, height * widths[-1] // width)))
+        image = image.convert('RGB')
+    except OSError:
+        return None, None, []
+    renditions = []
+    for target in reversed(widths):
+        # each rendition is resized from the previous larger one, which is faster & close enough.
+        image = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+        for image_format in formats:
+            output = io.BytesIO()
+            image.save(output, PIL_FORMATS[image_format], quality=quality)
+            renditions.append((target, image.height, image_format, output.getvalue()))
+    renditions.sort(key=lambda rendition: rendition[0])
+    return width, height, renditions
@@ -0,0 +1,398 @@
+import csv
+import io
+import json
+import logging
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from brand.models import Brand
+from category.tree import get_category_tree
+from .jobs import LocalJobQueue
+from .models import AttributeValue, CatalogImport, Product, ProductImage, ProductVariant, ProductVariantImage
+from .storage import is_blob
+from .utils import unique_slugs_generator
+from .writes import after_bulk_write
+
+
+logger = logging.getLogger(__name__)
+
+
+class RowError(Exception):
+    """Invalid catalog row, with its errors by field."""
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class ImportClaimLost(Exception):
+    """The catalog import job was claimed by another process."""
+
+
+def read_jsonl_rows(file):
+    """Take a json lines catalog file, and yield its products rows line by line."""
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            row = RowError({"non_field_errors": [f"Invalid json: {error}"]})
+        if not isinstance(row, (dict, RowError)):
+            row = RowError({"non_field_errors": ["A json object is required."]})
+        yield row
+
+
+def read_csv_rows(file):
+    """Take a csv catalog file with a header row, and yield its products rows row by row."""
+    yield from csv.DictReader(file)
+
+
+READERS = {'jsonl': read_jsonl_rows, 'csv': read_csv_rows}
+
+PRODUCT_FIELDS = {
+    'name': forms.CharField(max_length=64),
+    'description': forms.CharField(max_length=255),
+    'details': forms.CharField(),
+    'max_price': forms.DecimalField(max_digits=10, decimal_places=2, min_value=0),
+    'discount_price': forms.DecimalField(max_digits=10, decimal_places=2, min_value=0),
+    'total_in_stock': forms.IntegerField(min_value=0),
+    'is_in_stock': forms.NullBooleanField(),
+    'is_active': forms.NullBooleanField(),
+    'thumbnail': forms.CharField(max_length=100),
+}
+VARIANT_FIELDS = {
+    'max_price': PRODUCT_FIELDS['max_price'],
+    'discount_price': PRODUCT_FIELDS['discount_price'],
+    'total_in_stock': PRODUCT_FIELDS['total_in_stock'],
+    'is_in_stock': forms.NullBooleanField(),
+    'is_active': forms.NullBooleanField(),
+    'is_default': forms.NullBooleanField(),
+}
+REQUIRED_PRODUCT_FIELDS = ['name', 'description', 'details', 'max_price', 'total_in_stock']
+REQUIRED_VARIANT_FIELDS = ['max_price', 'total_in_stock']
+
+
+def clean_fields(data, fields, required, errors, prefix=''):
+    """
+    Take a row data and its form fields, and return the cleaned values of the given fields.
+    Empty values are missing values, the errors are added to the errors dict by field.
+    """
+    cleaned = {}
+    for name, field in fields.items():
+        value = data.get(name)
+        if value is None or value == '':
+            if name in required:
+                errors[f'{prefix}{name}'] = ["This field is required."]
+            continue
+        try:
+            value = field.clean(value)
+        except ValidationError as error:
+            errors[f'{prefix}{name}'] = error.messages
+            continue
+        if value is not None:
+            cleaned[name] = value
+    return cleaned
+
+
+def check_prices(max_price, discount_price, errors, prefix=''):
+    """Take max & discount prices, and add an error if the discount price is greater than the max price."""
+    if max_price is not None and discount_price is not None and discount_price > max_price:
+        errors[f'{prefix}discount_price'] = ["Discount price can't be greater than maximum price."]
+
+
+class CatalogImporter:
+    """
+    Import a merchant catalog rows in batches, with bulk inserts & updates instead of the nested serializers.
+    A row with a slug updates the merchant product of this slug, any other row creates a new product with
+    its variants, existing products variants are kept as they are. The categories, brands & attribute values
+    are resolved through lookup maps loaded once, and each batch is written in its own transaction,
+    so a failed row, or the rows of a batch failing to be written, are reported without stopping the import.
+    """
+    def __init__(self, merchant, batch_size=None, max_errors=None):
+        self.merchant = merchant
+        self.batch_size = batch_size or settings.CATALOG_IMPORT_BATCH_SIZE
+        self.max_errors = max_errors if max_errors is not None else settings.CATALOG_IMPORT_MAX_ERRORS
+        self.rows_count = self.created_count = self.updated_count = self.failed_count = 0
+        self.errors = []
+        self.categories = get_category_tree()
+        self.brands = dict(Brand.objects.values_list('slug', 'id'))
+        self.values = {(attribute.title(), name.title()): id for attribute, name, id in
+                        AttributeValue.objects.values_list('attribute__name', 'name', 'id')}
+
+    def get_counts(self):
+        """Return the import rows counts so far."""
+        return {"rows_count": self.rows_count, "created_count": self.created_count,
+                "updated_count": self.updated_count, "failed_count": self.failed_count}
+
+    def add_error(self, row_number, errors):
+        self.failed_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def run(self, rows, on_batch=None, skip_rows=0):
+        """
+        Take the catalog rows, and import them batch by batch after the skipped rows, imported by a previous run.
+        on_batch is called with the importer in the transaction of each batch, so the saved progress is committed
+        with the batch rows.
+        """
+        batch = []
+        for row_number, row in enumerate(rows, 1):
+            if row_number <= skip_rows:
+                continue
+            batch.append((row_number, row))
+            if len(batch) == self.batch_size:
+                self.commit_batch(batch, on_batch)
+                batch = []
+        if batch:
+            self.commit_batch(batch, on_batch)
+        return self
+
+    def clean_row(self, row):
+        """Take a catalog row, and return the product fields and the variants data, or raise a RowError."""
+        if isinstance(row, RowError):
+            raise row
+        errors = {}
+        slug = (row.get('slug') or '').strip()
+        required = [] if slug else REQUIRED_PRODUCT_FIELDS
+        fields = clean_fields(row, PRODUCT_FIELDS, required, errors)
+        if slug:
+            fields['slug'] = slug
+        if row.get('category'):
+            fields['category_id'] = self.categories.get_id(row['category'])
+            if fields['category_id'] is None:
+                errors['category'] = ["Category with this slug doesn't exist."]
+        elif not slug:
+            errors['category'] = ["This field is required."]
+        if row.get('brand'):
+            fields['brand_id'] = self.brands.get(row['brand'])
+            if fields['brand_id'] is None:
+                errors['brand'] = ["Brand with this slug doesn't exist."]
+        variants = [] if slug else self.clean_variants(row.get('variants'), fields, errors)
+        if not slug:
+            check_prices(fields.get('max_price'), fields.get('discount_price'), errors)
+        if errors:
+            raise RowError(errors)
+        return fields, variants
+
+    def clean_variants(self, variants, fields, errors):
+        """Take a row variants (a json list in csv rows), and return the variants data with attribute values ids."""
+        if not variants:
+            return []
+        if isinstance(variants, str):
+            try:
+                variants = json.loads(variants)
+            except ValueError:
+                variants = None
+        if not isinstance(variants, list) or not all(isinstance(variant, dict) for variant in variants):
+            errors['variants'] = ["A list of variants objects is required."]
+            return []
+        cleaned_variants = []
+        for i, variant in enumerate(variants):
+            prefix = f'variants.{i}.'
+            data = clean_fields(variant, VARIANT_FIELDS, REQUIRED_VARIANT_FIELDS, errors, prefix)
+            check_prices(data.get('max_price'), data.get('discount_price'), errors, prefix)
+            data['variant'] = []
+            for attribute, name in (variant.get('values') or {}).items():
+                value_id = self.values.get((str(attribute).strip().title(), str(name).strip().title()))
+                if value_id is None:
+                    errors.setdefault(f'{prefix}values', []).append(f"Unknown attribute value {attribute}: {name}.")
+                data['variant'].append(value_id)
+            if not data['variant']:
+                errors[f'{prefix}values'] = ["This field is required."]
+            cleaned_variants.append(data)
+        variants_total_in_stock = sum(variant.get('total_in_stock', 0) for variant in cleaned_variants)
+        if 'total_in_stock' in fields and variants_total_in_stock > fields['total_in_stock']:
+            errors['variants'] = ["total in stock of variants can't be greater than total of stock of product."]
+        return cleaned_variants
+
+    def get_merchant_images(self, names):
+        """Take stored files names, and return the ones of the blobs already used by the merchant products images."""
+        names = {name for name in names if is_blob(name)}
+        if not names:
+            return set()
+        merchant_id = self.merchant.id
+        images = set(Product.objects.filter(merchant_id=merchant_id, thumbnail__in=names)
+                                    .values_list('thumbnail', flat=True))
+        images.update(ProductImage.objects.filter(product__merchant_id=merchant_id, image__in=names)
+                                    .values_list('image', flat=True))
+        images.update(ProductVariantImage.objects.filter(variant__product__merchant_id=merchant_id, image__in=names)
+                                    .values_list('image', flat=True))
+        return images
+
+    def commit_batch(self, batch, on_batch=None):
+        with transaction.atomic():
+            self.import_batch(batch)
+            if on_batch:
+                on_batch(self)
+
+    def import_batch(self, batch):
+        """Take a batch of numbered rows, and validate them then write the valid ones with bulk queries."""
+        cleaned_rows = []
+        for row_number, row in batch:
+            self.rows_count += 1
+            try:
+                cleaned_rows.append((row_number, *self.clean_row(row)))
+            except RowError as error:
+                self.add_error(row_number, error.errors)
+        # a thumbnail is the name of an image already stored for the merchant products, not any path.
+        thumbnails = self.get_merchant_images(fields['thumbnail'] for row_number, fields, variants in cleaned_rows
+                                                if 'thumbnail' in fields)
+        for row_number, fields, variants in cleaned_rows:
+            if 'thumbnail' in fields and fields['thumbnail'] not in thumbnails:
+                self.add_error(row_number, {"thumbnail": ["This merchant has no stored image with this name."]})
+        cleaned_rows = [(row_number, fields, variants) for row_number, fields, variants in cleaned_rows
+                        if 'thumbnail' not in fields or fields['thumbnail'] in thumbnails]
+        # the updated products are fetched by slug with one query per batch.
+        slugs = [fields['slug'] for row_number, fields, variants in cleaned_rows if 'slug' in fields]
+        existing = Product.objects.in_bulk(slugs, field_name='slug') if slugs else {}
+        new_products, updated_products, previous_states, updated_fields = [], {}, {}, {'updated_at'}
+        previous_thumbnails, written_rows = {}, []
+        now = timezone.now()
+        for row_number, fields, variants in cleaned_rows:
+            slug = fields.pop('slug', None)
+            if slug is None:
+                product = Product(merchant=self.merchant, **fields)
+                if not product.discount_price:
+                    product.discount_price = product.max_price
+                new_products.append((product, variants))
+                written_rows.append(row_number)
+                continue
+            product = existing.get(slug)
+            if product is None or product.merchant_id != self.merchant.id:
+                self.add_error(row_number, {"slug": ["This merchant has no product with this slug."]})
+                continue
+            errors = {}
+            check_prices(fields.get('max_price', product.max_price),
+                        fields.get('discount_price', product.discount_price), errors)
+            if errors:
+                self.add_error(row_number, errors)
+                continue
+            previous_states.setdefault(product.id, (product.brand_id, product.category_id, product.is_active))
+            previous_thumbnails.setdefault(product.id, product.thumbnail.name)
+            for name, value in fields.items():
+                setattr(product, name, value)
+                updated_fields.add(Product._meta.get_field(name).name)
+            product.updated_at = now
+            updated_products[product.id] = product
+            written_rows.append(row_number)
+        if not new_products and not updated_products:
+            return
+        products = [product for product, variants in new_products]
+        unique_slugs_generator(products)
+        try:
+            self.write_batch(products, new_products, updated_products, updated_fields, previous_states,
+                            previous_thumbnails)
+        except DatabaseError as error:
+            # like a slug taken by a concurrent insert, the batch is rolled back and only its rows fail.
+            logger.warning("Catalog import batch of rows %s-%s failed.", batch[0][0], batch[-1][0], exc_info=True)
+            for row_number in written_rows:
+                self.add_error(row_number, {"non_field_errors": [f"The row couldn't be written: {error}"]})
+            return
+        self.created_count += len(products)
+        self.updated_count += len(updated_products)
+
+    @transaction.atomic
+    def write_batch(self, products, new_products, updated_products, updated_fields, previous_states,
+                    previous_thumbnails):
+        """Take the cleaned new & updated products of a batch, and write them with bulk queries."""
+        Product.objects.bulk_create(products)
+        if products and not connections[Product.objects.db].features.can_return_ids_from_bulk_insert:
+            # the slugs are unique, so the new products ids are fetched by their slugs.
+            ids = {}
+            for i in range(0, len(products), 500):
+                ids.update(Product.objects.filter(slug__in=[product.slug for product in products[i:i + 500]])
+                                            .values_list('slug', 'id'))
+            for product in products:
+                product.id = ids[product.slug]
+        variants, variants_images = ProductVariant.objects.bulk_create_for_products(new_products)
+        if updated_products:
+            Product.objects.bulk_update(updated_products.values(), updated_fields)
+        written_products = products + list(updated_products.values())
+        Product.objects.update_counts(written_products, previous_states)
+        replaced_products = [product for product in updated_products.values()
+                            if product.thumbnail.name != previous_thumbnails[product.id]]
+        after_bulk_write(written_products,
+                        images=[(product.id, product.thumbnail.name) for product in products + replaced_products] +
+                                [(image.variant.product_id, image.image.name) for image in variants_images],
+                        released_images=[previous_thumbnails[product.id] for product in replaced_products])
+
+
+def claim_catalog_import(catalog_import, stale_after=None):
+    """
+    Take a catalog import job, and claim it for this process with one conditional update of its status,
+    if it's pending, or running without progress for stale_after. Return the claim time, or None if the job
+    was claimed by another process in the meantime.
+    """
+    now = timezone.now()
+    claimable = Q(status='Pending')
+    if stale_after is not None:
+        claimable |= Q(status='Running', updated_at__lt=now - stale_after)
+    fields = {'status': 'Running', 'updated_at': now}
+    if catalog_import.status == 'Pending':
+        fields['started_at'] = now
+    claimed = CatalogImport.objects.filter(claimable, id=catalog_import.id, status=catalog_import.status,
+                                            updated_at=catalog_import.updated_at).update(**fields)
+    return now if claimed else None
+
+
+def run_catalog_import(import_id, batch_size=None, stale_after=None):
+    """
+    Take a catalog import job id, and run it from its file once claimed, saving its progress after every batch.
+    A job running without progress for stale_after (a timedelta) is resumed after its last committed batch.
+    """
+    catalog_import = CatalogImport.objects.select_related('merchant').get(id=import_id)
+    claimed_at = claim_catalog_import(catalog_import, stale_after)
+    if claimed_at is None:
+        return
+    importer = CatalogImporter(catalog_import.merchant, batch_size=batch_size)
+    skip_rows = 0
+    if catalog_import.status == 'Running':
+        # a job left running by a stopped process resumes after the rows of its last committed batch.
+        skip_rows = importer.rows_count = catalog_import.rows_count
+        importer.created_count, importer.updated_count = catalog_import.created_count, catalog_import.updated_count
+        importer.failed_count, importer.errors = catalog_import.failed_count, catalog_import.rows_errors
+    size = catalog_import.file.size or 1
+    status = 'Done'
+    with catalog_import.file.open('rb') as raw_file:
+        # the file is streamed line by line, the progress is the share of the file read.
+        file = io.TextIOWrapper(raw_file, encoding='utf-8-sig', newline='')
+
+        def save_progress(importer):
+            # the progress is saved only while the job is still this process claim, else the batch is rolled back.
+            nonlocal claimed_at
+            progress, now = min(raw_file.tell() * 100 // size, 99), timezone.now()
+            if not CatalogImport.objects.filter(id=import_id, updated_at=claimed_at).update(
+                    progress=progress, errors=json.dumps(importer.errors), updated_at=now, **importer.get_counts()):
+                raise ImportClaimLost(import_id)
+            claimed_at = now
+
+        try:
+            importer.run(READERS[catalog_import.file_format](file), on_batch=save_progress, skip_rows=skip_rows)
+        except ImportClaimLost:
+            logger.warning("Catalog import %s was claimed by another process.", import_id)
+            return
+        except Exception as error:
+            logger.exception("Catalog import %s failed.", import_id)
+            status = 'Failed'
+            importer.errors.append({"row": importer.rows_count, "errors": {"non_field_errors": [str(error)]}})
+        finally:
+            file.detach()
+    CatalogImport.objects.filter(id=import_id, updated_at=claimed_at).update(
+        status=status, progress=100, finished_at=timezone.now(), updated_at=timezone.now(),
+        errors=json.dumps(importer.errors), **importer.get_counts())
+
+
+catalog_imports_queue = LocalJobQueue('catalog-imports', run_catalog_import)
+
+
+def enqueue_catalog_import(import_id):
+    """
+    Take a catalog import job id, and queue it for the imports worker thread of this process.
+    Jobs left pending or running by a restart are run by the import_catalog command.
+    """
+    catalog_imports_queue.enqueue(import_id)
@@ -0,0 +1,45 @@
+import logging
+import queue
+import threading
+
+from django.db import connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalJobQueue:
+    """
+    In process jobs queue, run one job at a time by a daemon worker thread started with the first job.
+    Queued jobs are lost with the process, so the work of each queue can be resumed by a management command.
+    """
+    def __init__(self, name, handler):
+        self.name = name
+        self.handler = handler
+        self.jobs = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def work(self):
+        while True:
+            args = self.jobs.get()
+            try:
+                self.handler(*args)
+            except Exception:
+                logger.exception("%s job %s failed.", self.name, args)
+            finally:
+                # the worker thread has its own database connections.
+                connections.close_all()
+                self.jobs.task_done()
+
+    def enqueue(self, *args):
+        """Take the handler arguments, and queue a job with them."""
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.work, name=self.name, daemon=True)
+                self.worker.start()
+        self.jobs.put(args)
+
+    def enqueue_on_commit(self, *args):
+        """Take the handler arguments, and queue a job with them once the current transaction is committed."""
+        transaction.on_commit(lambda: self.enqueue(*args))
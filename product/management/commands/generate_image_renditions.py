@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from product.models import Product
+from product.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    """Render the missing renditions of the products thumbnails, images & variants images."""
+    help = ("Render the missing renditions of the products thumbnails, images & variants images, "
+            "such as the images written in bulk or queued before a restart.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Products rendered per batch.")
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        products_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        recorded_count = 0
+        for i in range(0, len(products_ids), options['batch_size']):
+            recorded_count += generate_renditions(products_ids[i:i + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {recorded_count} images in {time.monotonic() - start:.2f} seconds."))
@@ -0,0 +1,59 @@
+import os
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from merchant.models import Merchant
+from product.imports import READERS, CatalogImporter, run_catalog_import
+from product.models import CatalogImport
+
+
+class Command(BaseCommand):
+    """Import a merchant catalog in bulk from a json lines or csv file, or run the pending uploaded imports."""
+    help = ("Import a merchant products catalog from a json lines or csv file, rows with a slug update "
+            "the merchant products. With --pending, run the uploaded imports left pending, and resume "
+            "the imports left running by a stopped process.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="Catalog file path.")
+        parser.add_argument('--merchant', type=int, help="Merchant id of the imported catalog.")
+        parser.add_argument('--format', choices=list(READERS), help="File format, guessed from the extension.")
+        parser.add_argument('--batch-size', type=int, help="Rows validated & written per batch.")
+        parser.add_argument('--pending', action='store_true', help="Run the pending uploaded imports.")
+        parser.add_argument('--stale-after', type=int, default=10 * 60,
+                            help="Seconds without progress before a running import is resumed by --pending.")
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            stale_after = timedelta(seconds=options['stale_after'])
+            stale_time = timezone.now() - stale_after
+            imports = CatalogImport.objects.filter(Q(status='Pending') | Q(status='Running', updated_at__lt=stale_time))
+            for import_id in imports.order_by('id').values_list('id', flat=True):
+                # each job is claimed first, a job claimed by a web process or another command is skipped.
+                run_catalog_import(import_id, batch_size=options['batch_size'], stale_after=stale_after)
+                catalog_import = CatalogImport.objects.get(id=import_id)
+                self.stdout.write(f"Import {import_id}: {catalog_import.status}, {catalog_import.created_count} "
+                                f"created, {catalog_import.updated_count} updated, "
+                                f"{catalog_import.failed_count} failed.")
+            return
+        if not options['path'] or not options['merchant']:
+            raise CommandError("A catalog file path and a merchant id are required.")
+        merchant = Merchant.objects.filter(id=options['merchant']).first()
+        if merchant is None:
+            raise CommandError(f"Merchant {options['merchant']} doesn't exist.")
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f"Unknown catalog file format: {file_format}")
+        start = time.monotonic()
+        with open(options['path'], encoding='utf-8-sig', newline='') as file:
+            importer = CatalogImporter(merchant, batch_size=options['batch_size']).run(READERS[file_format](file))
+        duration = time.monotonic() - start
+        for error in importer.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.rows_count} rows ({importer.created_count} created, {importer.updated_count} "
+            f"updated, {importer.failed_count} failed) in {duration:.2f} seconds, "
+            f"{importer.rows_count / duration if duration else 0:.0f} rows/s."))
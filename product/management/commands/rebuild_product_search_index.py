@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.search import is_search_index_available, rebuild_search_index
+
+
+class Command(BaseCommand):
+    """Rebuild the products full-text search index in bulk from the products table."""
+    help = "Rebuild the products full-text search index."
+
+    def handle(self, *args, **options):
+        if not is_search_index_available():
+            raise CommandError("The products search index requires an sqlite database with FTS5.")
+        start = time.monotonic()
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} products in {time.monotonic() - start:.2f} seconds."))
@@ -0,0 +1,41 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from product.cache import CATALOG_VERSION, bump_cache_version_on_commit
+from product.models import Product, Review
+
+
+class Command(BaseCommand):
+    """Recompute the products rating aggregates in bulk from the active reviews."""
+    help = "Recompute the products rating aggregates from the active reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Products updated per query.")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        # active reviews count of each product rate, in one grouped query.
+        rates_counts = defaultdict(dict)
+        for row in Review.objects.filter(is_active=True).values('product_id', 'rate').annotate(
+                                                            count=Count('id')).order_by():
+            rates_counts[row['product_id']][row['rate']] = row['count']
+        repaired_products = []
+        for product in Product.objects.only('id', *Product.RATING_FIELDS).order_by('id').iterator():
+            rates = rates_counts.get(product.id, {})
+            rating = {f'rating_{rate}_count': rates.get(rate, 0) for rate in range(1, 6)}
+            rating['rating_count'] = sum(rates.values())
+            rating['rating_sum'] = sum(rate * count for rate, count in rates.items())
+            if any(getattr(product, field) != value for field, value in rating.items()):
+                for field, value in rating.items():
+                    setattr(product, field, value)
+                repaired_products.append(product)
+        Product.objects.bulk_update(repaired_products, Product.RATING_FIELDS, batch_size=options['batch_size'])
+        if repaired_products:
+            bump_cache_version_on_commit(CATALOG_VERSION)
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired {len(repaired_products)} products ratings in {time.monotonic() - start:.2f} seconds."))
@@ -0,0 +1,81 @@
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from product.models import MediaBlob, Product, ProductImage, ProductVariantImage
+from product.renditions import RENDITIONS_PREFIX, get_rendition_root
+from product.storage import BLOBS_PREFIX, media_storage
+
+
+MEDIA_FIELDS = [(Product, 'thumbnail'), (ProductImage, 'image'), (ProductVariantImage, 'image')]
+
+
+class Command(BaseCommand):
+    """Recount the media blobs references from the images fields, and delete the unreferenced blobs."""
+    help = ("Recount the media blobs references from the products, images & variants images, "
+            "and delete the blobs without references, like uploads never saved to a row, with their renditions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help="Seconds before an unreferenced blob file is deleted, so uploads being saved are kept.")
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        # the same grace for the blobs rows & files, so uploads being saved are kept whole.
+        min_mtime = time.time() - options['min_age']
+        references, repaired_count = self.recount_references(timezone.now() - timedelta(seconds=options['min_age']))
+        # files are deleted once the recount is committed, and only when no blob row is left for them.
+        kept_names = set(MediaBlob.objects.values_list('name', flat=True))
+        deleted_count = 0
+        root = media_storage.path(BLOBS_PREFIX)
+        for directory, directories, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, media_storage.location).replace(os.sep, '/')
+                if name not in kept_names and os.path.getmtime(path) < min_mtime:
+                    os.remove(path)
+                    deleted_count += 1
+        # renditions of unreferenced blobs, stored beside their source name.
+        kept_roots = {os.path.splitext(name)[0] for name in kept_names}
+        root = media_storage.path(f'{RENDITIONS_PREFIX}{BLOBS_PREFIX}')
+        for directory, directories, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, media_storage.location).replace(os.sep, '/')
+                if get_rendition_root(name) not in kept_roots and os.path.getmtime(path) < min_mtime:
+                    os.remove(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted {len(references)} blobs references ({repaired_count} repaired), deleted {deleted_count} "
+            f"unreferenced blobs in {time.monotonic() - start:.2f} seconds."))
+
+    @transaction.atomic
+    def recount_references(self, min_updated_at):
+        """
+        Take the oldest update time of the kept unreferenced blobs, and recount the blobs references
+        in one transaction. Return the references counts and the number of repaired blobs.
+        """
+        # references of each blob, with one grouped query per images field.
+        references = Counter()
+        for model, field in MEDIA_FIELDS:
+            for row in model.objects.filter(**{f'{field}__startswith': BLOBS_PREFIX}).values(field).annotate(
+                                                                        count=Count('id')).order_by():
+                references[row[field]] += row['count']
+        blobs = MediaBlob.objects.in_bulk(field_name='name')
+        repaired_blobs = []
+        for name, blob in blobs.items():
+            if name in references and blob.references != references[name]:
+                blob.references = references[name]
+                repaired_blobs.append(blob)
+        MediaBlob.objects.bulk_update(repaired_blobs, ['references'])
+        MediaBlob.objects.bulk_create([MediaBlob(name=name, references=count) for name, count in references.items()
+                                        if name not in blobs])
+        stale_ids = [blob.id for name, blob in blobs.items() if name not in references]
+        for i in range(0, len(stale_ids), 500):
+            MediaBlob.objects.filter(id__in=stale_ids[i:i + 500], updated_at__lt=min_updated_at).delete()
+        return references, len(repaired_blobs)
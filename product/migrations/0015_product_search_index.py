@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # the FTS5 products search index is only available on sqlite.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS product_product_fts "
+                            "USING fts5(name, description, details, tokenize='unicode61 remove_diacritics 2')")
+    schema_editor.execute("INSERT INTO product_product_fts (rowid, name, description, details) "
+                            "SELECT id, name, description, details FROM product_product")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS product_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0014_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.19 on 2026-10-18 08:56
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_brands_products(apps, schema_editor):
+    Brand = apps.get_model('brand', 'Brand')
+    Product = apps.get_model('product', 'Product')
+    brands_counts = Product.objects.filter(brand__isnull=False).values_list('brand_id').annotate(
+                        count=Count('id')).order_by()
+    for brand_id, count in brands_counts:
+        Brand.objects.filter(id=brand_id).update(products_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brand', '0003_brand_products_count'),
+        ('product', '0016_product_rating'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', '-created_at', '-id'], name='product_brand_created_idx'),
+        ),
+        migrations.RunPython(count_brands_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def count_categories_products(apps, schema_editor):
+    Category = apps.get_model('category', 'Category')
+    Product = apps.get_model('product', 'Product')
+    direct_counts = dict(Product.objects.filter(is_active=True).values_list('category_id').annotate(
+                            count=Count('id')).order_by())
+    product_counts = defaultdict(int)
+    # descendants come after their ancestors in tree order, so they're totalled before them in reverse.
+    for id, parent_id in reversed(list(Category.objects.order_by('tree_id', 'lft').values_list('id', 'parent_id'))):
+        product_counts[id] += direct_counts.get(id, 0)
+        if parent_id:
+            product_counts[parent_id] += product_counts[id]
+    for id, product_count in product_counts.items():
+        if product_count:
+            Category.objects.filter(id=id).update(product_count=product_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0006_category_product_count'),
+        ('product', '0017_product_brand_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_categories_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.19 on 2026-10-18 09:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import product.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('merchant', '0002_auto_20211119_1347'),
+        ('product', '0018_category_product_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('file', models.FileField(upload_to=product.models.catalog_import_file)),
+                ('file_format', models.CharField(choices=[('jsonl', 'JSON lines'), ('csv', 'CSV')], max_length=5)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Running', 'Running'), ('Done', 'Done'), ('Failed', 'Failed')], default='Pending', max_length=7)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('rows_count', models.PositiveIntegerField(default=0)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('updated_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.TextField(blank=True, default='')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('merchant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_imports', to='merchant.Merchant')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
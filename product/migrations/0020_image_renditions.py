@@ -0,0 +1,28 @@
+# Generated by Django 2.2.19 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0019_catalogimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='thumbnail_renditions',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='renditions',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='productvariantimage',
+            name='renditions',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.19 on 2026-10-18 09:21
+
+from django.db import migrations, models
+import product.models
+import product.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0020_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='thumbnail',
+            field=models.ImageField(default='default.jpg', storage=product.storage.ContentAddressedStorage(), upload_to=product.models.product_thumbnail),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=product.storage.ContentAddressedStorage(), upload_to=product.models.product_image),
+        ),
+        migrations.AlterField(
+            model_name='productvariantimage',
+            name='image',
+            field=models.ImageField(storage=product.storage.ContentAddressedStorage(), upload_to=product.models.product_variant_image),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 2.2.19 on 2026-10-18 09:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0022_cacheversion'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CacheVersion',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.19 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0023_delete_cacheversion'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_price_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'discount_price', 'max_price'], name='product_active_price_idx'),
+        ),
+    ]
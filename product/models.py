@@ -1,4 +1,9 @@
-from django.db import models
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, models
+from django.db.models import BooleanField, Case, F, Max, Prefetch, Value, When
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 from useradmin.models import BaseTimestamp
@@ -7,21 +12,46 @@ from merchant.models import Merchant
 from category.models import Category
 from category.fields import TitleCharField
 from brand.models import Brand
+from .storage import media_storage
 
 
 def product_thumbnail(instance, filename):
-    """Upload the product thumbnail image into the path and return the uploaded image path."""   
-    return f'products/{instance.category}/{instance.name}/{filename}'
+    """
+    Upload the product thumbnail image into the path and return the uploaded image path.
+    The media storage stores it under its content hash, so the path doesn't load the related objects.
+    """
+    return f'products/{filename}'
 
 
 def product_image(instance, filename):
-    """Upload the product image into the path and return the uploaded image path."""   
-    return f'products/{instance.product.category}/{instance.product.name}/{filename}'
+    """Upload the product image into the path and return the uploaded image path."""
+    return f'products/{filename}'
+
+
+def get_rendition_name(image, renditions, width, image_format):
+    """
+    Take an image file and its renditions metadata, and return the name of its smallest rendition of the format
+    at least as wide as the given width, or the original image name if it isn't rendered yet or it's smaller.
+    """
+    if not image:
+        return None
+    metadata = json.loads(renditions) if renditions else {}
+    if metadata.get('source') != image.name:
+        return image.name
+    for rendition in metadata['renditions']:
+        if rendition['format'] == image_format and rendition['width'] >= width:
+            return rendition['name']
+    return image.name
+
+
+def catalog_import_file(instance, filename):
+    """Upload the catalog import file into the path and return the uploaded file path."""
+    return f'imports/{instance.merchant_id}/{filename}'
 
 
 def product_variant_image(instance, filename):
-    """Upload the product variant image into the path and return the uploaded image path."""   
-    return f'products/{instance.variant.product.category}/{instance.variant.product}/{filename}'
+    """Upload the product variant image into the path and return the uploaded image path."""
+    return f'products/{filename}'
 
 
 class ProductCommonData(BaseTimestamp):
@@ -43,6 +73,22 @@ class Attribute(BaseTimestamp):
         return self.name
 
 
+class AttributeValueManager(models.Manager):
+    """Attribute value model manager."""
+    def get_variants_values(self, products_ids):
+        """
+        Take products ids, and get the attribute values of all their variants in one query
+        through the variants m2m table, as a dict of {product id: {variant id: [attribute values]}}.
+        """
+        products_values = {product_id: defaultdict(list) for product_id in products_ids}
+        variant_values = ProductVariant.variant.through.objects.filter(
+                            productvariant__product_id__in=products_values.keys()).select_related(
+                            'productvariant', 'attributevalue__attribute').order_by('id')
+        for obj in variant_values:
+            products_values[obj.productvariant.product_id][obj.productvariant_id].append(obj.attributevalue)
+        return products_values
+
+
 class AttributeValue(BaseTimestamp):
     """
     Values for the selected attribute like for size attr
@@ -51,6 +97,8 @@ class AttributeValue(BaseTimestamp):
     attribute = models.ForeignKey(Attribute, related_name='values', on_delete=models.CASCADE)
     name = TitleCharField(max_length=64, title=True)
 
+    objects = AttributeValueManager()
+
     class Meta:
         unique_together = ('attribute', 'name')
 
@@ -63,18 +111,68 @@ class ProductManager(models.Manager):
     """Product model manager."""
     def get_descendants_products(self, category, ids=None):
         """
-        Take category, and get all products of descendants categories of this category.
+        Take category, and get all products of descendants categories of this category,
+        joined on the category tree range instead of an IN subquery of the descendants.
         If ids is given, get all products ids of descendants categories of this category.
         """
+        queryset = self.get_queryset().filter(category__tree_id=category.tree_id, category__lft__gte=category.lft,
+                                            category__rght__lte=category.rght)
         if ids:
-            return self.get_queryset().select_related('category').filter(category__in=category.get_descendants(
-                                            include_self=True)).values_list('id', flat=True).distinct()
+            return queryset.values_list('id', flat=True)
         else:
-            return self.get_queryset().select_related('category').filter(category__in=category.get_descendants(include_self=True)) 
+            return queryset
 
     def get_brand_products(self, brand):
         """Take brand, and get all products of this brand."""
-        return self.get_queryset().select_related('brand').filter(brand=brand) 
+        return self.get_queryset().filter(brand=brand)
+
+    def update_rating(self, product_id, rate, count=1):
+        """
+        Take product id, review rate and reviews count (negative to remove), and add them
+        to the product rating aggregates atomically with a single update.
+        """
+        return self.get_queryset().filter(id=product_id).update(**{
+            'rating_count': F('rating_count') + count,
+            'rating_sum': F('rating_sum') + count * rate,
+            f'rating_{rate}_count': F(f'rating_{rate}_count') + count,
+        })
+
+    def update_counts(self, products, previous_states=None):
+        """
+        Take products written in bulk, without the save signals, and their saved brand, category & active state
+        by id before the write (none for new products), and update the brands & categories products counts
+        as the signals would, with one update per changed brand & category.
+        """
+        previous_states = previous_states or {}
+        brands_counts, categories_counts = Counter(), Counter()
+        for product in products:
+            brand_id, category_id, is_active = previous_states.get(product.id, (None, None, False))
+            if brand_id != product.brand_id:
+                if brand_id:
+                    brands_counts[brand_id] -= 1
+                if product.brand_id:
+                    brands_counts[product.brand_id] += 1
+            if (category_id, is_active) != (product.category_id, product.is_active):
+                if is_active:
+                    categories_counts[category_id] -= 1
+                if product.is_active:
+                    categories_counts[product.category_id] += 1
+        for brand_id, count in brands_counts.items():
+            if count:
+                Brand.objects.update_products_count(brand_id, count)
+        for category_id, count in categories_counts.items():
+            if count:
+                Category.objects.update_product_count(category_id, count)
+
+    def with_details(self):
+        """
+        Return products with their whole detail graph loaded in a fixed number of queries:
+        category, brand & merchant, images, variants and variants images.
+        Variants attribute values are resolved by AttributeValueManager.get_variants_values.
+        """
+        variants = ProductVariant.objects.prefetch_related('images')
+        return self.get_queryset().select_related('category', 'brand', 'merchant').prefetch_related(
+            'images', Prefetch('variants', queryset=variants))
 
 
 class Product(ProductCommonData):
@@ -87,12 +185,30 @@ class Product(ProductCommonData):
     description = models.CharField(max_length=255)
     max_price = models.DecimalField(max_digits=10, decimal_places=2)
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    thumbnail = models.ImageField(upload_to=product_thumbnail, default='default.jpg')
+    thumbnail = models.ImageField(upload_to=product_thumbnail, storage=media_storage, default='default.jpg')
+    # json metadata of the thumbnail renditions, recorded by the renditions job.
+    thumbnail_renditions = models.TextField(blank=True, default='')
     details = models.TextField()
+    # active reviews rating aggregates, maintained by the review signals.
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    RATING_FIELDS = ['rating_count', 'rating_sum'] + [f'rating_{rate}_count' for rate in range(1, 6)]
 
     objects = ProductManager()
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(fields=['brand', '-created_at', '-id'], name='product_brand_created_idx'),
+            # effective price ranges, on the discount price or the max price without a discount price.
+            models.Index(fields=['is_active', 'discount_price', 'max_price'], name='product_active_price_idx'),
+            models.Index(fields=['is_active', 'is_in_stock'], name='product_active_stock_idx'),
+        ]
 
     def __str__(self):
         # Return product's name.
@@ -106,11 +222,31 @@ class Product(ProductCommonData):
         else:
             return self.max_price
 
+    @property
+    def rating_average(self):
+        # Return the average rate of the active reviews, rounded to one decimal.
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
+        return None
+
+    @property
+    def rating_histogram(self):
+        # Return the active reviews count of each rate.
+        return {rate: getattr(self, f'rating_{rate}_count') for rate in range(1, 6)}
+
+    @property
+    def list_thumbnail(self):
+        # Return the thumbnail rendition of the products lists, or the original thumbnail until it's rendered.
+        return get_rendition_name(self.thumbnail, self.thumbnail_renditions, settings.IMAGE_LIST_RENDITION_WIDTH,
+                                settings.IMAGE_LIST_RENDITION_FORMAT)
+
 
 class ProductImage(BaseTimestamp):
     """Product image model."""
     product = models.ForeignKey(Product, related_name="images", on_delete=models.CASCADE)
-    image = models.ImageField(upload_to=product_image)
+    image = models.ImageField(upload_to=product_image, storage=media_storage)
+    # json metadata of the image renditions, recorded by the renditions job.
+    renditions = models.TextField(blank=True, default='')
     is_default = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     
@@ -127,6 +263,105 @@ class ProductImage(BaseTimestamp):
         return self.product.merchant
 
 
+def reserve_stock(queryset, quantity):
+    """
+    Take a product or variant queryset and a quantity, and decrement its total in stock only if it covers the quantity,
+    clearing is_in_stock when it reaches 0, with one update statement. Return the count of the updated rows.
+    """
+    return queryset.filter(total_in_stock__gte=quantity).update(
+        total_in_stock=F('total_in_stock') - quantity,
+        # the conditions are evaluated with the stock before the update.
+        is_in_stock=Case(When(total_in_stock=quantity, then=Value(False)), default=F('is_in_stock'),
+                        output_field=BooleanField()))
+
+
+def release_stock(queryset, quantity):
+    """Take a product or variant queryset and a quantity, and increment its total in stock with one update statement."""
+    return queryset.update(total_in_stock=F('total_in_stock') + quantity, is_in_stock=True)
+
+
+class ProductVariantManager(models.Manager):
+    """Product variant custom manager."""
+    def bulk_create_with_details(self, product, variants_data):
+        """
+        Take a product and its new variants data with their attribute values & images, and create them
+        with one bulk insert for the variants, the attribute values & the images, whatever the variants count.
+        The save signals aren't sent, so the variants discount price default is set here, and the created
+        variants & images are returned for the caller's after_bulk_write.
+        """
+        return self.bulk_create_for_products([(product, variants_data)])
+
+    def bulk_create_for_products(self, products_variants):
+        """
+        Take pairs of saved products and their new variants data, and create the variants of all the products
+        with the same bulk inserts as bulk_create_with_details. Return the created variants & variants images.
+        """
+        variants, variants_values, variants_images = [], [], []
+        for product, variants_data in products_variants:
+            for data in variants_data:
+                data = dict(data)
+                data.pop('variant_id', None)
+                variants_values.append(data.pop('variant', []))
+                variants_images.append(data.pop('images', None) or [])
+                variant = self.model(product=product, **data)
+                if not variant.discount_price:
+                    variant.discount_price = variant.max_price
+                variants.append(variant)
+        if not variants:
+            return variants, []
+        products_ids = {variant.product_id for variant in variants}
+        can_return_ids = connections[self.db].features.can_return_ids_from_bulk_insert
+        if not can_return_ids:
+            last_id = self.filter(product_id__in=products_ids).aggregate(last_id=Max('id'))['last_id'] or 0
+        self.bulk_create(variants)
+        if not can_return_ids:
+            # the products variants inserted after the last one are the new ones, in the insertion order.
+            for variant, id in zip(variants, self.filter(product_id__in=products_ids, id__gt=last_id).order_by(
+                                                                                'id').values_list('id', flat=True)):
+                variant.id = id
+        Through = self.model.variant.through
+        Through.objects.bulk_create([
+            Through(productvariant_id=variant.id, attributevalue_id=getattr(value, 'pk', value))
+            for variant, values in zip(variants, variants_values) for value in values])
+        created_images = ProductVariantImage.objects.bulk_create([
+            ProductVariantImage(variant=variant, **{key: value for key, value in image.items() if key != 'image_id'})
+            for variant, images in zip(variants, variants_images) for image in images])
+        return variants, created_images
+
+    def reserve_stock(self, variants_quantities):
+        """
+        Take ordered variants ids with their product id & quantity, and decrement the variants & products totals
+        in stock with one conditional update each, which only matches while the stock covers the quantity,
+        so concurrent orders can't oversell and the stock is never read first. The last unit clears is_in_stock.
+        Rows are updated in ids order, so concurrent orders lock them in the same order.
+        Return the id of the first variant whose variant or product stock is short, or None if all are reserved,
+        the caller's transaction should then be rolled back.
+        """
+        products_quantities, products_variants = Counter(), {}
+        for variant_id, (product_id, quantity) in sorted(variants_quantities.items()):
+            if quantity and not reserve_stock(self.filter(id=variant_id), quantity):
+                return variant_id
+            products_quantities[product_id] += quantity
+            products_variants.setdefault(product_id, variant_id)
+        for product_id, quantity in sorted(products_quantities.items()):
+            if quantity and not reserve_stock(Product.objects.filter(id=product_id), quantity):
+                return products_variants[product_id]
+        return None
+
+    def release_stock(self, variants_quantities):
+        """
+        Take variants ids with their product id & quantity, of cancelled or decreased orders items, and increment
+        the variants & products totals in stock with one update each, in ids order like reserve_stock.
+        """
+        products_quantities = Counter()
+        for variant_id, (product_id, quantity) in sorted(variants_quantities.items()):
+            if quantity:
+                release_stock(self.filter(id=variant_id), quantity)
+                products_quantities[product_id] += quantity
+        for product_id, quantity in sorted(products_quantities.items()):
+            release_stock(Product.objects.filter(id=product_id), quantity)
+
+
 class ProductVariant(ProductCommonData):
     """This model holds the values for price and combination of attributes for a product."""
     max_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -134,6 +369,8 @@ class ProductVariant(ProductCommonData):
     product = models.ForeignKey(Product, related_name='variants', on_delete=models.CASCADE)
     variant =  models.ManyToManyField(AttributeValue)
     is_default = models.BooleanField(default=False)
+
+    objects = ProductVariantManager()
         
     def __str__(self):
         # Return product's name
@@ -168,7 +405,9 @@ class ProductVariant(ProductCommonData):
 class ProductVariantImage(BaseTimestamp):
     """Product variant image model."""
     variant = models.ForeignKey(ProductVariant, related_name="images", on_delete=models.CASCADE)
-    image = models.ImageField(upload_to=product_variant_image)
+    image = models.ImageField(upload_to=product_variant_image, storage=media_storage)
+    # json metadata of the image renditions, recorded by the renditions job.
+    renditions = models.TextField(blank=True, default='')
     is_default = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     
@@ -246,3 +485,84 @@ class Wishlist(BaseTimestamp):
     def __str__ (self):
         # Return customer's email & product's name.
         return f'{self.customer.user.email} | {self.product}'
+
+
+class CatalogImport(BaseTimestamp):
+    """Merchant catalog bulk import job, with its progress and its rows errors report."""
+    FORMATS = (
+        ('jsonl', 'JSON lines'),
+        ('csv', 'CSV'),
+    )
+    STATUS = (
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    )
+
+    merchant = models.ForeignKey(Merchant, related_name='catalog_imports', on_delete=models.CASCADE)
+    file = models.FileField(upload_to=catalog_import_file)
+    file_format = models.CharField(max_length=5, choices=FORMATS)
+    status = models.CharField(max_length=7, choices=STATUS, default='Pending')
+    # percentage of the file read so far.
+    progress = models.PositiveSmallIntegerField(default=0)
+    rows_count = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    # json list of the failed rows numbers & errors, capped by CATALOG_IMPORT_MAX_ERRORS.
+    errors = models.TextField(blank=True, default='')
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        # Return merchant, file name & status.
+        return f"{self.merchant} | {self.file.name} | {self.status}"
+
+    @property
+    def rows_errors(self):
+        # Return the failed rows numbers & errors.
+        return json.loads(self.errors) if self.errors else []
+
+
+class MediaBlobManager(models.Manager):
+    """Media blob model manager."""
+    def add_references(self, names):
+        """
+        Take blobs names (repeated for each reference), and add their references
+        with one query for the existing blobs, one bulk update and one bulk insert.
+        """
+        counts = Counter(names)
+        if not counts:
+            return
+        blobs = self.get_queryset().in_bulk(list(counts), field_name='name')
+        for name, blob in blobs.items():
+            blob.references = F('references') + counts[name]
+        self.bulk_update(blobs.values(), ['references'])
+        self.bulk_create([self.model(name=name, references=count) for name, count in counts.items()
+                            if name not in blobs])
+
+    def remove_reference(self, name):
+        """Take a blob name, and remove one of its references. Return True if it was the last one."""
+        self.get_queryset().filter(name=name, references__gt=0).update(references=F('references') - 1)
+        return self.get_queryset().filter(name=name, references=0).exists()
+
+    def delete_unreferenced(self, name):
+        """Take a blob name, and delete its row if it has no references. Return True if it was deleted."""
+        deleted, rows = self.get_queryset().filter(name=name, references=0).delete()
+        return bool(deleted)
+
+
+class MediaBlob(BaseTimestamp):
+    """Content addressed media file, with the count of the rows referencing it."""
+    name = models.CharField(max_length=100, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    objects = MediaBlobManager()
+
+    def __str__(self):
+        # Return blob name & references count.
+        return f"{self.name} | {self.references}"
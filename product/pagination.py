@@ -0,0 +1,20 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset pagination for product lists.
+    Follows the product default ordering with the id as a tie breaker, so every page
+    is a range scan over the (created_at, id) index instead of an OFFSET scan.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class ProductSearchPagination(PageNumberPagination):
+    """Page number pagination for ranked product search results, which can't be keyset paginated."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,161 @@
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .cache import CATALOG_VERSION, bump_cache_version
+from .imaging import render_renditions
+from .jobs import LocalJobQueue
+from .models import Product, ProductImage, ProductVariantImage
+
+# rendered models, with their products lookup, image field & renditions metadata field.
+RENDERED_IMAGES = [
+    (Product, 'id', 'thumbnail', 'thumbnail_renditions'),
+    (ProductImage, 'product_id', 'image', 'renditions'),
+    (ProductVariantImage, 'variant__product_id', 'image', 'renditions'),
+]
+RENDERED_FIELDS = {model: field for model, lookup, field, renditions_field in RENDERED_IMAGES}
+# renditions metadata of the rendered sources of this process, a stored name never changes its content.
+RENDERED_SOURCES_LIMIT = 1024
+_rendered_sources = {}
+_pool = None
+
+
+def get_pool():
+    """Return the renditions process pool of this process, started with the first renditions."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_RENDITION_WORKERS)
+    return _pool
+
+
+RENDITIONS_PREFIX = 'renditions/'
+RENDITION_NAME_PATTERN = re.compile(r'^renditions/(?P<root>.+)-\d+w\.[a-z]+$')
+
+
+def get_rendition_name(source, width, image_format):
+    """Take a source image name, a rendition width & format, and return the rendition name."""
+    root = os.path.splitext(source)[0]
+    return f'{RENDITIONS_PREFIX}{root}-{width}w.{"jpg" if image_format == "jpeg" else image_format}'
+
+
+def get_rendition_root(name):
+    """Take a rendition name, and return its source image name without extension, or None if it isn't one."""
+    match = RENDITION_NAME_PATTERN.match(name)
+    return match.group('root') if match else None
+
+
+def delete_renditions(source):
+    """Take a source image name, and delete its renditions of all widths & formats."""
+    _rendered_sources.pop(source, None)
+    root = os.path.splitext(source)[0]
+    directory = os.path.dirname(f'{RENDITIONS_PREFIX}{root}')
+    try:
+        directories, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        name = f'{directory}/{filename}'
+        if get_rendition_root(name) == root:
+            default_storage.delete(name)
+
+
+def is_rendered(image, renditions):
+    """Take an image file and its renditions metadata, and return True if the renditions are of this file."""
+    return not image or bool(renditions) and json.loads(renditions)['source'] == image.name
+
+
+def get_stale_images(products_ids):
+    """
+    Take products ids, and yield the images of the products, their images & their variants images
+    without renditions of their current file, as (model, id, source, renditions field), one query per model.
+    """
+    for model, lookup, field, renditions_field in RENDERED_IMAGES:
+        for obj_id, source, renditions in model.objects.filter(**{f'{lookup}__in': products_ids}).values_list(
+                                                                            'id', field, renditions_field):
+            if source and (not renditions or json.loads(renditions)['source'] != source):
+                yield model, obj_id, source, renditions_field
+
+
+def render_sources(sources):
+    """
+    Take source images names, and return their renditions metadata by name. Images are rendered by the process
+    pool and the renditions are saved beside their source name, the rendered sources are remembered.
+    """
+    metadata = {source: _rendered_sources[source] for source in sources if source in _rendered_sources}
+    sources = [source for source in sources if source not in metadata]
+    if not sources:
+        return metadata
+    readable_sources, contents = [], []
+    for source in sources:
+        # a missing source is left without renditions.
+        try:
+            with default_storage.open(source, 'rb') as file:
+                contents.append(file.read())
+        except OSError:
+            continue
+        readable_sources.append(source)
+    sources = readable_sources
+    arguments = (settings.IMAGE_RENDITION_WIDTHS, settings.IMAGE_RENDITION_FORMATS, settings.IMAGE_RENDITION_QUALITY)
+    if settings.IMAGE_RENDITION_WORKERS:
+        results = get_pool().map(render_renditions, contents, *[[argument] * len(contents) for argument in arguments])
+    else:
+        results = (render_renditions(content, *arguments) for content in contents)
+    if len(_rendered_sources) + len(sources) > RENDERED_SOURCES_LIMIT:
+        _rendered_sources.clear()
+    for source, content, (width, height, renditions) in zip(sources, contents, results):
+        source_metadata = {"source": source, "width": width, "height": height, "bytes": len(content),
+                            "renditions": []}
+        for rendition_width, rendition_height, image_format, rendition in renditions:
+            name = get_rendition_name(source, rendition_width, image_format)
+            # the rendition name is kept, so a source rendered again replaces its renditions.
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            source_metadata['renditions'].append({
+                "name": default_storage.save(name, ContentFile(rendition)), "width": rendition_width,
+                "height": rendition_height, "format": image_format, "bytes": len(rendition)})
+        metadata[source] = _rendered_sources[source] = json.dumps(source_metadata)
+    return metadata
+
+
+def generate_renditions(products_ids):
+    """
+    Take products ids, and render the missing renditions of their thumbnails, images & variants images,
+    then record their metadata. Return the count of the images recorded.
+    """
+    global _pool
+    stale_images = list(get_stale_images(products_ids))
+    if not stale_images:
+        return 0
+    sources = list(dict.fromkeys(source for model, obj_id, source, renditions_field in stale_images))
+    try:
+        metadata = render_sources(sources)
+    except BrokenProcessPool:
+        _pool = None
+        raise
+    recorded_count = 0
+    for model, obj_id, source, renditions_field in stale_images:
+        if source not in metadata:
+            continue
+        # recorded only if the image wasn't replaced while it was rendered.
+        recorded_count += model.objects.filter(id=obj_id, **{RENDERED_FIELDS[model]: source}).update(
+                                                                    **{renditions_field: metadata[source]})
+    if recorded_count:
+        bump_cache_version(CATALOG_VERSION)
+    return recorded_count
+
+
+renditions_queue = LocalJobQueue('image-renditions', generate_renditions)
+
+
+def enqueue_renditions(*products_ids):
+    """
+    Take products ids, and queue the renditions of their images in one job once the current transaction is committed.
+    Images left without renditions by a stopped process are rendered by the generate_image_renditions command.
+    """
+    renditions_queue.enqueue_on_commit(list(products_ids))
@@ -0,0 +1,113 @@
+import re
+from html import escape
+
+from django.db import connection
+
+
+SEARCH_INDEX_TABLE = 'product_product_fts'
+# bm25 weights of the indexed columns: name, description, details.
+SEARCH_INDEX_WEIGHTS = (10.0, 4.0, 1.0)
+# snippet match delimiters, control characters replaced by the marks once the merchant text is escaped.
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+
+
+def is_search_index_available():
+    """Return True if the database supports the sqlite FTS5 products search index."""
+    return connection.vendor == 'sqlite'
+
+
+def index_products(products):
+    """Take products, and add or replace them in the search index."""
+    if not is_search_index_available():
+        return
+    rows = [(product.id, product.name, product.description, product.details) for product in products]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_INDEX_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(f"INSERT INTO {SEARCH_INDEX_TABLE} (rowid, name, description, details) "
+                            "VALUES (%s, %s, %s, %s)", rows)
+
+
+def unindex_products(products_ids):
+    """Take products ids, and remove them from the search index."""
+    if not is_search_index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_INDEX_TABLE} WHERE rowid = %s", [(id,) for id in products_ids])
+
+
+def rebuild_search_index():
+    """Rebuild the whole search index from the products table in bulk, and return the indexed products count."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_INDEX_TABLE}")
+        cursor.execute(f"INSERT INTO {SEARCH_INDEX_TABLE} (rowid, name, description, details) "
+                        "SELECT id, name, description, details FROM product_product")
+        cursor.execute(f"INSERT INTO {SEARCH_INDEX_TABLE} ({SEARCH_INDEX_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_INDEX_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def highlight_snippet(snippet):
+    """
+    Take a search index snippet with the matches between the snippet delimiters, and return it as html,
+    with the products text escaped and the matches wrapped in mark tags.
+    """
+    if snippet is None:
+        return None
+    return escape(snippet).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def build_match_query(keywords):
+    """
+    Take the searched keywords, and return an FTS5 match query of all the keywords as prefixes,
+    or None if there are no words. Keywords are quoted, so FTS5 syntax can't be injected.
+    """
+    words = re.findall(r'\w+', keywords)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class ProductSearchResults:
+    """
+    Lazy sequence of the active products matching a search, ranked with bm25.
+    It runs the search query when sliced, so it can be paginated like a queryset.
+    """
+    def __init__(self, queryset, keywords):
+        self.queryset = queryset
+        self.match = build_match_query(keywords)
+
+    def count(self):
+        if self.match is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {SEARCH_INDEX_TABLE} JOIN product_product p ON p.id = "
+                            f"{SEARCH_INDEX_TABLE}.rowid WHERE {SEARCH_INDEX_TABLE} MATCH %s AND p.is_active",
+                            [self.match])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if self.match is None:
+            return []
+        offset = item.start or 0
+        limit = item.stop - offset
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {SEARCH_INDEX_TABLE}.rowid, bm25({SEARCH_INDEX_TABLE}, %s, %s, %s) AS rank, "
+                f"snippet({SEARCH_INDEX_TABLE}, -1, %s, %s, '...', 16) "
+                f"FROM {SEARCH_INDEX_TABLE} JOIN product_product p ON p.id = {SEARCH_INDEX_TABLE}.rowid "
+                f"WHERE {SEARCH_INDEX_TABLE} MATCH %s AND p.is_active ORDER BY rank LIMIT %s OFFSET %s",
+                [*SEARCH_INDEX_WEIGHTS, SNIPPET_START, SNIPPET_END, self.match, limit, offset])
+            matches = cursor.fetchall()
+        products = self.queryset.in_bulk([match[0] for match in matches])
+        results = []
+        for product_id, rank, snippet in matches:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            product.rank = rank
+            product.snippet = highlight_snippet(snippet)
+            results.append(product)
+        return results
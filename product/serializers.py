@@ -1,17 +1,19 @@
 from itertools import product
 from django.shortcuts import get_object_or_404
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Sum
-from django.db.models.functions import Coalesce
 
 from rest_framework import serializers
 
 from accounts.serializers import UserSerializer
+from category.tree import get_category_tree
 from customer.serializers import CustomerDetailSerializer
 from .mixins import TimestampMixin
+from .fields import ImageSetField, MediaURLField
 from .utils import compare_max_discount_price
+from .writes import after_bulk_write
 from .models import (Product, Attribute, AttributeValue, ProductVariant, ProductImage,
-                        ProductVariantImage, Question, Answer, Review, Wishlist)
+                        ProductVariantImage, Question, Answer, Review, Wishlist, CatalogImport)
 
 
 ###
@@ -90,6 +92,60 @@ class AttributeValueSerializer(serializers.ModelSerializer, TimestampMixin):
         return super().update(instance, validated_data)
 
 
+###
+# Bulk Update
+###
+class ProductBulkUpdateSerializer(serializers.Serializer):
+    """
+    Products bulk price & stock update serializer, the rows are validated one by one
+    by bulk_update_prices_stock so each row gets its own result.
+    """
+    rows = serializers.ListField(child=serializers.JSONField(), allow_empty=False,
+                                max_length=settings.PRODUCT_BULK_UPDATE_MAX_ROWS)
+
+
+###
+# Catalog Import
+###
+class CatalogImportSerializer(serializers.ModelSerializer, TimestampMixin):
+    """Catalog import job model serializer."""
+    file_format = serializers.ChoiceField(choices=CatalogImport.FORMATS, required=False)
+    rows_errors = serializers.ListField(read_only=True)
+
+    class Meta:
+        model  = CatalogImport
+        fields = ["id", "file", "file_format", "status", "progress", "rows_count", "created_count", "updated_count",
+                "failed_count", "rows_errors", "started_at", "finished_at", "updated_at", "created_at"]
+        read_only_fields = ["status", "progress", "rows_count", "created_count", "updated_count", "failed_count",
+                            "started_at", "finished_at"]
+        extra_kwargs = {"file": {'write_only': True}}
+
+    def validate(self, data):
+        """Validate the catalog file format, guessed from the file extension if it's not given."""
+        if not data.get('file_format'):
+            extension = data['file'].name.rsplit('.', 1)[-1].lower()
+            if extension not in dict(CatalogImport.FORMATS):
+                raise serializers.ValidationError({"file_format": "This field is required for this file extension."})
+            data['file_format'] = extension
+        return data
+
+
+def get_product_ownership(context):
+    """
+    Take the serializer context of a product update, and return the updated product variants, images
+    & variants images by id, loaded once with one query each and shared by the nested serializers.
+    """
+    ownership = context.get('product_ownership')
+    if ownership is None:
+        product_id = context['product_obj'].id
+        ownership = context['product_ownership'] = {
+            "variants": ProductVariant.objects.filter(product_id=product_id).in_bulk(),
+            "images": ProductImage.objects.filter(product_id=product_id).in_bulk(),
+            "variants_images": ProductVariantImage.objects.filter(variant__product_id=product_id).in_bulk(),
+        }
+    return ownership
+
+
 ###
 # Product Variant
 ###
@@ -106,10 +162,11 @@ class VariantAttributeValueSerializer(serializers.ModelSerializer):
 class ProductVariantImageSerializer(serializers.ModelSerializer, TimestampMixin):
     """Product variant image model serializer."""
     image_id = serializers.IntegerField(min_value=1, write_only=True, required=False)
+    image_srcset = ImageSetField(source='image', renditions_source='renditions')
 
     class Meta:
         model  = ProductVariantImage
-        fields = ["id", "image_id", "image", "is_default", "is_active", "updated_at", "created_at"]
+        fields = ["id", "image_id", "image", "image_srcset", "is_default", "is_active", "updated_at", "created_at"]
 
 
 class ProductVariantSerializer(serializers.ModelSerializer):
@@ -125,12 +182,16 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         extra_kwargs = {'variant': {'write_only': True}}
 
     def get_variants(self, obj):
-        """Return all attribute variants for this product variant."""
-        variants = AttributeValue.objects.filter(id__in=obj.variant.all())
-        if variants:
-            return VariantAttributeValueSerializer(variants, many=True).data
-        else:
-            return []
+        """
+        Return all attribute variants for this product variant.
+        Attribute values of all the product variants are loaded at once, and kept in the context,
+        which can also be filled for a page of products with AttributeValue.objects.get_variants_values.
+        """
+        products_values = self.context.setdefault('variants_values', {})
+        if obj.product_id not in products_values:
+            products_values.update(AttributeValue.objects.get_variants_values([obj.product_id]))
+        variants = products_values[obj.product_id].get(obj.id, [])
+        return VariantAttributeValueSerializer(variants, many=True).data
 
     def validate(self, data):
         """
@@ -141,16 +202,16 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         variant_obj = None
         is_variant_update = False
         if is_update:
-            product_obj = self.context['product_obj']
+            ownership = get_product_ownership(self.context)
             # variant
             if 'variant_id' not in data.keys() and 'variant' not in data.keys():
                 raise serializers.ValidationError({"variants": {"variant": "This list may not be empty."}})
             # variant id
-            if 'variant_id' in data.keys() and data['variant_id'] not in product_obj.variants.values_list('id', flat=True):
+            if 'variant_id' in data.keys() and data['variant_id'] not in ownership['variants']:
                     raise serializers.ValidationError({"variants": {"variant_id": "This product does not have this variant id."}})
             if 'variant_id' in data.keys():
                 is_variant_update = True
-                variant_obj = get_object_or_404(ProductVariant, id=data.get('variant_id'))
+                variant_obj = ownership['variants'][data['variant_id']]
             else:
                 # required fields    
                 keys_lst = ['max_price', 'total_in_stock']
@@ -199,10 +260,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
                         raise serializers.ValidationError({"images": {"image": "No file was submitted."}})
                     # image id
                     if 'image_id' in image.keys():
-                        images_ids_list = []
-                        for obj in product_obj.variants.all():
-                            images_ids_list.extend(obj.images.values_list('id', flat=True))
-                        if image['image_id'] not in images_ids_list:
+                        if image['image_id'] not in ownership['variants_images']:
                             raise serializers.ValidationError({"images": {"image_id": "This product does not have this image id."}})
         # discount price
         max_price = data.get('max_price')
@@ -211,23 +269,6 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"variants": {"discount_price": "Discount price can't be greater than maximum price."}})
         return data
 
-    def create(self, validated_data):
-        """Create new product variant with m2m & images for variant attributes."""
-        product_id = self.context['product_id']
-        data = validated_data
-        variant = data.pop('variant')
-        images = None
-        if 'images' in data:
-            images = data.pop('images')
-        product_variant = ProductVariant.objects.create(**data, product_id=product_id)
-        product_variant.variant.set(variant)
-        if images:
-            for image in images:
-                if 'image_id' in image.keys():
-                    image_id= image.pop('image_id')
-                ProductVariantImage.objects.create(**image, variant=product_variant)
-        return validated_data
-
     def update(self, instance, validated_data):
         """Update variant & variant images of nested serializer."""
         if 'images' in validated_data:
@@ -235,7 +276,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             for image in images:
                 # update existing images
                 if 'image_id' in image.keys():
-                    image_obj = get_object_or_404(ProductVariantImage, id=image['image_id'])
+                    image_obj = get_product_ownership(self.context)['variants_images'][image['image_id']]
                     for key, value in image.items():
                         setattr(image_obj, key, value)
                     image_obj.save()    
@@ -249,48 +290,57 @@ class ProductVariantSerializer(serializers.ModelSerializer):
 # Product
 ###
 class ProductListSerializer(serializers.ModelSerializer):
-    """Product list model serializer."""
-    thumbnail_url = serializers.SerializerMethodField()
+    """Product list model serializer, with the list rendition of the thumbnail."""
+    thumbnail_url = MediaURLField(source='list_thumbnail')
+    thumbnail_srcset = ImageSetField(source='thumbnail', renditions_source='thumbnail_renditions')
 
     class Meta:
         model  = Product
-        fields = ["id", "name", "slug", "description", 'max_price', 'discount_price', 'thumbnail_url']
-        read_only_fields = ['slug']      
+        fields = ["id", "name", "slug", "description", 'max_price', 'discount_price', 'thumbnail_url',
+                'thumbnail_srcset', 'rating_average', 'rating_count']
+        read_only_fields = ['slug', 'rating_count']
+
+
+class ProductSearchSerializer(ProductListSerializer):
+    """Product keyword search result serializer, with the match rank & highlighted snippet."""
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.Meta.fields + ['rank', 'snippet']
 
-    def get_thumbnail_url(self, obj):
-        request = self.context.get('request')
-        thumbnail_url = obj.thumbnail.url
-        return request.build_absolute_uri(thumbnail_url)
-        
 
 class ProductImageSerializer(serializers.ModelSerializer, TimestampMixin):
     """Product image model serializer."""
     image_id = serializers.IntegerField(min_value=1, write_only=True, required=False)
+    image_srcset = ImageSetField(source='image', renditions_source='renditions')
 
     class Meta:
         model  = ProductImage
-        fields = ["id", "image_id", "image", "is_default", "is_active", "updated_at", "created_at"]
+        fields = ["id", "image_id", "image", "image_srcset", "is_default", "is_active", "updated_at", "created_at"]
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
     """Product detail model serializer."""
-    thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_url = MediaURLField(source='thumbnail')
+    thumbnail_srcset = ImageSetField(source='thumbnail', renditions_source='thumbnail_renditions')
     images = ProductImageSerializer(required=False, many=True)
     variants = ProductVariantSerializer(many=True, required=False, allow_null=True)
+    breadcrumbs = serializers.SerializerMethodField()
 
     class Meta:
         model  = Product
-        fields = ["id", "name", "slug", "description", "details", "category", "brand",
-                'max_price', 'discount_price', 'thumbnail', 'thumbnail_url', "images", "variants",
-                "total_in_stock", "is_in_stock", "is_active", "updated_at", "created_at"]
-        read_only_fields = ['slug']
+        fields = ["id", "name", "slug", "description", "details", "category", "breadcrumbs", "brand",
+                'max_price', 'discount_price', 'thumbnail', 'thumbnail_url', 'thumbnail_srcset', "images", "variants",
+                "total_in_stock", "is_in_stock", "is_active", "rating_average", "rating_count", "rating_histogram",
+                "updated_at", "created_at"]
+        read_only_fields = ['slug', 'rating_count']
         depth = 1
         extra_kwargs = {"thumbnail": {'write_only': True}}
 
-    def get_thumbnail_url(self, obj):
-        request = self.context.get('request')
-        thumbnail_url = obj.thumbnail.url
-        return request.build_absolute_uri(thumbnail_url)
+    def get_breadcrumbs(self, obj):
+        # the category ancestors are read from the category tree snapshot, without a query.
+        return get_category_tree().get_breadcrumbs(obj.category_id)
 
     def validate_discount_price(self, value):
         """Validate that discount price is not greater than max price."""
@@ -322,9 +372,10 @@ class ProductDetailSerializer(serializers.ModelSerializer):
                     variant_total_in_stock = variant.get('total_in_stock')
                     if variant_total_in_stock:
                         variants_total_in_stock += variant_total_in_stock
-            # get all variant's total in stock excluding the entered ones            
-            variants_total_in_stock += product_obj.variants.exclude(id__in=entered_variants_ids_list).aggregate(
-                    total=Coalesce(Sum('total_in_stock'), 0))['total']
+            # get all variant's total in stock excluding the entered ones
+            ownership = get_product_ownership(self.context)
+            variants_total_in_stock += sum(variant.total_in_stock for variant_id, variant in ownership['variants'].items()
+                                        if variant_id not in entered_variants_ids_list)
             # images
             images = data.get('images')
             if images:
@@ -333,10 +384,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
                         raise serializers.ValidationError({"images": {"image": "No file was submitted."}})                        
                     # image id
                     if 'image_id' in image.keys():
-                        images_ids_list = []
-                        for obj in product_obj.images.all():
-                            images_ids_list.extend(obj.images.values_list('id', flat=True))
-                        if image['image_id'] not in images_ids_list:
+                        if image['image_id'] not in ownership['images']:
                             raise serializers.ValidationError({"images": {"image_id": "This product does not have this image id."}})        
         else:
             if variants:
@@ -350,25 +398,24 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def create(self, validated_data):
-        """Create new product with variants & images for variant attributes."""
-        images = None
-        if 'images' in validated_data.keys():
-            images = validated_data.pop('images')
+        """
+        Create new product with variants & images for variant attributes.
+        Variants, their attribute values & images, and the product images are bulk inserted,
+        so the statements count doesn't grow with the variants & images.
+        """
+        images = validated_data.pop('images', None)
+        variants_data = validated_data.pop('variants', None)
+        product_obj = Product.objects.create(**validated_data)
         # variants
-        if 'variants' in validated_data.keys():  
-            variants_data = validated_data.pop('variants')
-            product_obj = Product.objects.create(**validated_data)
-            for variant in variants_data:
-                ProductVariantSerializer.create(ProductVariantSerializer(context={"product_id": product_obj.id}), 
-                                    validated_data=variant)
-        else:
-            product_obj = Product.objects.create(**validated_data)  
+        variants_images = []
+        if variants_data:
+            variants, variants_images = ProductVariant.objects.bulk_create_with_details(product_obj, variants_data)
         # images
         if images:
-            for image in images:
-                if 'image_id' in image.keys():
-                    image_id= image.pop('image_id')
-                ProductImage.objects.create(**image, product=product_obj)                              
+            images = ProductImage.objects.bulk_create([
+                ProductImage(product=product_obj, **{key: value for key, value in image.items() if key != 'image_id'})
+                for image in images])
+        after_bulk_write(images=[(product_obj.id, image.image.name) for image in (images or []) + variants_images])
         return product_obj
 
     @transaction.atomic
@@ -380,7 +427,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             for image in images:
                 # update existing images
                 if 'image_id' in image.keys():
-                    image_obj = get_object_or_404(ProductImage, id=image['image_id'])
+                    image_obj = get_product_ownership(self.context)['images'][image['image_id']]
                     for key, value in image.items():
                         setattr(image_obj, key, value)
                     image_obj.save()    
@@ -390,15 +437,19 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         # update variants
         if 'variants' in validated_data.keys():
             variants_data = validated_data.pop('variants')
+            new_variants_data = []
             for data in variants_data:
                 # update existing variants
                 if 'variant_id' in data.keys():
-                    variant_obj = get_object_or_404(ProductVariant, id=data['variant_id'])
-                    ProductVariantSerializer.update(ProductVariantSerializer(), instance=variant_obj, validated_data=data)
+                    variant_obj = get_product_ownership(self.context)['variants'][data['variant_id']]
+                    ProductVariantSerializer.update(ProductVariantSerializer(context=self.context), instance=variant_obj,
+                                                    validated_data=data)
                 # create new ones
                 else:
-                    new_variant_obj = ProductVariantSerializer.create(ProductVariantSerializer(context={"product_id": instance.id}), 
-                                    validated_data=data)
+                    new_variants_data.append(data)
+            if new_variants_data:
+                variants, variants_images = ProductVariant.objects.bulk_create_with_details(instance, new_variants_data)
+                after_bulk_write(images=[(instance.id, image.image.name) for image in variants_images])
         return super().update(instance, validated_data)
 
 
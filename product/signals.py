@@ -1,8 +1,14 @@
 from django.dispatch import receiver
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
 
 from product.utils import unique_slug_generator
-from .models import Product, ProductVariant
+from .cache import CATALOG_VERSION, bump_cache_version_on_commit
+from brand.models import Brand
+from category.models import Category
+from .search import index_products, unindex_products
+from .renditions import enqueue_renditions, is_rendered
+from .storage import media_storage
+from .models import Product, ProductVariant, ProductImage, ProductVariantImage, Review
 
     
 @receiver(pre_save, sender=Product)
@@ -22,4 +28,175 @@ def add_product_discount_price(sender, instance, *args, **kwargs):
 def add_product_variant_discount_price(sender, instance, *args, **kwargs):
     """Set discount price to be equal max price if discount price is not given before saving."""
     if not instance.discount_price:
-        instance.discount_price = instance.max_price
\ No newline at end of file
+        instance.discount_price = instance.max_price
+
+
+@receiver(pre_save, sender=Product)
+def get_product_previous_state(sender, instance, *args, **kwargs):
+    """
+    Keep the saved product brand, category & active state before saving, to update the counts after,
+    and reload the saved rating aggregates, so a stale instance doesn't overwrite them.
+    """
+    instance._previous_state = None
+    if instance.pk:
+        saved_product = Product.objects.filter(pk=instance.pk).values_list(
+                                        'brand_id', 'category_id', 'is_active', *Product.RATING_FIELDS).first()
+        if saved_product:
+            instance._previous_state = saved_product[:3]
+            # the rating aggregates are maintained by the reviews signals with update queries.
+            for field, value in zip(Product.RATING_FIELDS, saved_product[3:]):
+                setattr(instance, field, value)
+
+
+@receiver(post_save, sender=Product)
+def update_brand_products_count(sender, instance, *args, **kwargs):
+    """Update the previous & current brands products counts after saving."""
+    previous_state = getattr(instance, '_previous_state', None)
+    previous_brand_id = previous_state[0] if previous_state else None
+    if previous_brand_id == instance.brand_id:
+        return
+    if previous_brand_id:
+        Brand.objects.update_products_count(previous_brand_id, count=-1)
+    if instance.brand_id:
+        Brand.objects.update_products_count(instance.brand_id)
+
+
+@receiver(post_save, sender=Product)
+def update_category_product_count(sender, instance, *args, **kwargs):
+    """Update the previous & current categories products counts after saving, if moved or (de)activated."""
+    previous_state = getattr(instance, '_previous_state', None)
+    previous_category = previous_state[1:] if previous_state else None
+    if previous_category == (instance.category_id, instance.is_active):
+        return
+    if previous_category and previous_category[1]:
+        Category.objects.update_product_count(previous_category[0], count=-1)
+    if instance.is_active:
+        Category.objects.update_product_count(instance.category_id)
+
+
+@receiver(post_delete, sender=Product)
+def remove_brand_product_count(sender, instance, *args, **kwargs):
+    """Remove the product from its brand products count after deleting."""
+    if instance.brand_id:
+        Brand.objects.update_products_count(instance.brand_id, count=-1)
+
+
+@receiver(post_delete, sender=Product)
+def remove_category_product_count(sender, instance, *args, **kwargs):
+    """Remove the product from its category products count after deleting."""
+    if instance.is_active:
+        Category.objects.update_product_count(instance.category_id, count=-1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def bump_catalog_version(sender, instance, *args, **kwargs):
+    """Invalidate the cached product list pages after a product, variant or image changes."""
+    bump_cache_version_on_commit(CATALOG_VERSION)
+
+
+@receiver(post_save, sender=Product)
+def render_product_thumbnail(sender, instance, *args, **kwargs):
+    """Queue the product images renditions after saving, if the thumbnail isn't rendered."""
+    if not is_rendered(instance.thumbnail, instance.thumbnail_renditions):
+        enqueue_renditions(instance.id)
+
+
+@receiver(post_save, sender=ProductImage)
+def render_product_image(sender, instance, *args, **kwargs):
+    """Queue the product images renditions after saving, if the image isn't rendered."""
+    if not is_rendered(instance.image, instance.renditions):
+        enqueue_renditions(instance.product_id)
+
+
+@receiver(post_save, sender=ProductVariantImage)
+def render_product_variant_image(sender, instance, *args, **kwargs):
+    """Queue the product images renditions after saving, if the variant image isn't rendered."""
+    if not is_rendered(instance.image, instance.renditions):
+        enqueue_renditions(instance.variant.product_id)
+
+
+# stored images fields of the models, counted as media blobs references.
+MEDIA_FIELDS = {Product: 'thumbnail', ProductImage: 'image', ProductVariantImage: 'image'}
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=ProductImage)
+@receiver(post_init, sender=ProductVariantImage)
+def get_original_media(sender, instance, *args, **kwargs):
+    """Keep the loaded image name, to update the media blobs references if it's replaced."""
+    # a deferred image isn't loaded, so its references are left as they are.
+    if MEDIA_FIELDS[sender] in instance.__dict__:
+        value = instance.__dict__[MEDIA_FIELDS[sender]]
+        instance._original_media = getattr(value, 'name', value)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=ProductVariantImage)
+def update_media_references(sender, instance, created, *args, **kwargs):
+    """Add a reference to the saved image blob, and remove the replaced image one, after saving."""
+    if not created and not hasattr(instance, '_original_media'):
+        return
+    name = getattr(instance, MEDIA_FIELDS[sender]).name
+    original_name = None if created else instance._original_media
+    if name != original_name:
+        media_storage.retain([name])
+        if original_name:
+            media_storage.release(original_name)
+    instance._original_media = name
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=ProductVariantImage)
+def remove_media_reference(sender, instance, *args, **kwargs):
+    """Remove the reference to the deleted image blob after deleting."""
+    media_storage.release(getattr(instance, MEDIA_FIELDS[sender]).name)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, *args, **kwargs):
+    """Add or update the product in the full-text search index after saving."""
+    index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, *args, **kwargs):
+    """Remove the product from the full-text search index after deleting."""
+    unindex_products([instance.id])
+
+
+@receiver(pre_save, sender=Review)
+def get_review_previous_rating(sender, instance, *args, **kwargs):
+    """Keep the saved review product, rate & active state before saving, to update the product rating after."""
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = Review.objects.filter(pk=instance.pk).values_list(
+                                        'product_id', 'rate', 'is_active').first()
+
+
+@receiver(post_save, sender=Review)
+def update_product_rating(sender, instance, *args, **kwargs):
+    """Update the product rating aggregates with the review changes after saving."""
+    previous_rating = getattr(instance, '_previous_rating', None)
+    current_rating = (instance.product_id, instance.rate, instance.is_active)
+    if previous_rating == current_rating:
+        return
+    if previous_rating and previous_rating[2]:
+        Product.objects.update_rating(previous_rating[0], previous_rating[1], count=-1)
+    if instance.is_active:
+        Product.objects.update_rating(instance.product_id, instance.rate)
+    bump_cache_version_on_commit(CATALOG_VERSION)
+
+
+@receiver(post_delete, sender=Review)
+def remove_product_rating(sender, instance, *args, **kwargs):
+    """Remove the review from the product rating aggregates after deleting."""
+    if instance.is_active:
+        Product.objects.update_rating(instance.product_id, instance.rate, count=-1)
+        bump_cache_version_on_commit(CATALOG_VERSION)
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+BLOBS_PREFIX = 'blobs/'
+
+
+def is_blob(name):
+    """Take a stored file name, and return True if it's a content addressed blob."""
+    return bool(name) and name.startswith(BLOBS_PREFIX)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage which stores each distinct content once, under a path sharded by its sha256 hash
+    with the uploaded file extension, whatever the upload_to path. The content is hashed while it's streamed
+    to a temporary file, so an upload already stored is dropped without being read twice.
+    The rows referencing each blob are counted, and a blob is deleted with its last reference.
+    """
+    def get_available_name(self, name, max_length=None):
+        # the same name is the same content, so it's never suffixed.
+        return name
+
+    def get_blob_name(self, digest, name):
+        """Take a content hash digest and the uploaded name, and return the blob name, sharded on 2 levels."""
+        return f'{BLOBS_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{os.path.splitext(name)[1].lower()}'
+
+    def _save(self, name, content):
+        temp_dir = self.path(f'{BLOBS_PREFIX}tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=temp_dir, delete=False) as temp_file:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temp_file.write(chunk)
+        blob_name = self.get_blob_name(digest.hexdigest(), name)
+        path = self.path(blob_name)
+        if os.path.exists(path):
+            os.remove(temp_file.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_file.name, path)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        return blob_name
+
+    def retain(self, names):
+        """Take stored files names, and add a reference to each of their blobs, other files aren't counted."""
+        from .models import MediaBlob
+        MediaBlob.objects.add_references([name for name in names if is_blob(name)])
+
+    def release(self, name):
+        """
+        Take a stored file name, and remove a reference to its blob. A blob left without references is deleted
+        once the transaction is committed, so a rolled back replace or delete still finds its file.
+        """
+        from .models import MediaBlob
+        if is_blob(name) and MediaBlob.objects.remove_reference(name):
+            transaction.on_commit(lambda: self.delete_unreferenced(name))
+
+    def delete_unreferenced(self, name):
+        """Take a blob name, and delete its row, its file & its renditions if it's still without references."""
+        from .models import MediaBlob
+        from .renditions import delete_renditions
+        if MediaBlob.objects.delete_unreferenced(name):
+            self.delete(name)
+            delete_renditions(name)
+
+
+media_storage = ContentAddressedStorage()
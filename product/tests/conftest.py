@@ -1,4 +1,7 @@
 import pytest
+from unittest import mock
+
+from django.core.cache import cache
 from rest_framework.test import APIClient, APIRequestFactory
 from pytest_factoryboy import register
 
@@ -25,6 +28,18 @@ register(ReviewFactory)
 register(WishlistFactory)
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def no_renditions_jobs():
+    # committed images would queue renditions jobs, run by their worker thread beside the test.
+    with mock.patch('product.signals.enqueue_renditions') as enqueue_renditions:
+        yield enqueue_renditions
+
+
 @pytest.fixture
 def new_customer_user(db, customer_user_factory):
     customer = customer_user_factory.create()
@@ -0,0 +1,220 @@
+import json
+import os
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.utils import timezone
+
+from product.imports import CatalogImporter, claim_catalog_import, run_catalog_import
+from product.search import ProductSearchResults
+from product.models import CatalogImport, MediaBlob, Product, ProductImage, ProductVariant
+from product.renditions import get_rendition_name, renditions_queue
+from product.serializers import ProductListSerializer
+from product.storage import media_storage
+
+
+class TestRebuildProductSearchIndex:
+
+    def test_rebuild_search_index(self, db, new_product):
+        """Test rebuilding the search index indexes all products in bulk."""
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM product_product_fts")
+        assert ProductSearchResults(Product.objects.all(), 'test').count() == 0
+        call_command('rebuild_product_search_index')
+        assert ProductSearchResults(Product.objects.all(), 'test').count() == 1
+
+
+class TestRecomputeProductRatings:
+
+    def test_recompute_ratings(self, db, new_review):
+        """Test recomputing products rating aggregates from the active reviews."""
+        Product.objects.filter(id=new_review.product_id).update(rating_count=7, rating_sum=1, rating_1_count=7, 
+                                                                rating_5_count=0)
+        call_command('recompute_product_ratings')
+        product = Product.objects.get(id=new_review.product_id)
+        assert (product.rating_count, product.rating_sum, product.rating_1_count, product.rating_5_count) == (1, 5, 0, 1)
+
+
+class TestImportCatalog:
+
+    @staticmethod
+    def write_catalog(tmp_path, rows):
+        path = tmp_path / 'catalog.jsonl'
+        path.write_text('\n'.join(json.dumps(row) for row in rows))
+        return str(path)
+
+    def test_import_new_products(self, db, tmp_path, new_merchant, new_parent_category, attribute_value_factory):
+        """Test importing new products with their variants, counts & slugs in bulk batches."""
+        attribute_value_factory.create(name='red')
+        rows = [{'name': 'imported product', 'description': 'description', 'details': 'details',
+                'category': new_parent_category.slug, 'max_price': '100', 'total_in_stock': 5,
+                'variants': [{'values': {'test attribute': 'red'}, 'max_price': 90, 'total_in_stock': 5}]}
+                for i in range(5)]
+        call_command('import_catalog', self.write_catalog(tmp_path, rows), merchant=new_merchant.id, batch_size=2)
+        products = Product.objects.filter(name='imported product')
+        assert products.count() == 5
+        assert len(set(products.values_list('slug', flat=True))) == 5
+        assert set(products.values_list('discount_price', flat=True)) == {100}
+        assert ProductVariant.objects.filter(product__in=products, variant__name='Red').count() == 5
+        new_parent_category.refresh_from_db()
+        assert new_parent_category.product_count == 5
+
+    def test_import_updates_and_errors(self, db, tmp_path, new_product, merchant_factory, merchant_user_factory):
+        """Test importing rows with a slug updates the merchant products, and invalid rows are reported."""
+        rows = [{'slug': new_product.slug, 'max_price': 800, 'is_active': False},
+                {'name': 'missing fields'},
+                {'slug': 'unknown-slug', 'max_price': 10},
+                {'slug': new_product.slug, 'discount_price': 900}]
+        path = self.write_catalog(tmp_path, rows)
+        other_merchant = merchant_factory.create(user=merchant_user_factory.create(email='other@gmail.com'))
+        call_command('import_catalog', path, merchant=other_merchant.id)
+        new_product.refresh_from_db()
+        assert (new_product.max_price, new_product.is_active) == (700, True)
+        call_command('import_catalog', path, merchant=new_product.merchant_id)
+        new_product.refresh_from_db()
+        assert (new_product.max_price, new_product.discount_price, new_product.is_active) == (800, 500, False)
+        new_product.category.refresh_from_db()
+        assert new_product.category.product_count == 0
+
+    def test_import_batch_write_error(self, db, new_merchant, new_parent_category):
+        """Test a batch failing to be written fails its rows only, and the next batches are imported."""
+        rows = [{'name': f'imported product {i}', 'description': 'description', 'details': 'details',
+                'category': new_parent_category.slug, 'max_price': '100', 'total_in_stock': 5} for i in range(4)]
+        write_batch = CatalogImporter.write_batch
+        calls = []
+
+        def fail_first_batch(importer, *args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise IntegrityError("UNIQUE constraint failed: product_product.slug")
+            return write_batch(importer, *args)
+
+        with mock.patch.object(CatalogImporter, 'write_batch', fail_first_batch):
+            importer = CatalogImporter(new_merchant, batch_size=2).run(rows)
+        assert (importer.rows_count, importer.created_count, importer.failed_count) == (4, 2, 2)
+        assert [error['row'] for error in importer.errors] == [1, 2]
+        assert list(Product.objects.filter(merchant=new_merchant).order_by('name').values_list('name', flat=True)) == [
+                'imported product 2', 'imported product 3']
+
+    def test_resume_stale_running_import(self, db, new_merchant, new_parent_category):
+        """Test --pending resumes the imports left running without progress, after their imported rows."""
+        rows = [{'name': f'imported product {i}', 'description': 'description', 'details': 'details',
+                'category': new_parent_category.slug, 'max_price': '100', 'total_in_stock': 5} for i in range(3)]
+        catalog = '\n'.join(json.dumps(row) for row in rows).encode()
+        stale_import, running_import = [CatalogImport.objects.create(
+            merchant=new_merchant, file=ContentFile(catalog, name='catalog.jsonl'), file_format='jsonl',
+            status='Running', rows_count=1, created_count=1) for i in range(2)]
+        CatalogImport.objects.filter(id=stale_import.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        call_command('import_catalog', pending=True, stdout=StringIO())
+        stale_import.refresh_from_db()
+        assert (stale_import.status, stale_import.rows_count, stale_import.created_count) == ('Done', 3, 3)
+        assert list(Product.objects.filter(merchant=new_merchant).order_by('name').values_list('name', flat=True)) == [
+                'imported product 1', 'imported product 2']
+        running_import.refresh_from_db()
+        assert (running_import.status, running_import.rows_count) == ('Running', 1)
+
+    def test_import_claimed_once(self, db, new_merchant, new_parent_category):
+        """Test an import claimed by another process isn't run, and a run losing its claim rolls its batch back."""
+        rows = [{'name': f'imported product {i}', 'description': 'description', 'details': 'details',
+                'category': new_parent_category.slug, 'max_price': '100', 'total_in_stock': 5} for i in range(2)]
+        catalog = '\n'.join(json.dumps(row) for row in rows).encode()
+        claimed_import, resumed_import = [CatalogImport.objects.create(
+            merchant=new_merchant, file=ContentFile(catalog, name='catalog.jsonl'), file_format='jsonl')
+            for i in range(2)]
+        # the web process queue claims the job first.
+        assert claim_catalog_import(claimed_import) is not None
+        run_catalog_import(claimed_import.id, stale_after=timedelta(minutes=10))
+        assert Product.objects.filter(merchant=new_merchant).count() == 0
+        import_batch = CatalogImporter.import_batch
+
+        def resumed_meanwhile(importer, batch):
+            # another process resumes the job while this one writes its first batch.
+            CatalogImport.objects.filter(id=resumed_import.id).update(updated_at=timezone.now())
+            return import_batch(importer, batch)
+
+        with mock.patch.object(CatalogImporter, 'import_batch', resumed_meanwhile):
+            run_catalog_import(resumed_import.id, batch_size=1)
+        resumed_import.refresh_from_db()
+        assert (resumed_import.status, resumed_import.rows_count) == ('Running', 0)
+        assert Product.objects.filter(merchant=new_merchant).count() == 0
+
+    def test_import_thumbnails(self, db, new_product, product_factory, merchant_factory, merchant_user_factory):
+        """Test a row thumbnail is the name of an image already stored for the merchant products only, then rendered."""
+        image = ProductImage.objects.create(product=new_product, image=SimpleUploadedFile('image.jpg', b'own image'))
+        other_merchant = merchant_factory.create(user=merchant_user_factory.create(email='other@gmail.com'))
+        other_image = ProductImage.objects.create(product=product_factory.create(merchant=other_merchant, slug='other-product'),
+                                                    image=SimpleUploadedFile('image.jpg', b'other image'))
+        rows = [{'slug': new_product.slug, 'thumbnail': thumbnail} for thumbnail in
+                ['../core/settings/base.py', 'blobs/00/00/missing.jpg', other_image.image.name, image.image.name]]
+        with mock.patch.object(renditions_queue, 'enqueue_on_commit') as enqueue_on_commit:
+            importer = CatalogImporter(new_product.merchant).run(rows)
+        assert [error['row'] for error in importer.errors] == [1, 2, 3]
+        # the replaced thumbnail is queued for its renditions like a saved one.
+        enqueue_on_commit.assert_called_once_with([new_product.id])
+        assert importer.errors[0]['errors'] == {'thumbnail': ["This merchant has no stored image with this name."]}
+        new_product.refresh_from_db()
+        assert new_product.thumbnail.name == image.image.name
+        assert MediaBlob.objects.get(name=image.image.name).references == 2
+        assert MediaBlob.objects.get(name=other_image.image.name).references == 1
+
+
+class TestGenerateImageRenditions:
+
+    def test_generate_renditions(self, db, new_product):
+        """Test rendering the products images renditions with the process pool, and the list thumbnail rendition."""
+        with open(os.path.join(settings.BASE_DIR, 'static/img/no_avatar.jpg'), 'rb') as file:
+            image = ProductImage.objects.create(product=new_product, image=SimpleUploadedFile('image.jpg', file.read()))
+        Product.objects.filter(id=new_product.id).update(thumbnail=image.image.name)
+        out = StringIO()
+        call_command('generate_image_renditions', stdout=out)
+        assert out.getvalue().startswith('Rendered 2 images')
+        image.refresh_from_db()
+        metadata = json.loads(image.renditions)
+        assert (metadata['source'], metadata['width'], metadata['height']) == (image.image.name, 512, 512)
+        assert [(rendition['width'], rendition['format']) for rendition in metadata['renditions']] == [
+                (160, 'jpeg'), (160, 'webp'), (480, 'jpeg'), (480, 'webp')]
+        assert all(default_storage.exists(rendition['name']) for rendition in metadata['renditions'])
+        product = Product.objects.get(id=new_product.id)
+        assert product.list_thumbnail == metadata['renditions'][0]['name']
+        assert ProductListSerializer(product).data['thumbnail_url'].endswith('-160w.jpg')
+        out = StringIO()
+        call_command('generate_image_renditions', stdout=out)
+        assert out.getvalue().startswith('Rendered 0 images')
+
+
+class TestRecountMediaBlobs:
+
+    def test_recount_media_blobs(self, db, new_product):
+        """Test recounting the media blobs references, and deleting the unreferenced blobs."""
+        image = ProductImage.objects.create(product=new_product, image=SimpleUploadedFile('image.jpg', b'content'))
+        Product.objects.filter(id=new_product.id).update(thumbnail=image.image.name)
+        orphan_name = media_storage.save('products/orphan.jpg', SimpleUploadedFile('orphan.jpg', b'orphan'))
+        rendition_name = default_storage.save(get_rendition_name(image.image.name, 160, 'jpeg'), ContentFile(b'r'))
+        orphan_rendition_name = default_storage.save(get_rendition_name(orphan_name, 160, 'jpeg'), ContentFile(b'r'))
+        MediaBlob.objects.filter(name=image.image.name).update(references=7)
+        call_command('recount_media_blobs', min_age=0, stdout=StringIO())
+        assert MediaBlob.objects.get(name=image.image.name).references == 2
+        assert default_storage.exists(image.image.name)
+        assert not default_storage.exists(orphan_name)
+        assert default_storage.exists(rendition_name)
+        assert not default_storage.exists(orphan_rendition_name)
+
+    def test_recount_keeps_recent_blobs(self, db):
+        """Test the unreferenced blobs rows & files younger than the minimum age are both kept."""
+        name = media_storage.save('products/upload.jpg', SimpleUploadedFile('upload.jpg', b'upload'))
+        MediaBlob.objects.create(name=name, references=1)
+        call_command('recount_media_blobs', min_age=60, stdout=StringIO())
+        assert MediaBlob.objects.filter(name=name).exists()
+        assert default_storage.exists(name)
+        MediaBlob.objects.filter(name=name).update(updated_at=timezone.now() - timedelta(minutes=5))
+        call_command('recount_media_blobs', min_age=60, stdout=StringIO())
+        assert not MediaBlob.objects.filter(name=name).exists()
+        # the file is still in its grace period, so it is deleted by a later run.
+        assert default_storage.exists(name)
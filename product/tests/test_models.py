@@ -1,6 +1,14 @@
 import pytest
 
-from product.models import Product, Question, Answer, Review
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+
+from brand.models import Brand
+from product.models import MediaBlob, Product, ProductImage, Question, Answer, Review
+from product.renditions import get_rendition_name
+from product.storage import media_storage
 
 
 class TestProductModel:
@@ -49,6 +57,129 @@ class TestReviewModel:
         assert new_review.get_rate_percentage == 100
 
 
+class TestProductRating:
+
+    def test_review_create_update_delete(self, db, new_review, customer_user_factory, 
+                                        customer_factory, review_factory):
+        """Test product rating aggregates follow reviews creates, updates, deactivates & deletes."""
+        product = new_review.product
+        other_user = customer_user_factory.create(email='other@gmail.com')
+        other_review = review_factory.create(product=product, customer=customer_factory.create(user=other_user), rate=2)
+        product.refresh_from_db()
+        assert (product.rating_count, product.rating_sum, product.rating_average) == (2, 7, 3.5)
+        assert product.rating_histogram == {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}
+        other_review.rate = 4
+        other_review.save()
+        product.refresh_from_db()
+        assert (product.rating_count, product.rating_sum) == (2, 9)
+        assert (product.rating_2_count, product.rating_4_count) == (0, 1)
+        new_review.is_active = False
+        new_review.save()
+        product.refresh_from_db()
+        assert (product.rating_count, product.rating_sum, product.rating_5_count) == (1, 4, 0)
+        other_review.delete()
+        product.refresh_from_db()
+        assert (product.rating_count, product.rating_sum, product.rating_average) == (0, 0, None)
+
+    def test_stale_product_save(self, db, new_product, new_customer, review_factory):
+        """Test saving a product loaded before a review doesn't overwrite its rating aggregates."""
+        stale_product = Product.objects.get(id=new_product.id)
+        review_factory.create(product=new_product, customer=new_customer, rate=4)
+        stale_product.name = 'renamed'
+        stale_product.save()
+        new_product.refresh_from_db()
+        assert (new_product.name, new_product.rating_count, new_product.rating_sum, new_product.rating_4_count) == (
+                'renamed', 1, 4, 1)
+
+
+class TestBrandProductsCount:
+
+    def test_product_create_move_delete(self, db, new_product):
+        """Test brands products counts follow products creates, brand changes & deletes."""
+        nike, adidas = Brand.objects.create(name='nike'), Brand.objects.create(name='adidas')
+        new_product.brand = nike
+        new_product.save()
+        nike.refresh_from_db()
+        assert nike.products_count == 1
+        new_product.name = 'renamed'
+        new_product.save()
+        nike.refresh_from_db()
+        assert nike.products_count == 1
+        new_product.brand = adidas
+        new_product.save()
+        nike.refresh_from_db()
+        adidas.refresh_from_db()
+        assert (nike.products_count, adidas.products_count) == (0, 1)
+        new_product.delete()
+        adidas.refresh_from_db()
+        assert adidas.products_count == 0
+
+    def test_stale_brand_save(self, db, new_product):
+        """Test saving a brand loaded before a product move doesn't overwrite its products count."""
+        nike = Brand.objects.create(name='nike')
+        new_product.brand = nike
+        new_product.save()
+        nike.name = 'renamed'
+        nike.save()
+        nike.refresh_from_db()
+        assert (nike.name, nike.products_count) == ('Renamed', 1)
+
+
+@pytest.mark.usefixtures('no_renditions_jobs')
+class TestMediaBlobs:
+
+    def test_same_content_stored_once(self, transactional_db, new_product):
+        """Test uploads of the same content are stored once, and deleted with their last reference."""
+        images = [ProductImage.objects.create(product=new_product, image=SimpleUploadedFile(f'{i}.jpg', b'content'))
+                    for i in range(2)]
+        name = images[0].image.name
+        assert name.startswith('blobs/') and name.endswith('.jpg')
+        assert images[1].image.name == name
+        assert MediaBlob.objects.get(name=name).references == 2
+        images[0].delete()
+        assert media_storage.exists(name)
+        assert MediaBlob.objects.get(name=name).references == 1
+        images[1].delete()
+        assert not media_storage.exists(name)
+        assert not MediaBlob.objects.filter(name=name).exists()
+
+    def test_replaced_image_released(self, transactional_db, new_product):
+        """Test replacing an image removes the reference to the previous blob."""
+        image = ProductImage.objects.create(product=new_product, image=SimpleUploadedFile('old.jpg', b'old'))
+        old_name = image.image.name
+        image = ProductImage.objects.get(id=image.id)
+        image.image = SimpleUploadedFile('new.jpg', b'new')
+        image.save()
+        assert not media_storage.exists(old_name)
+        assert MediaBlob.objects.get(name=image.image.name).references == 1
+
+    def test_deleted_blob_renditions(self, transactional_db, new_product):
+        """Test the renditions of a blob are deleted with its last reference."""
+        image = ProductImage.objects.create(product=new_product, image=SimpleUploadedFile('image.jpg', b'content'))
+        renditions = [default_storage.save(get_rendition_name(image.image.name, width, image_format), ContentFile(b'r'))
+                        for width, image_format in [(160, 'jpeg'), (160, 'webp'), (480, 'jpeg')]]
+        image.delete()
+        assert not any(default_storage.exists(name) for name in renditions)
+
+    def test_rolled_back_release(self, transactional_db, new_product):
+        """Test a rolled back replace or delete keeps the released blob file & its reference."""
+        image = ProductImage.objects.create(product=new_product, image=SimpleUploadedFile('old.jpg', b'old'))
+        image_id, old_name = image.id, image.image.name
+        for change in ['replace', 'delete']:
+            with pytest.raises(RuntimeError):
+                with transaction.atomic():
+                    image = ProductImage.objects.get(id=image_id)
+                    if change == 'replace':
+                        image.image = SimpleUploadedFile('new.jpg', b'new')
+                        image.save()
+                    else:
+                        image.delete()
+                    raise RuntimeError
+            assert ProductImage.objects.get(id=image_id).image.name == old_name
+            assert media_storage.exists(old_name)
+            assert MediaBlob.objects.get(name=old_name).references == 1
+
+
 class TestWishlistModel:
     
     def test_wishlist_str(self, new_wishlist):
@@ -1,11 +1,20 @@
+import json
 import os
+from unittest import mock
+
+import pytest
 
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from product.models import AttributeValue, Product, ProductImage, ProductVariant, ProductVariantImage
+from product.renditions import renditions_queue
 
 from product.serializers import (AttributeSerializer, AttributeValueSerializer, QuestionSerializer, 
-                                ProductVariantSerializer, ProductDetailSerializer, 
+                                ProductVariantSerializer, ProductDetailSerializer, ProductListSerializer,
                                 AnswerSerializer, ReviewSerializer,)
 
 
@@ -127,6 +136,31 @@ class TestProductVariantSerializer:
         assert serializer.errors['images']['image_id'] == "This product does not have this image id."
 
 
+class TestVariantsAttributeValues:
+
+    def test_variants_values_one_query(self, db, new_product, product_variant_factory, 
+                                        attribute_value_factory, django_assert_num_queries):
+        """Test all the product variants attribute values are resolved in one query."""
+        for i in range(5):
+            values = [attribute_value_factory.create(name=f'value {i}'), attribute_value_factory.create(name=f'other {i}')]
+            product_variant_factory.create(product=new_product, variant=values)
+        variants = list(ProductVariant.objects.filter(product=new_product).prefetch_related('images').order_by('id'))
+        with django_assert_num_queries(1):
+            data = ProductVariantSerializer(variants, many=True).data
+        assert [value['name'] for value in data[0]['variants']] == ['Value 0', 'Other 0']
+        assert data[4]['variants'][1]['attribute_name'] == 'Test Attribute'
+
+    def test_variants_values_for_products_page(self, db, new_product, product_factory, 
+                                                product_variant_factory, new_attribute_value):
+        """Test attribute values are resolved for many products at once."""
+        other_product = product_factory.create(name='other', slug='other')
+        variant = product_variant_factory.create(product=new_product, variant=[new_attribute_value])
+        empty_variant = product_variant_factory.create(product=other_product)
+        products_values = AttributeValue.objects.get_variants_values([new_product.id, other_product.id])
+        assert products_values[new_product.id][variant.id] == [new_attribute_value]
+        assert products_values[other_product.id][empty_variant.id] == []
+
+
 class TestProductSerializer:
 
     upload_file = open(os.path.join(settings.BASE_DIR,
@@ -175,6 +209,83 @@ class TestProductSerializer:
         assert serializer.errors['variants']['total_in_stock'] == "total in stock of variants can't be greater than total of stock of product."
 
 
+class TestProductBulkCreate:
+
+    @staticmethod
+    def create_product(merchant, category, values, variants_count):
+        validated_data = {
+            'merchant': merchant, 'category': category, 'name': f'bulk {variants_count}', 'description': 'description',
+            'details': 'details', 'max_price': 100, 'total_in_stock': 50, 'images': [{'image': 'product.jpg'}],
+            'variants': [{'variant': values, 'max_price': 60, 'total_in_stock': 1,
+                        'images': [{'image': 'variant.jpg'}, {'image': 'default.jpg', 'is_default': True}]}
+                        for i in range(variants_count)]}
+        serializer = ProductDetailSerializer(context={'is_update': False})
+        with CaptureQueriesContext(connection) as queries:
+            product = serializer.create(validated_data)
+        return product, len(queries)
+
+    def test_create_fixed_queries(self, db, new_merchant, new_parent_category, attribute_value_factory):
+        """Test nested product create statements count doesn't grow with the variants & images."""
+        values = [attribute_value_factory.create(name='red'), attribute_value_factory.create(name='large')]
+        product, few_variants_queries = self.create_product(new_merchant, new_parent_category, values, 2)
+        product, many_variants_queries = self.create_product(new_merchant, new_parent_category, values, 10)
+        assert few_variants_queries == many_variants_queries
+        variants = ProductVariant.objects.filter(product=product)
+        assert variants.count() == 10
+        assert set(variants.values_list('discount_price', flat=True)) == {60}
+        assert ProductVariant.variant.through.objects.filter(productvariant__product=product).count() == 20
+        assert ProductVariantImage.objects.filter(variant__product=product, is_default=True).count() == 10
+        assert ProductImage.objects.filter(product=product).count() == 1
+        assert [value.name for value in variants[0].variant.all()] == ['Red', 'Large']
+
+    def test_update_queues_renditions(self, db, new_product, attribute_value_factory):
+        """Test a product update adding variants images queues the product images renditions."""
+        # the thumbnail is rendered, so saving the product alone queues nothing.
+        Product.objects.filter(id=new_product.id).update(
+            thumbnail_renditions=json.dumps({'source': new_product.thumbnail.name, 'renditions': []}))
+        product = Product.objects.get(id=new_product.id)
+        validated_data = {'variants': [{'variant': [attribute_value_factory.create(name='red')], 'max_price': 60,
+                                        'total_in_stock': 1, 'images': [{'image': 'variant.jpg'}]}]}
+        serializer = ProductDetailSerializer(context={'is_update': True, 'product_obj': product})
+        with mock.patch.object(renditions_queue, 'enqueue_on_commit') as enqueue_on_commit:
+            serializer.update(product, validated_data)
+        enqueue_on_commit.assert_called_once_with([product.id])
+
+
+class TestProductUpdateValidation:
+
+    @staticmethod
+    def validate_update(product, variants, images, variants_images):
+        data = {'total_in_stock': 100,
+                'images': [{'image_id': image.id} for image in images],
+                'variants': [{'variant_id': variant.id, 'total_in_stock': 1,
+                            'images': [{'image_id': image.id} for image in variants_images]} for variant in variants]}
+        serializer = ProductDetailSerializer(data=data, partial=True, context={'is_update': True, 'product_obj': product})
+        with CaptureQueriesContext(connection) as queries:
+            is_valid = serializer.is_valid()
+        return is_valid, len(queries)
+
+    def test_validate_fixed_queries(self, db, new_product, product_variant_factory):
+        """Test update ownership validation queries count doesn't grow with the entered variants & images."""
+        variants = product_variant_factory.create_batch(10, product=new_product)
+        images = [ProductImage.objects.create(product=new_product, image='product.jpg') for i in range(10)]
+        variants_images = [ProductVariantImage.objects.create(variant=variant, image='variant.jpg') for variant in variants]
+        is_valid, few_queries = self.validate_update(new_product, variants[:2], images[:2], variants_images[:2])
+        assert is_valid == True
+        is_valid, many_queries = self.validate_update(new_product, variants, images, variants_images)
+        assert is_valid == True
+        assert few_queries == many_queries
+
+    def test_validate_not_owned_ids(self, db, new_product, product_variant_factory):
+        """Test update validation of variant & image ids of another product."""
+        other_variant = product_variant_factory.create(product__slug='other-product')
+        other_image = ProductImage.objects.create(product=other_variant.product, image='product.jpg')
+        is_valid, queries = self.validate_update(new_product, [], [other_image], [])
+        assert is_valid == False
+        is_valid, queries = self.validate_update(new_product, [other_variant], [], [])
+        assert is_valid == False
+
+
 class TestQuestionSerializer:
 
     data = {'content': 'test question'}
@@ -198,6 +309,57 @@ class TestAnswerSerializer:
         assert serializer.is_valid() == True
 
 
+class TestProductListSerializer:
+
+    url = reverse('product-api:product-list')
+
+    def test_thumbnail_url_request_host(self, db, new_product, api_factory):
+        """Test thumbnail url is built from the requested host when no media base url is set."""
+        request = api_factory.get(self.url)
+        serializer = ProductListSerializer(new_product, context={"request": request})
+        assert serializer.data['thumbnail_url'] == 'http://testserver/media/default.jpg'
+
+    @pytest.mark.parametrize('name', ['products/summer sale.jpg', 'products/café crème 100%.jpg',
+                                        'products/حقيبة #2.jpg', 'blobs/ab/cd/ab cd?.jpg'])
+    def test_thumbnail_url_matches_storage_url(self, db, new_product, api_factory, name):
+        """Test thumbnail url without a media base url is the storage url built absolute from the request."""
+        new_product.thumbnail = name
+        request = api_factory.get(self.url)
+        serializer = ProductListSerializer(new_product, context={"request": request})
+        assert serializer.data['thumbnail_url'] == request.build_absolute_uri(new_product.thumbnail.url)
+
+    def test_thumbnail_url_media_base_url(self, db, new_product, api_factory, settings):
+        """Test thumbnail url is built from the configured media base url."""
+        settings.MEDIA_BASE_URL = 'https://cdn.amazonclone.local/media'
+        request = api_factory.get(self.url)
+        serializer = ProductListSerializer(new_product, context={"request": request})
+        assert serializer.data['thumbnail_url'] == 'https://cdn.amazonclone.local/media/default.jpg'
+
+    def test_thumbnail_srcset_not_rendered(self, db, new_product):
+        """Test thumbnail srcset has only the original thumbnail, without size, until it's rendered."""
+        serializer = ProductListSerializer(new_product)
+        assert serializer.data['thumbnail_srcset'] == [
+            {'url': '/media/default.jpg', 'width': None, 'height': None, 'format': 'jpeg', 'bytes': None}]
+
+    def test_thumbnail_srcset_renditions(self, db, new_product):
+        """Test thumbnail srcset lists the recorded renditions then the original thumbnail, without storage calls."""
+        new_product.thumbnail_renditions = json.dumps({
+            "source": 'default.jpg', "width": 600, "height": 400, "bytes": 90000, "renditions": [
+                {"name": 'renditions/default-160w.jpg', "width": 160, "height": 107, "format": 'jpeg', "bytes": 5000},
+                {"name": 'renditions/default-160w.webp', "width": 160, "height": 107, "format": 'webp', "bytes": 4000}]})
+        with mock.patch('django.core.files.storage.FileSystemStorage.size') as size:
+            data = ProductListSerializer(new_product).data
+        assert not size.called
+        assert data['thumbnail_srcset'] == [
+            {'url': '/media/renditions/default-160w.jpg', 'width': 160, 'height': 107, 'format': 'jpeg', 'bytes': 5000},
+            {'url': '/media/renditions/default-160w.webp', 'width': 160, 'height': 107, 'format': 'webp', 'bytes': 4000},
+            {'url': '/media/default.jpg', 'width': 600, 'height': 400, 'format': 'jpeg', 'bytes': 90000}]
+        # renditions of a replaced thumbnail aren't listed.
+        new_product.thumbnail = 'other.png'
+        assert ProductListSerializer(new_product).data['thumbnail_srcset'] == [
+            {'url': '/media/other.png', 'width': None, 'height': None, 'format': 'png', 'bytes': None}]
+
+
 class TestReviewSerializer:
     
     data = {'title': 'test review', 'content': 'test review', 'rate': 2}
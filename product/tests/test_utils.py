@@ -0,0 +1,41 @@
+from brand.models import Brand
+from product.utils import allocate_slug, unique_slug_generator, unique_slugs_generator
+
+
+class TestSlugGenerator:
+
+    def test_allocate_slug(self):
+        """Test the smallest free number suffix is allocated."""
+        taken = {'shoe', 'shoe-2', 'shoe-4'}
+        assert allocate_slug('boot', taken) == 'boot'
+        assert allocate_slug('shoe', taken) == 'shoe-3'
+        assert allocate_slug('shoe', taken) == 'shoe-5'
+
+    def test_unique_slug(self, db):
+        """Test colliding names get suffixed slugs, and unchanged names keep their slug."""
+        first = Brand.objects.create(name='nike')
+        second = Brand.objects.create(name='nike')
+        Brand.objects.create(name='nike shoes')
+        assert (first.slug, second.slug) == ('nike', 'nike-2')
+        second.thumbnail = 'other.jpg'
+        assert unique_slug_generator(second) == 'nike-2'
+        second.name = 'adidas'
+        assert unique_slug_generator(second) == 'adidas'
+
+    def test_unique_slug_without_queries(self, db, django_assert_num_queries):
+        """Test a saved instance with an unchanged name keeps its slug without any query."""
+        brand = Brand.objects.create(name='nike')
+        with django_assert_num_queries(0):
+            assert unique_slug_generator(brand) == 'nike'
+
+    def test_unique_slugs_bulk(self, db, django_assert_max_num_queries):
+        """Test slugs of many new instances are allocated in memory, before one bulk create."""
+        Brand.objects.create(name='nike')
+        Brand.objects.create(name='puma')
+        Brand.objects.filter(slug='puma').update(slug='puma-2')
+        brands = [Brand(name=name) for name in ['nike', 'nike', 'adidas', 'puma', 'puma']]
+        with django_assert_max_num_queries(2):
+            unique_slugs_generator(brands)
+        assert [brand.slug for brand in brands] == ['nike-2', 'nike-3', 'adidas', 'puma', 'puma-3']
+        Brand.objects.bulk_create(brands)
+        assert Brand.objects.count() == 7
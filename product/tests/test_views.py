@@ -3,9 +3,16 @@ import os
 
 from django.urls import reverse
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from product.models import Attribute, AttributeValue, Product, Question, Answer, Review, Wishlist
+from brand.models import Brand
+from category.models import Category
+from product.models import (Attribute, AttributeValue, Product, ProductImage, ProductVariantImage,
+                            Question, Answer, Review, Wishlist)
+from product.cache import CATALOG_VERSION, bump_cache_version
+from product.pagination import ProductCursorPagination
 
 
 class TestVariantAttribute:
@@ -122,7 +129,55 @@ class TestProduct:
         """Test product retrieve list response status."""
         response = api_client.get(self.product_list_endpoint, format='json')
         assert response.status_code == 200
-        assert len(json.loads(response.content)) == 1
+        assert len(json.loads(response.content)['results']) == 1
+
+    def test_product_list_cursor_pagination(self, db, product_factory, api_client):
+        """Test product list is paginated with stable cursors following the products ordering."""
+        for i in range(5):
+            product_factory.create(name=f'product {i}', slug=f'product-{i}')
+        response = api_client.get(self.product_list_endpoint, {'page_size': 2}, format='json')
+        content = json.loads(response.content)
+        assert response.status_code == 200
+        assert content['previous'] is None
+        assert [p['slug'] for p in content['results']] == ['product-4', 'product-3']
+        slugs = [p['slug'] for p in content['results']]
+        while content['next']:
+            content = json.loads(api_client.get(content['next'], format='json').content)
+            slugs.extend(p['slug'] for p in content['results'])
+        assert slugs == ['product-4', 'product-3', 'product-2', 'product-1', 'product-0']
+
+    def test_product_list_rating_ordering(self, db, product_factory, api_client):
+        """Test product list ordered by the stored rating average, paginated with cursors, unrated products last."""
+        for i, (rating_count, rating_sum) in enumerate([(0, 0), (3, 10), (2, 9), (1, 5), (3, 10)]):
+            product_factory.create(name=f'product {i}', slug=f'product-{i}', rating_count=rating_count,
+                                    rating_sum=rating_sum)
+        content = json.loads(api_client.get(self.product_list_endpoint, {'ordering': '-rating_average',
+                                                                        'page_size': 2}, format='json').content)
+        slugs = [p['slug'] for p in content['results']]
+        while content['next']:
+            content = json.loads(api_client.get(content['next'], format='json').content)
+            slugs.extend(p['slug'] for p in content['results'])
+        assert slugs == ['product-3', 'product-2', 'product-4', 'product-1', 'product-0']
+
+    def test_product_list_cache(self, transactional_db, no_renditions_jobs, new_product, api_client, django_assert_num_queries):
+        """Test anonymous product list pages are cached until the catalog changes."""
+        response = api_client.get(self.product_list_endpoint, format='json')
+        with django_assert_num_queries(0):
+            cached_response = api_client.get(self.product_list_endpoint, format='json')
+        assert cached_response.data == response.data
+        new_product.name = 'test title 2'
+        new_product.save()
+        response = api_client.get(self.product_list_endpoint, format='json')
+        assert response.data['results'][0]['name'] == 'test title 2'
+
+    def test_product_list_cache_shared_version(self, db, new_product, api_client):
+        """Test a catalog version bump by another worker process drops this worker cached pages."""
+        api_client.get(self.product_list_endpoint, format='json')
+        Product.objects.filter(id=new_product.id).update(name='renamed')
+        # the other worker bumps the version in the shared cache backend.
+        bump_cache_version(CATALOG_VERSION)
+        response = api_client.get(self.product_list_endpoint, format='json')
+        assert response.data['results'][0]['name'] == 'renamed'
 
     # def test_merchant_product_list(self, db, new_merchant_user, new_product, api_client):
     #     """Test merchant product retrieve list response status."""
@@ -144,6 +199,30 @@ class TestProduct:
         response = api_client.get(self.product_update_delete_endpoint, format='json')
         assert response.status_code == 200
 
+    def test_product_detail_fixed_queries(self, db, new_product, product_variant_factory, 
+                                            attribute_value_factory, api_client):
+        """Test product detail queries count doesn't grow with the product variants & images."""
+        def add_variant(i):
+            value = attribute_value_factory.create(name=f'value {i}')
+            variant = product_variant_factory.create(product=new_product, variant=[value])
+            ProductVariantImage.objects.create(variant=variant, image='variant.jpg')
+            ProductImage.objects.create(product=new_product, image='product.jpg')
+        add_variant(0)
+        # load the category tree snapshot once, it's shared by the following requests.
+        api_client.get(self.product_update_delete_endpoint, format='json')
+        with CaptureQueriesContext(connection) as one_variant_queries:
+            api_client.get(self.product_update_delete_endpoint, format='json')
+        for i in range(1, 6):
+            add_variant(i)
+        with CaptureQueriesContext(connection) as many_variants_queries:
+            response = api_client.get(self.product_update_delete_endpoint, format='json')
+        assert response.status_code == 200
+        assert len(response.data['variants']) == 6
+        assert response.data['variants'][0]['variants'][0]['attribute_name'] == 'Test Attribute'
+        assert response.data['breadcrumbs'] == [{"id": new_product.category_id, "name": 'Test Parent Category',
+                                                "slug": 'test-parent-category'}]
+        assert len(many_variants_queries) == len(one_variant_queries)
+
     def test_product_update(self, db, new_merchant_user, new_product, api_client):
         """Test product update response status."""
         api_client.force_authenticate(new_merchant_user)
@@ -163,6 +242,163 @@ class TestProduct:
         assert Product.objects.count() == 0 
 
 
+class TestProductSearch:
+
+    product_search_endpoint = reverse('product-api:product-search')
+
+    @staticmethod
+    def create_catalog(product_factory, product_variant_factory, attribute_value_factory, parent_category):
+        child_category = Category.objects.create(name='child', parent=parent_category, 
+                                                thumbnail='child.jpg', description='child')
+        other_category = Category.objects.create(name='other', thumbnail='other.jpg', description='other')
+        nike = Brand.objects.create(name='nike')
+        red = attribute_value_factory.create(name='red')
+        blue = attribute_value_factory.create(name='blue')
+        cheap = product_factory.create(name='cheap', slug='cheap', category=parent_category, brand=nike,
+                                        max_price=40, discount_price=None)
+        product_variant_factory.create(product=cheap, variant=[red])
+        pricey = product_factory.create(name='pricey', slug='pricey', category=child_category, 
+                                        max_price=900, discount_price=300, is_in_stock=False)
+        product_variant_factory.create(product=pricey, variant=[blue])
+        product_factory.create(name='outside', slug='outside', category=other_category, brand=nike)
+        return red, blue
+
+    def search(self, api_client, params):
+        response = api_client.get(self.product_search_endpoint, params, format='json')
+        assert response.status_code == 200
+        return response.data
+
+    def test_product_search_filters(self, db, new_parent_category, product_factory, product_variant_factory,
+                                    attribute_value_factory, api_client):
+        """Test product search filters by category subtree, brand, price, attribute values & stock."""
+        red, blue = self.create_catalog(product_factory, product_variant_factory, attribute_value_factory, 
+                                        new_parent_category)
+        def slugs(params):
+            return sorted(product['slug'] for product in self.search(api_client, params)['results'])
+        assert slugs({'category': 'test-parent-category'}) == ['cheap', 'pricey']
+        assert slugs({'category': 'test-parent-category', 'brand': 'nike'}) == ['cheap']
+        assert slugs({'min_price': 100, 'max_price': 400}) == ['pricey']
+        assert slugs({'values': f'{red.id},{blue.id}'}) == ['cheap', 'pricey']
+        assert slugs({'values': f'{red.id}'}) == ['cheap']
+        assert slugs({'category': 'test-parent-category', 'in_stock': 'true'}) == ['cheap']
+        assert slugs({'category': 'unknown'}) == []
+
+    def test_product_search_facets(self, db, new_parent_category, product_factory, product_variant_factory,
+                                    attribute_value_factory, api_client, django_assert_max_num_queries):
+        """Test product search facets counts are computed with grouped queries."""
+        red, blue = self.create_catalog(product_factory, product_variant_factory, attribute_value_factory, 
+                                        new_parent_category)
+        with django_assert_max_num_queries(5):
+            facets = self.search(api_client, {'category': 'test-parent-category'})['facets']
+        assert [(brand['slug'], brand['count']) for brand in facets['brands']] == [('nike', 1)]
+        assert [(value['id'], value['count']) for value in facets['values']] == [(blue.id, 1), (red.id, 1)]
+        assert [bucket['count'] for bucket in facets['prices']] == [1, 0, 0, 1, 0, 0]
+
+    def test_product_search_rating_ordering(self, db, new_parent_category, product_factory, product_variant_factory,
+                                            attribute_value_factory, api_client):
+        """Test product search results ordered by the rating average."""
+        self.create_catalog(product_factory, product_variant_factory, attribute_value_factory, new_parent_category)
+        Product.objects.filter(slug='cheap').update(rating_count=2, rating_sum=9)
+        Product.objects.filter(slug='pricey').update(rating_count=1, rating_sum=2)
+        data = self.search(api_client, {'category': new_parent_category.slug, 'ordering': '-rating_average'})
+        assert [product['slug'] for product in data['results']] == ['cheap', 'pricey']
+
+    def test_product_search_price_column(self, db, new_product, api_client):
+        """Test the price range & buckets are on the indexed price columns, not a computed price."""
+        with CaptureQueriesContext(connection) as queries:
+            data = self.search(api_client, {'min_price': 100, 'max_price': 600})
+        assert [product['slug'] for product in data['results']] == ['test-title']
+        assert not any('COALESCE' in query['sql'] for query in queries.captured_queries)
+
+    def test_product_search_null_discount_price(self, db, new_product, api_client):
+        """Test products without a discount price are filtered & bucketed by their max price."""
+        Product.objects.filter(id=new_product.id).update(discount_price=None, max_price=150)
+        data = self.search(api_client, {'min_price': 100, 'max_price': 200})
+        assert [product['slug'] for product in data['results']] == ['test-title']
+        assert [bucket['count'] for bucket in data['facets']['prices']] == [0, 0, 1, 0, 0, 0]
+        assert self.search(api_client, {'min_price': 200})['results'] == []
+
+    def test_product_search_invalid_price(self, db, api_client):
+        """Test product search rejects invalid price."""
+        response = api_client.get(self.product_search_endpoint, {'min_price': 'cheap'}, format='json')
+        assert response.status_code == 400
+
+
+class TestBrandProducts:
+
+    brand_products_endpoint = reverse('brand-api:products', kwargs={"brand_slug": 'nike'})
+    brand_detail_endpoint = reverse('brand-api:detail-update-delete', kwargs={"brand_slug": 'nike'})
+
+    def test_brand_products(self, db, monkeypatch, product_factory, api_client):
+        """Test the brand products are keyset paginated, and the brand detail embeds only the first page."""
+        nike = Brand.objects.create(name='nike')
+        for i in range(3):
+            product_factory.create(name=f'product {i}', slug=f'product-{i}', brand=nike)
+        product_factory.create(name='no brand', slug='no-brand')
+        response = api_client.get(self.brand_products_endpoint, {'page_size': 2}, format='json')
+        assert response.status_code == 200
+        assert len(response.data['results']) == 2
+        response = api_client.get(response.data['next'], format='json')
+        assert [product['slug'] for product in response.data['results']] == ['product-0']
+        monkeypatch.setattr(ProductCursorPagination, 'page_size', 2)
+        response = api_client.get(self.brand_detail_endpoint, format='json')
+        assert response.data['products_count'] == 3
+        assert len(response.data['products']) == 2
+
+    def test_brand_endpoints_slugs(self, db, product_factory, api_client):
+        """Test brands named like the products endpoint, with a slash or non ascii letters keep their endpoints."""
+        for name, slug in [('products', 'products'), ('ac/dc', 'ac-dc'), ('نايك', 'نايك')]:
+            brand = Brand.objects.create(name=name)
+            assert brand.slug == slug
+            product_factory.create(name=f'{slug} product', slug=f'{slug}-product', brand=brand)
+            response = api_client.get(reverse('brand-api:products', kwargs={"brand_slug": slug}), format='json')
+            assert [product['slug'] for product in response.data['results']] == [f'{slug}-product']
+            response = api_client.get(reverse('brand-api:detail-update-delete', kwargs={"brand_slug": slug}),
+                                        format='json')
+            assert (response.status_code, response.data['products_count']) == (200, 1)
+
+
+class TestProductKeywordSearch:
+
+    keyword_search_endpoint = reverse('product-api:product-keyword-search')
+
+    def search(self, api_client, keywords):
+        response = api_client.get(self.keyword_search_endpoint, {'q': keywords}, format='json')
+        assert response.status_code == 200
+        return response.data
+
+    def test_keyword_search_ranking(self, db, product_factory, api_client):
+        """Test keyword search ranks name matches first and highlights the match."""
+        product_factory.create(name='running shoes', slug='running-shoes')
+        product_factory.create(name='socks', slug='socks', details='good for running every day')
+        product_factory.create(name='hat', slug='hat')
+        data = self.search(api_client, 'runn')
+        assert data['count'] == 2
+        assert [product['slug'] for product in data['results']] == ['running-shoes', 'socks']
+        assert '<mark>running</mark>' in data['results'][1]['snippet']
+
+    def test_keyword_search_snippet_escaped(self, db, product_factory, api_client):
+        """Test the snippet escapes the product text markup, and only the matches are marked."""
+        product_factory.create(name='lamp', slug='lamp', details='bright <script>alert(1)</script> lamp')
+        snippet = self.search(api_client, 'bright')['results'][0]['snippet']
+        assert snippet == '<mark>bright</mark> &lt;script&gt;alert(1)&lt;/script&gt; lamp'
+
+    def test_keyword_search_index_signals(self, db, new_product, api_client):
+        """Test the search index follows products updates & deletes."""
+        assert self.search(api_client, 'test')['count'] == 1
+        new_product.name = 'blue jacket'
+        new_product.save()
+        assert self.search(api_client, 'test')['count'] == 0
+        assert self.search(api_client, 'jacket')['count'] == 1
+        new_product.delete()
+        assert self.search(api_client, 'jacket')['count'] == 0
+
+    def test_keyword_search_syntax(self, db, new_product, api_client):
+        """Test search syntax characters in keywords are ignored."""
+        assert self.search(api_client, '"test" (title* -')['count'] == 1
+        assert self.search(api_client, '***')['count'] == 0
+
+
 class TestQuestion:
     
     question_list_endpoint = reverse('product-api:product-question-list', kwargs={"product_slug": 'test-title'})
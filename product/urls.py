@@ -2,7 +2,8 @@ from django.urls import path
 
 from .views import (AttributeListCreateAPIView, AttributeUpdateDeleteAPIView, AttributeValueListCreateAPIView, 
                     AttributeValueUpdateDeleteAPIView,# ProductVariantListCreateAPIView, ProductVariantUpdateDeleteAPIView,
-                    ProductListAPIView, ProductCreateAPIView, ProductUpdateDeleteAPIView, 
+                    ProductListAPIView, ProductSearchAPIView, ProductKeywordSearchAPIView, 
+                    ProductCreateAPIView, ProductUpdateDeleteAPIView, 
                     ProductQuestionListAPIView, QuestionCreateAPIView, QuestionUpdateDeleteAPIView,
                     AnswerCreateAPIView, AnswerUpdateDeleteAPIView, ProductReviewListAPIView,
                     ReviewCreateAPIView, ReviewUpdateDeleteAPIView, WishlistProductAddDeleteAPIView)
@@ -24,6 +25,8 @@ urlpatterns = [
     # path('variants/<int:variant_id>/', ProductVariantUpdateDeleteAPIView.as_view(), name='product-variant-update-delete'),
     # Product
     path('list/', ProductListAPIView.as_view(), name='product-list'),
+    path('search/', ProductSearchAPIView.as_view(), name='product-search'),
+    path('search/keywords/', ProductKeywordSearchAPIView.as_view(), name='product-keyword-search'),
     path('create/', ProductCreateAPIView.as_view(), name='product-create'),
     # path('<str:product_slug>/', ProductDetailAPIView.as_view(), name='product-detail'),
     path('<str:product_slug>/', ProductUpdateDeleteAPIView.as_view(), name='product-detail-update-delete'),
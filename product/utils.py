@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
+import re
+from collections import Counter
 from decimal import Decimal
 
+from django.db.models import Q
+
 
 def arabic_slugify(string):
     """Slugify a given string."""
     string = string.replace(" ", "-")
+    string = string.replace("/", "-")
     string = string.replace(",", "-")
     string = string.replace("&", "-")
     string = string.replace("(", "-")
@@ -14,26 +19,69 @@ def arabic_slugify(string):
     return string.lower()
 
 
-def unique_slug_generator(instance, new_slug=None):
-    """Generate a unique slug for a given instance."""
-    # check if the given arguments have a value of new slug
-    # if yes, assign the given value to the slug field. 
-    if new_slug is not None:
-        slug = new_slug
-    # if not, generate a slug using arabic slugify function.
-    else:
-        slug = arabic_slugify(instance.name)
-    # get the instance class. 
+def is_slug_of(slug, base):
+    """Take a slug and a slug base, and return True if the slug is the base or the base with a number suffix."""
+    return re.fullmatch(rf'{re.escape(base)}(-\d+)?', slug or '') is not None
+
+
+def allocate_slug(base, taken, next_suffixes=None):
+    """
+    Take a slug base and the set of taken slugs, and return the base if it's free,
+    or the base with the smallest free number suffix. The allocated slug is added to the taken set.
+    """
+    slug = base
+    if slug in taken:
+        # continue from the last allocated suffix of the base, so a batch of the same base is linear.
+        suffix = next_suffixes.get(base, 2) if next_suffixes is not None else 2
+        while f'{base}-{suffix}' in taken:
+            suffix += 1
+        slug = f'{base}-{suffix}'
+        if next_suffixes is not None:
+            next_suffixes[base] = suffix + 1
+    taken.add(slug)
+    return slug
+
+
+def unique_slug_generator(instance, new_slug=None, reserved=()):
+    """
+    Generate a unique slug for a given instance, from the given new slug or the instance name.
+    A saved instance keeps its slug if it's still derived from the same base, without any query,
+    if not, the taken slugs of the base are fetched with one prefix query. Reserved slugs are never allocated.
+    """
+    base = new_slug if new_slug is not None else arabic_slugify(instance.name)
+    if instance.pk and is_slug_of(instance.slug, base) and instance.slug not in reserved:
+        return instance.slug
     Klass = instance.__class__
-    # check if there's any item with the same slug.
-    qs = Klass.objects.filter(slug=slug).order_by('-id') 
-    if qs.count() == 1 and qs.first().id == instance.id: 
-        return slug   
-    # if yes, generate a new slug of a random string and return recursive function with the new slug.
-    elif qs.exists():
-        new_slug = f'{slug}-{qs.first().id}'
-        return unique_slug_generator(instance, new_slug=new_slug)
-    return slug 
+    taken = {slug for slug in Klass.objects.filter(slug__startswith=base).exclude(pk=instance.pk).values_list(
+                'slug', flat=True) if is_slug_of(slug, base)}
+    return allocate_slug(base, taken | set(reserved))
+
+
+def unique_slugs_generator(instances, new_slugs=None, batch_size=500, reserved=()):
+    """
+    Generate unique slugs for many new instances of the same model in memory, before a bulk create.
+    Taken slugs are fetched with one query per batch of bases, plus one prefix query per batch
+    of the bases that need a suffix, instead of a query chain per instance. Reserved slugs are never allocated.
+    """
+    if not instances:
+        return instances
+    Klass = instances[0].__class__
+    bases = new_slugs if new_slugs is not None else [arabic_slugify(instance.name) for instance in instances]
+    distinct_bases = list(set(bases))
+    taken = set(reserved)
+    for i in range(0, len(distinct_bases), batch_size):
+        taken.update(Klass.objects.filter(slug__in=distinct_bases[i:i + batch_size]).values_list('slug', flat=True))
+    # bases taken or repeated in the batch get suffixes, so their suffixed slugs are fetched too.
+    taken_bases = list(taken | {base for base, count in Counter(bases).items() if count > 1})
+    for i in range(0, len(taken_bases), batch_size):
+        prefixes = Q()
+        for base in taken_bases[i:i + batch_size]:
+            prefixes |= Q(slug__startswith=f'{base}-')
+        taken.update(Klass.objects.filter(prefixes).values_list('slug', flat=True))
+    next_suffixes = {}
+    for instance, base in zip(instances, bases):
+        instance.slug = allocate_slug(base, taken, next_suffixes)
+    return instances
 
 
 def datetime_to_string(datetime):
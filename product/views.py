@@ -8,8 +8,12 @@ from category.permissions import IsAdmin
 from customer.permissions import IsCustomer, IsCustomerOwner
 from merchant.permissions import IsMerchant, IsMerchantOwner, IsMerchantOwnerOrReadOnly
 from .permissions import IsOwnerOrReadOnly
+from .pagination import ProductCursorPagination, ProductSearchPagination
+from .search import ProductSearchResults
+from .cache import get_or_set_product_list_page
+from .filters import ProductOrderingFilter, ProductSearchFilter, get_product_facets
 from .models import Product, Attribute, AttributeValue, ProductVariant, ProductVariantImage, Question, Answer, Review, Wishlist
-from .serializers import (ProductListSerializer, ProductDetailSerializer, AttributeSerializer,
+from .serializers import (ProductListSerializer, ProductSearchSerializer, ProductDetailSerializer, AttributeSerializer,
                         AttributeValueSerializer, ProductVariantSerializer, ProductVariantImageSerializer,
                         QuestionSerializer, AnswerSerializer, ReviewSerializer, )
 
@@ -20,11 +24,61 @@ from .serializers import (ProductListSerializer, ProductDetailSerializer, Attrib
 class ProductListAPIView(generics.ListAPIView):
     """Product list API view."""
     serializer_class = ProductListSerializer
+    pagination_class = ProductCursorPagination
+    filter_backends = [ProductOrderingFilter]
     queryset = Product.objects.all()
 
     def get_serializer_context(self, *args, **kwargs):
         return {"request":self.request}
 
+    def list(self, request, *args, **kwargs):
+        """Serve anonymous list pages from the cache, keyed by query params & catalog version."""
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        list_page = super().list
+        data = get_or_set_product_list_page(request, lambda: list_page(request, *args, **kwargs).data)
+        return Response(data)
+
+
+class ProductSearchAPIView(generics.ListAPIView):
+    """
+    Product faceted search API view, ordered by the `ordering` query param like the product list.
+    The first page carries the brands, attribute values & price buckets facets counts of the whole result.
+    """
+    serializer_class = ProductListSerializer
+    pagination_class = ProductCursorPagination
+    filter_backends = [ProductSearchFilter, ProductOrderingFilter]
+    queryset = Product.objects.filter(is_active=True)
+
+    def get_serializer_context(self, *args, **kwargs):
+        return {"request":self.request}
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        if not request.query_params.get(self.paginator.cursor_query_param):
+            response.data['facets'] = get_product_facets(queryset)
+        return response
+
+
+class ProductKeywordSearchAPIView(generics.ListAPIView):
+    """
+    Product keyword search API view.
+    Search products name, description & details by the `q` query param with the full-text search index,
+    ranked with bm25 and with a highlighted snippet of the match.
+    """
+    serializer_class = ProductSearchSerializer
+    pagination_class = ProductSearchPagination
+
+    def get_queryset(self, *args, **kwargs):
+        keywords = self.request.query_params.get('q', '')
+        return ProductSearchResults(Product.objects.all(), keywords)
+
+    def get_serializer_context(self, *args, **kwargs):
+        return {"request":self.request}
+
 
 class ProductCreateAPIView(generics.CreateAPIView):
     """
@@ -56,14 +110,18 @@ class ProductUpdateDeleteAPIView(generics.RetrieveUpdateDestroyAPIView):
     """
     permission_classes = [IsMerchantOwnerOrReadOnly]
     serializer_class = ProductDetailSerializer
-    queryset = Product.objects.select_related('category', 'merchant')
+    queryset = Product.objects.with_details()
 
     def get_object(self, *args, **kwargs):
+        # memoize the product, so it's fetched once per request.
+        if hasattr(self, '_product_obj'):
+            return self._product_obj
         # get product slug from the requested url.
         product_slug = self.kwargs.get("product_slug", None)
-        obj = get_object_or_404(Product, slug=product_slug)
+        obj = get_object_or_404(self.get_queryset(), slug=product_slug)
         if self.request.user.is_authenticated:   
             self.check_object_permissions(self.request, obj)
+        self._product_obj = obj
         return obj
 
     def get_serializer_context(self, *args, **kwargs):
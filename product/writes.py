@@ -0,0 +1,23 @@
+from .cache import CATALOG_VERSION, bump_cache_version_on_commit
+from .renditions import enqueue_renditions
+from .search import index_products
+from .storage import media_storage
+
+
+def after_bulk_write(products=(), images=(), released_images=()):
+    """
+    Take the products written with bulk queries, the (product id, file name) pairs of their new stored images
+    (thumbnails, products & variants images) and the names of the replaced ones, and apply once for all of them
+    the side effects of the save signals the bulk queries don't send: index the products text, count the media
+    blobs references, queue the renditions of the new images, and invalidate the cached product lists.
+    """
+    if products:
+        index_products(products)
+    images = list(images)
+    media_storage.retain([name for product_id, name in images])
+    for name in released_images:
+        media_storage.release(name)
+    products_ids = sorted({product_id for product_id, name in images})
+    if products_ids:
+        enqueue_renditions(*products_ids)
+    bump_cache_version_on_commit(CATALOG_VERSION)